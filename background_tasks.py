@@ -0,0 +1,126 @@
+"""
+Tâches en arrière-plan - Exécute les traitements longs (import GTFS, calcul
+d'itinéraire) hors du thread de l'interface, avec progression, annulation
+et regroupement des requêtes répétées
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskCancelled(BaseException):
+    """
+    Levée dans une tâche annulée lors de son prochain point de contrôle
+
+    Dérive de BaseException (comme asyncio.CancelledError) pour traverser
+    les blocs `except Exception` des traitements interrompus.
+    """
+
+
+class Task:
+    """Tâche soumise au BackgroundWorker"""
+
+    def __init__(self, worker, key, on_done, on_error, on_progress):
+        self.worker = worker
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        """Annule la tâche: elle n'est pas lancée si elle attend encore, et son résultat est ignoré"""
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+    def check_cancelled(self):
+        """Point de contrôle: lève TaskCancelled si la tâche a été annulée"""
+        if self.cancelled:
+            raise TaskCancelled()
+
+    def report(self, fraction, message=''):
+        """
+        Signale l'avancement (0 à 1) depuis la tâche; sert aussi de point de
+        contrôle d'annulation
+        """
+        self.check_cancelled()
+        if self.on_progress:
+            self.worker.dispatch(lambda: self.cancelled or self.on_progress(fraction, message))
+
+
+class BackgroundWorker:
+    """
+    Pool de threads dont les rappels sont renvoyés sur le thread principal
+
+    Args:
+        dispatch: fonction recevant un rappel sans argument à exécuter sur le
+                  thread de l'interface (avec Kivy: Clock.schedule_once);
+                  par défaut le rappel est exécuté directement
+        max_workers: nombre de threads; avec un seul thread, les tâches
+                     (import puis calculs) s'exécutent dans l'ordre de soumission
+    """
+
+    def __init__(self, dispatch=None, max_workers=1):
+        self.dispatch = dispatch or (lambda callback: callback())
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.latest = {}  # Dernière tâche soumise par clé de regroupement
+
+    def submit(self, func, *args, key=None, on_done=None, on_error=None, on_progress=None):
+        """
+        Exécute func(*args, task=tâche) en arrière-plan
+
+        Si key est fourni, la tâche remplace la précédente de même clé, qui
+        est annulée (requêtes répétées regroupées: seul le dernier résultat
+        est livré).
+
+        Returns:
+            La Task créée
+        """
+        task = Task(self, key, on_done, on_error, on_progress)
+        with self.lock:
+            if key is not None:
+                previous = self.latest.get(key)
+                if previous is not None:
+                    previous.cancel()
+                self.latest[key] = task
+            task.future = self.executor.submit(self.run, task, func, args)
+        return task
+
+    def run(self, task, func, args):
+        """Exécute une tâche dans un thread du pool et renvoie son issue au thread principal"""
+        try:
+            task.check_cancelled()
+            result = func(*args, task=task)
+        except TaskCancelled:
+            return
+        except Exception as e:
+            if not task.cancelled and task.on_error:
+                self.dispatch(lambda: task.cancelled or task.on_error(e))
+            return
+        finally:
+            self.forget(task)
+
+        if not task.cancelled and task.on_done:
+            self.dispatch(lambda: task.cancelled or task.on_done(result))
+
+    def forget(self, task):
+        """Retire une tâche terminée de la table de regroupement"""
+        with self.lock:
+            if task.key is not None and self.latest.get(task.key) is task:
+                del self.latest[task.key]
+
+    def is_busy(self, key):
+        """Indique si une tâche de cette clé est en attente ou en cours"""
+        with self.lock:
+            return key in self.latest
+
+    def shutdown(self, wait=False):
+        """Annule les tâches en attente et arrête le pool"""
+        with self.lock:
+            for task in self.latest.values():
+                task.cancel()
+            self.latest.clear()
+        self.executor.shutdown(wait=wait)
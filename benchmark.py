@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai GTFSPy - Génère un réseau GTFS synthétique paramétrable (de la
+ville au pays) et mesure l'import, la construction des index, la recherche
+d'arrêts et le calcul d'itinéraires; les résultats sont écrits en JSON
+pour comparer les performances entre deux commits
+
+Exemple:
+    python benchmark.py --preset city --output bench_city.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from math import cos, radians, sqrt, ceil
+
+from geo import METERS_PER_DEGREE
+from stop_times_store import format_gtfs_time
+
+try:
+    import resource
+except ImportError:  # Windows: pas de mesure de la mémoire résidente maximale
+    resource = None
+
+
+# Tailles de réseau prédéfinies
+PRESETS = {
+    'tiny': {'stops': 200, 'routes': 10, 'trips_per_hour': 4, 'shape_density': 4},
+    'city': {'stops': 3000, 'routes': 120, 'trips_per_hour': 6, 'shape_density': 8},
+    'region': {'stops': 25000, 'routes': 800, 'trips_per_hour': 3, 'shape_density': 8},
+    'national': {'stops': 120000, 'routes': 4000, 'trips_per_hour': 2, 'shape_density': 10}
+}
+
+# Instant de départ des requêtes: un lundi (service 'ALL' actif tous les jours)
+QUERY_DAY = datetime(2024, 1, 8)
+
+STOP_SPACING = 400  # Distance en mètres entre deux arrêts voisins de la grille
+SERVICE_HOURS = (5, 24)  # Heures de début et de fin du service
+
+
+def generate_feed(zip_path, stops=3000, routes=120, trips_per_hour=6, shape_density=8,
+                  seed=0, center=(48.8566, 2.3522)):
+    """
+    Écrit un réseau GTFS synthétique dans un ZIP
+
+    Les arrêts forment une grille perturbée (un arrêt tous les
+    STOP_SPACING mètres) dont la surface croît avec leur nombre; chaque
+    ligne suit une direction de la grille sur 8 à 40 arrêts, dans les deux
+    sens, avec trips_per_hour départs par heure et par sens. Chaque tracé
+    compte shape_density points intermédiaires entre deux arrêts.
+
+    Returns:
+        dict des comptages par table
+    """
+    rng = random.Random(seed)
+    side = ceil(sqrt(stops))
+    lat_step = STOP_SPACING / METERS_PER_DEGREE
+    lon_step = STOP_SPACING / (METERS_PER_DEGREE * cos(radians(center[0])))
+    origin_lat = center[0] - side / 2 * lat_step
+    origin_lon = center[1] - side / 2 * lon_step
+
+    coordinates = []
+    for i in range(stops):
+        row, col = divmod(i, side)
+        coordinates.append((
+            origin_lat + (row + rng.uniform(-0.3, 0.3)) * lat_step,
+            origin_lon + (col + rng.uniform(-0.3, 0.3)) * lon_step
+        ))
+
+    counts = {'stops': stops, 'routes': routes, 'trips': 0, 'stop_times': 0, 'shape_points': 0}
+    directions = [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+
+    # Les tables sont écrites dans un répertoire temporaire puis compressées
+    with tempfile.TemporaryDirectory() as staging_dir:
+        def writer(name):
+            return open(os.path.join(staging_dir, name), 'w', encoding='utf-8', newline='')
+
+        with writer('agency.txt') as f:
+            csv.writer(f).writerows([
+                ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+                ['BENCH', 'Réseau synthétique', 'http://example.com', 'Europe/Paris']
+            ])
+        with writer('calendar.txt') as f:
+            csv.writer(f).writerows([
+                ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                 'saturday', 'sunday', 'start_date', 'end_date'],
+                ['ALL', '1', '1', '1', '1', '1', '1', '1', '20240101', '20241231']
+            ])
+        with writer('stops.txt') as f:
+            out = csv.writer(f)
+            out.writerow(['stop_id', 'stop_name', 'stop_lat', 'stop_lon'])
+            for i, (lat, lon) in enumerate(coordinates):
+                out.writerow([f'S{i}', f'Arrêt {i}', f'{lat:.6f}', f'{lon:.6f}'])
+
+        with writer('routes.txt') as routes_file, writer('trips.txt') as trips_file, \
+                writer('stop_times.txt') as stop_times_file, writer('shapes.txt') as shapes_file:
+            routes_out = csv.writer(routes_file)
+            trips_out = csv.writer(trips_file)
+            stop_times_out = csv.writer(stop_times_file)
+            shapes_out = csv.writer(shapes_file)
+            routes_out.writerow(['route_id', 'route_short_name', 'route_long_name', 'route_type'])
+            trips_out.writerow(['route_id', 'service_id', 'trip_id', 'shape_id', 'direction_id'])
+            stop_times_out.writerow(['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'])
+            shapes_out.writerow(['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'])
+
+            for route in range(routes):
+                route_id = f'R{route}'
+                routes_out.writerow([route_id, str(route), f'Ligne {route}', '3'])
+
+                # Parcours: marche en ligne droite sur la grille depuis un arrêt aléatoire
+                dr, dc = rng.choice(directions)
+                row, col = divmod(rng.randrange(stops), side)
+                path = []
+                for _ in range(rng.randint(8, 40)):
+                    index = row * side + col
+                    if not (0 <= row < side and 0 <= col < side) or index >= stops:
+                        break
+                    path.append(index)
+                    row, col = row + dr, col + dc
+                if len(path) < 2:
+                    continue
+                hops = [rng.randint(60, 150) for _ in path[1:]]
+                dwell = rng.choice((0, 20))
+
+                for direction, sequence in enumerate((path, path[::-1])):
+                    hop_times = hops if direction == 0 else hops[::-1]
+                    shape_id = f'SH{route}_{direction}'
+                    point = 0
+                    for a, b in zip(sequence, sequence[1:]):
+                        (lat1, lon1), (lat2, lon2) = coordinates[a], coordinates[b]
+                        for k in range(shape_density + 1):
+                            t = k / (shape_density + 1)
+                            point += 1
+                            shapes_out.writerow([
+                                shape_id,
+                                f'{lat1 + (lat2 - lat1) * t + rng.uniform(-2e-5, 2e-5):.6f}',
+                                f'{lon1 + (lon2 - lon1) * t + rng.uniform(-2e-5, 2e-5):.6f}',
+                                point
+                            ])
+                    lat, lon = coordinates[sequence[-1]]
+                    shapes_out.writerow([shape_id, f'{lat:.6f}', f'{lon:.6f}', point + 1])
+                    counts['shape_points'] += point + 1
+
+                    headway = 3600 // trips_per_hour
+                    first = SERVICE_HOURS[0] * 3600 + rng.randrange(headway)
+                    for n, start in enumerate(range(first, SERVICE_HOURS[1] * 3600, headway)):
+                        trip_id = f'{route_id}_{direction}_{n}'
+                        trips_out.writerow([route_id, 'ALL', trip_id, shape_id, direction])
+                        counts['trips'] += 1
+                        time_at = start
+                        for position, stop in enumerate(sequence):
+                            if position:
+                                time_at += hop_times[position - 1]
+                            stop_times_out.writerow([
+                                trip_id, format_gtfs_time(time_at), format_gtfs_time(time_at + dwell),
+                                f'S{stop}', position + 1
+                            ])
+                            time_at += dwell
+                        counts['stop_times'] += len(sequence)
+
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name in sorted(os.listdir(staging_dir)):
+                zf.write(os.path.join(staging_dir, name), name)
+    return counts
+
+
+def percentiles(samples):
+    """Médiane, 99e centile et maximum (rang le plus proche), en millisecondes"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, ceil(p * len(ordered)) - 1))] * 1000
+
+    return {
+        'count': len(ordered),
+        'p50_ms': rank(0.5),
+        'p99_ms': rank(0.99),
+        'max_ms': ordered[-1] * 1000,
+        'mean_ms': sum(ordered) / len(ordered) * 1000
+    }
+
+
+def peak_rss_mb():
+    """Mémoire résidente maximale du processus en Mo (None si non mesurable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Octets sous macOS, kilo-octets sous Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def timed(func, *args, **kwargs):
+    """Exécute func et retourne (résultat, durée en secondes)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_benchmarks(zip_path, queries=200, seed=0, algorithms=('raptor', 'csa')):
+    """
+    Mesure les performances du GTFSManager et du RoutingEngine sur un ZIP GTFS
+
+    Les points et horaires des requêtes sont tirés avec une graine fixe:
+    deux exécutions sur le même réseau posent exactement les mêmes requêtes.
+
+    Returns:
+        dict des mesures (durées en secondes, latences en millisecondes)
+    """
+    from gtfs_manager import GTFSManager
+    from route_cache import RouteCache
+    from routing_engine import RoutingEngine
+
+    results = {'rss_start_mb': peak_rss_mb()}
+    manager = GTFSManager(storage_manager=None)
+    # Lecture des tables seule: les index sont mesurés à part
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        _, results['import_seconds'] = timed(
+            manager.load_gtfs_tables, manager.zip_table_opener(zip_ref), indexes=False
+        )
+    results['rss_after_import_mb'] = peak_rss_mb()
+
+    _, results['index_build_seconds'] = timed(manager.build_indexes)
+    _, results['service_calendar_seconds'] = timed(lambda: manager.service_calendar)
+    results['counts'] = {
+        'stops': len(manager.stops),
+        'trips': manager.stop_times_store.trip_count(),
+        'stop_times': len(manager.stop_times_store.stops),
+        'patterns': len(manager.get_trip_patterns()),
+        'footpaths': len(manager.get_footpaths())
+    }
+
+    rng = random.Random(seed)
+    index = manager.get_spatial_index()
+    lats, lons = index.lats, index.lons
+    bounds = (min(lats), max(lats), min(lons), max(lons))
+
+    def random_point():
+        return rng.uniform(bounds[0], bounds[1]), rng.uniform(bounds[2], bounds[3])
+
+    samples = []
+    for _ in range(queries * 5):
+        lat, lon = random_point()
+        _, elapsed = timed(manager.find_nearest_stop, lat, lon)
+        samples.append(elapsed)
+    results['nearest_stop'] = percentiles(samples)
+
+    # Cache désactivé: chaque requête est réellement calculée
+    engine = RoutingEngine(manager, RouteCache(max_size=0))
+    requests = [
+        (random_point(), random_point(), QUERY_DAY.replace(hour=rng.randint(6, 20), minute=rng.randrange(60)))
+        for _ in range(queries)
+    ]
+    for algorithm in algorithms:
+        # Première requête hors mesure: construction des moteurs
+        origin, destination, when = requests[0]
+        _, results[f'{algorithm}_warmup_seconds'] = timed(
+            engine.find_route, origin, destination, when, algorithm=algorithm
+        )
+        samples = []
+        found = 0
+        for origin, destination, when in requests:
+            route, elapsed = timed(engine.find_route, origin, destination, when, algorithm=algorithm)
+            samples.append(elapsed)
+            found += route is not None
+        results[f'route_{algorithm}'] = dict(percentiles(samples), found=found)
+
+    if 'astar' in algorithms:
+        # Mêmes requêtes A* après le précalcul des étiquettes de hubs
+        _, results['hub_labels_seconds'] = timed(manager.build_hub_labels)
+        results['counts']['hub_labels'] = manager.hub_labels.label_count()
+        samples = []
+        found = 0
+        for origin, destination, when in requests:
+            route, elapsed = timed(engine.find_route, origin, destination, when, algorithm='astar')
+            samples.append(elapsed)
+            found += route is not None
+        results['route_astar_hub_labels'] = dict(percentiles(samples), found=found)
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def git_commit():
+    """Commit courant du dépôt (None hors d'un dépôt git)"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    """Génère le réseau synthétique, exécute les mesures et écrit le rapport JSON"""
+    parser = argparse.ArgumentParser(description="Banc d'essai GTFSPy sur réseau synthétique")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='city')
+    parser.add_argument('--stops', type=int, help="Nombre d'arrêts")
+    parser.add_argument('--routes', type=int, help='Nombre de lignes')
+    parser.add_argument('--trips-per-hour', type=int, help='Départs par heure et par sens')
+    parser.add_argument('--shape-density', type=int, help='Points de tracé entre deux arrêts')
+    parser.add_argument('--queries', type=int, default=200, help="Nombre de requêtes d'itinéraire")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--algorithms', default='raptor,csa', help='Algorithmes mesurés (séparés par des virgules)')
+    parser.add_argument('--feed', help='ZIP GTFS existant à mesurer au lieu du réseau synthétique')
+    parser.add_argument('--output', help='Fichier JSON de sortie (sortie standard par défaut)')
+    args = parser.parse_args(argv)
+
+    parameters = dict(PRESETS[args.preset])
+    for name in ('stops', 'routes', 'trips_per_hour', 'shape_density'):
+        if getattr(args, name) is not None:
+            parameters[name] = getattr(args, name)
+
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed
+    }
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.feed:
+            zip_path = args.feed
+            report['feed'] = {'path': os.path.abspath(zip_path)}
+        else:
+            zip_path = os.path.join(tmpdir, 'synthetic_gtfs.zip')
+            counts, elapsed = timed(generate_feed, zip_path, seed=args.seed, **parameters)
+            report['feed'] = dict(parameters, preset=args.preset, generated=counts,
+                                  generation_seconds=elapsed)
+        report['feed']['zip_bytes'] = os.path.getsize(zip_path)
+        report['results'] = run_benchmarks(
+            zip_path, args.queries, args.seed, tuple(filter(None, args.algorithms.split(',')))
+        )
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"✓ Résultats écrits dans {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,7 +12,7 @@ echo "========================================================================"
 APP_NAME="GTFSPy"
 PACKAGE_NAME="org.gtfspy.gtfspy"
 VERSION="1.0.0"
-REQUIREMENTS="python3,kivy,kivymd,mapview,requests,pillow"
+REQUIREMENTS="python3,sqlite3,kivy,kivymd,mapview,requests,pillow"
 PERMISSIONS="INTERNET,ACCESS_FINE_LOCATION,ACCESS_COARSE_LOCATION,WRITE_EXTERNAL_STORAGE,READ_EXTERNAL_STORAGE"
 ORIENTATION="portrait"
 ANDROID_API=33
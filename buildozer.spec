@@ -16,7 +16,7 @@ source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,txt,csv,zip,json
 
 # (list) List of exclusions using pattern matching
-source.exclude_patterns = Log,*.md,test_core.py,create_sample_data.py
+source.exclude_patterns = Log,*.md,test_core.py,create_sample_data.py,benchmark.py
 
 # (str) Application versioning (method 1)
 version = 1.0.0
@@ -24,7 +24,7 @@ version = 1.0.0
 # (list) Application requirements
 # comma separated e.g. requirements = sqlite3,kivy
 # Note: For kivy-garden packages, use just the package name (e.g., mapview not kivy-garden.mapview)
-requirements = python3,kivy,kivymd,mapview,requests,pillow
+requirements = python3,sqlite3,kivy,kivymd,mapview,requests,pillow
 
 # (str) Supported orientation (landscape, portrait or all)
 orientation = portrait
@@ -0,0 +1,212 @@
+"""
+Connection Scan Algorithm (CSA) - Recherche d'itinéraires par un parcours
+linéaire d'un tableau de connexions élémentaires trié par heure de départ
+"""
+
+from array import array
+from bisect import bisect_left
+
+from instrumentation import instrumented, metrics
+from raptor import walk_leg
+from trip_patterns import fill_missing_times
+
+
+INFINITY = 2 ** 31 - 1
+
+
+class ConnectionScanEngine:
+    """
+    Connexions élémentaires (arrêt -> arrêt suivant d'un même trajet)
+    stockées en colonnes contiguës et triées par heure de départ
+
+    La connexion c part de departure_stops[c] à departure_times[c] et arrive
+    à arrival_stops[c] à arrival_times[c] avec le trajet trips[c]; rows[c]
+    est la ligne stop_times de départ. Les correspondances à pied
+    (footpaths) sont relâchées à chaque amélioration d'un arrêt.
+    """
+
+    @instrumented('csa_build')
+    def __init__(self, store, trips, footpaths=None):
+        self.store = store
+        self.footpaths = footpaths
+        self.route_ids = [trips.get(trip_id, {}).get('route_id') for trip_id in store.trip_ids]
+
+        connections = []
+        for trip_index in range(store.trip_count()):
+            start, end = store.trip_range(trip_index)
+            arrivals = list(store.arrivals[start:end])
+            departures = list(store.departures[start:end])
+            if end - start < 2 or not fill_missing_times(arrivals, departures):
+                continue
+            for i in range(end - start - 1):
+                connections.append((departures[i], arrivals[i + 1], start + i, trip_index))
+        # À horaires égaux, l'ordre des lignes garde les connexions d'un trajet dans l'ordre
+        connections.sort()
+
+        self.departure_times = array('i', (c[0] for c in connections))
+        self.arrival_times = array('i', (c[1] for c in connections))
+        self.rows = array('i', (c[2] for c in connections))
+        self.trips = array('i', (c[3] for c in connections))
+        self.departure_stops = array('i', (store.stops[c[2]] for c in connections))
+        self.arrival_stops = array('i', (store.stops[c[2] + 1] for c in connections))
+
+        # Connexion partant de chaque ligne stop_times (-1 pour la dernière d'un trajet)
+        self.connection_of_row = array('i', [-1]) * len(store)
+        for connection, row in enumerate(self.rows):
+            self.connection_of_row[row] = connection
+
+    def __len__(self):
+        return len(self.departure_times)
+
+    @instrumented('csa_search')
+    def earliest_arrival(self, sources, targets, active_trips=None):
+        """
+        Recherche d'arrivée au plus tôt en un seul parcours des connexions
+
+        Args:
+            sources: dict {stop_id: heure de départ possible en secondes}
+            targets: dict {stop_id: temps de sortie jusqu'à la destination en secondes}
+            active_trips: masque optionnel des trajets circulant le jour de la requête
+
+        Returns:
+            Itinéraire au même format que RaptorEngine.build_journey, ou None
+        """
+        store = self.store
+        stop_index = store.stop_index
+        arrival = [INFINITY] * len(store.stop_ids)
+        # Meilleure arrivée en véhicule (ou heure de départ d'une source):
+        # seule origine possible d'une marche, les marches ne s'enchaînant pas
+        transit_arrival = [INFINITY] * len(store.stop_ids)
+        # Connexions de montée et de descente ayant fixé l'arrivée en véhicule,
+        # et marches ayant fixé l'arrivée de chaque arrêt
+        journey_pointers = {}
+        walk_pointers = {}
+        boarded = {}
+
+        for stop_id, time in sources.items():
+            stop = stop_index.get(stop_id)
+            if stop is not None and time < transit_arrival[stop]:
+                arrival[stop] = transit_arrival[stop] = time
+        for stop_id in sources:
+            stop = stop_index.get(stop_id)
+            if stop is not None:
+                self.relax_footpaths(stop, transit_arrival[stop], arrival, walk_pointers)
+        start_time = min(sources.values(), default=INFINITY)
+
+        target_egress = {
+            stop_index[stop_id]: egress
+            for stop_id, egress in targets.items() if stop_id in stop_index
+        }
+        best_target = INFINITY
+        best_stop = None
+        for stop, egress in target_egress.items():
+            if arrival[stop] + egress < best_target:
+                best_target, best_stop = arrival[stop] + egress, stop
+
+        departure_times = self.departure_times
+        arrival_times = self.arrival_times
+        departure_stops = self.departure_stops
+        arrival_stops = self.arrival_stops
+        trips = self.trips
+
+        first = bisect_left(departure_times, start_time)
+        for c in range(first, len(departure_times)):
+            if departure_times[c] >= best_target:
+                break
+            trip = trips[c]
+            if trip not in boarded:
+                if active_trips is not None and not active_trips[trip]:
+                    continue
+                if arrival[departure_stops[c]] > departure_times[c]:
+                    continue
+                boarded[trip] = c
+            stop = arrival_stops[c]
+            time = arrival_times[c]
+            if time < transit_arrival[stop]:
+                transit_arrival[stop] = time
+                journey_pointers[stop] = (boarded[trip], c)
+                improved = self.relax_footpaths(stop, time, arrival, walk_pointers)
+                if time < arrival[stop]:
+                    arrival[stop] = time
+                    walk_pointers.pop(stop, None)
+                    improved.append(stop)
+                for reached in improved:
+                    egress = target_egress.get(reached)
+                    if egress is not None and arrival[reached] + egress < best_target:
+                        best_target, best_stop = arrival[reached] + egress, reached
+        else:
+            c = len(departure_times)
+
+        if metrics.enabled:
+            metrics.count('csa_searches')
+            metrics.count('csa_connections_scanned', c - first)
+
+        if best_stop is None:
+            return None
+
+        legs = []
+        stop = best_stop
+        can_walk = True
+        while True:
+            if can_walk and stop in walk_pointers:
+                source, duration = walk_pointers[stop]
+                legs.append(walk_leg(store, source, stop, arrival[stop] - duration, duration))
+                stop = source
+                can_walk = False
+            elif stop in journey_pointers:
+                enter, exit = journey_pointers[stop]
+                legs.append(self.build_leg(enter, exit))
+                stop = departure_stops[enter]
+                can_walk = True
+            else:
+                break
+        legs.reverse()
+
+        transit_legs = sum(1 for leg in legs if leg['type'] == 'transit')
+        return {
+            'departure_time': legs[0]['departure_time'] if legs else arrival[best_stop],
+            'arrival_time': best_target,
+            'transfers': max(transit_legs - 1, 0),
+            'legs': legs
+        }
+
+    def relax_footpaths(self, stop, time, arrival, walk_pointers):
+        """
+        Prolonge à pied une arrivée à un arrêt vers les arrêts proches
+
+        Returns:
+            Liste des arrêts dont l'heure d'arrivée a été améliorée
+        """
+        if self.footpaths is None:
+            return []
+        improved = []
+        footpaths = self.footpaths
+        for edge in range(footpaths.offsets[stop], footpaths.offsets[stop + 1]):
+            target = footpaths.targets[edge]
+            duration = footpaths.durations[edge]
+            if time + duration < arrival[target]:
+                arrival[target] = time + duration
+                walk_pointers[target] = (stop, duration)
+                improved.append(target)
+        return improved
+
+    def build_leg(self, enter, exit):
+        """Décrit le parcours en véhicule entre deux connexions d'un même trajet"""
+        store = self.store
+        connections = [self.connection_of_row[row] for row in range(self.rows[enter], self.rows[exit] + 1)]
+        stop_ids = [store.stop_ids[self.departure_stops[c]] for c in connections]
+        stop_ids.append(store.stop_ids[self.arrival_stops[exit]])
+        arrival_times = [self.arrival_times[c] for c in connections]
+        departure_times = [self.departure_times[c] for c in connections]
+        trip = self.trips[enter]
+        return {
+            'type': 'transit',
+            'trip_id': store.trip_ids[trip],
+            'route_id': self.route_ids[trip],
+            'stop_ids': stop_ids,
+            # Horaires par arrêt parcouru: arrivée à l'arrêt i, départ de l'arrêt i
+            'arrival_times': [departure_times[0]] + arrival_times,
+            'departure_times': departure_times + [arrival_times[-1]],
+            'departure_time': departure_times[0],
+            'arrival_time': arrival_times[-1]
+        }
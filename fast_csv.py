@@ -0,0 +1,133 @@
+"""
+Lecture CSV rapide - Résout les index des colonnes une seule fois à partir
+de l'en-tête, ne conserve que les colonnes utiles et convertit les valeurs
+en types natifs pendant la lecture (sans dict par ligne)
+"""
+
+import csv
+from array import array
+from operator import itemgetter
+
+from shape_store import ShapeStore
+from stop_times_store import parse_gtfs_time
+
+
+STOP_TIMES_COLUMNS = ('trip_id', 'stop_id', 'arrival_time', 'departure_time', 'stop_sequence')
+SHAPES_COLUMNS = ('shape_id', 'shape_pt_sequence', 'shape_pt_lat', 'shape_pt_lon')
+
+# Nombre de lignes stop_times converties par lot
+BATCH_SIZE = 100000
+
+
+def select_columns(reader, header, names):
+    """
+    Itère sur les lignes réduites aux colonnes demandées, dans l'ordre de names
+
+    Une colonne absente de l'en-tête vaut '' sur toutes les lignes, comme un
+    champ vide; les lignes trop courtes sont complétées de la même façon.
+    """
+    index = {name: i for i, name in enumerate(header)}
+    indices = [index.get(name, len(header)) for name in names]
+    width = max(indices) + 1
+    getter = itemgetter(*indices)
+    padding = [''] * width
+    single = len(indices) == 1
+
+    for row in reader:
+        if len(row) < width:
+            row = row + padding[len(row):]
+        yield (getter(row),) if single else getter(row)
+
+
+def read_columns(f, names):
+    """Lit l'en-tête d'un flux CSV puis itère sur ses lignes réduites aux colonnes demandées"""
+    reader = csv.reader(f)
+    header = next(reader, [])
+    return select_columns(reader, header, names)
+
+
+def read_dict(f, key_field, fields=None):
+    """
+    Charge un CSV dans un dictionnaire {clé: ligne}, chaque ligne étant un
+    dict limité aux colonnes fields (toutes si None)
+    """
+    reader = csv.reader(f)
+    header = next(reader, [])
+    names = tuple(fields) if fields else tuple(header)
+    if key_field not in names:
+        names += (key_field,)
+    key_position = names.index(key_field)
+
+    data = {}
+    for values in select_columns(reader, header, names):
+        key = values[key_position]
+        if key:
+            data[key] = dict(zip(names, values))
+    return data
+
+
+def parse_stop_times_rows(rows, batch_size=BATCH_SIZE):
+    """
+    Convertit des lignes (trip_id, stop_id, arrivée, départ, séquence) en colonnes typées
+
+    Les horaires sont mémorisés par chaîne: un réseau ne compte que
+    quelques milliers d'horaires distincts pour des millions de lignes.
+
+    Yields:
+        Lots (trip_ids, stop_ids, arrivées, départs, séquences) d'au plus
+        batch_size lignes, dans l'ordre du flux
+    """
+    times = {}
+    trip_ids, stop_ids = [], []
+    arrivals, departures, sequences = array('i'), array('i'), array('i')
+
+    for trip_id, stop_id, arrival, departure, sequence in rows:
+        if not trip_id:
+            continue
+        seconds = times.get(arrival)
+        if seconds is None:
+            seconds = times[arrival] = parse_gtfs_time(arrival)
+        arrivals.append(seconds)
+        seconds = times.get(departure)
+        if seconds is None:
+            seconds = times[departure] = parse_gtfs_time(departure)
+        departures.append(seconds)
+        trip_ids.append(trip_id)
+        stop_ids.append(stop_id)
+        sequences.append(int(sequence or 0))
+
+        if len(trip_ids) == batch_size:
+            yield trip_ids, stop_ids, arrivals, departures, sequences
+            trip_ids, stop_ids = [], []
+            arrivals, departures, sequences = array('i'), array('i'), array('i')
+
+    if trip_ids:
+        yield trip_ids, stop_ids, arrivals, departures, sequences
+
+
+def read_shapes(f, shapes=None):
+    """
+    Charge shapes.txt en colonnes typées regroupées par forme
+
+    Args:
+        shapes: ShapeStore à compléter (nouveau si None)
+
+    Returns:
+        ShapeStore des formes, points triés par shape_pt_sequence
+    """
+    points = {}
+    for shape_id, sequence, lat, lon in read_columns(f, SHAPES_COLUMNS):
+        if not shape_id:
+            continue
+        try:
+            point = (int(sequence or 0), float(lat), float(lon))
+        except ValueError:
+            continue  # Point sans coordonnées exploitables
+        points.setdefault(shape_id, []).append(point)
+
+    if shapes is None:
+        shapes = ShapeStore()
+    for shape_id, shape_points in points.items():
+        shape_points.sort(key=itemgetter(0))
+        shapes.add(shape_id, [p[1] for p in shape_points], [p[2] for p in shape_points])
+    return shapes
@@ -0,0 +1,283 @@
+"""
+Base SQLite du réseau - Stockage persistant et indexé des tables GTFS,
+interrogeable sans charger le réseau en mémoire et partageable entre
+processus
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+from math import cos, radians
+
+from fast_csv import SHAPES_COLUMNS, STOP_TIMES_COLUMNS, parse_stop_times_rows, read_columns
+from geo import METERS_PER_DEGREE, haversine
+from shape_store import ShapeStore, SIMPLIFICATION_LEVELS
+from stop_times_store import format_gtfs_time
+
+
+SCHEMA = """
+CREATE TABLE stops (stop_id TEXT PRIMARY KEY, stop_name TEXT, stop_lat REAL, stop_lon REAL, data TEXT);
+CREATE TABLE routes (route_id TEXT PRIMARY KEY, data TEXT);
+CREATE TABLE trips (trip_id TEXT PRIMARY KEY, route_id TEXT, service_id TEXT, shape_id TEXT, data TEXT);
+CREATE TABLE stop_times (trip_id TEXT, stop_id TEXT, arrival INTEGER, departure INTEGER, stop_sequence INTEGER);
+CREATE TABLE shapes (shape_id TEXT, sequence INTEGER, lat REAL, lon REAL);
+"""
+
+# Index créés après le chargement en masse (plus rapide que pendant les insertions)
+INDEXES = """
+CREATE INDEX stop_times_by_stop ON stop_times (stop_id, departure);
+CREATE INDEX stop_times_by_trip ON stop_times (trip_id, stop_sequence);
+CREATE INDEX shapes_by_shape ON shapes (shape_id, sequence);
+CREATE INDEX stops_by_position ON stops (stop_lat, stop_lon);
+"""
+
+
+def _float(value):
+    """Convertit une coordonnée, None si elle est vide ou invalide"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FeedDatabase:
+    """
+    Réseau GTFS dans une base SQLite
+
+    Chaque thread (et chaque processus, après un fork) réutilise sa propre
+    connexion; l'objet ne sérialise que le chemin de la base et peut donc
+    être transmis aux processus de calcul.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def connection(self):
+        """Connexion de lecture du thread courant (ouverte au premier appel)"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def close(self):
+        """Ferme la connexion du thread courant"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def load_tables(self, open_table, progress=None):
+        """
+        Construit la base depuis les tables GTFS, en flux
+
+        Toutes les insertions (executemany par lots) sont faites dans une
+        seule transaction, dans un fichier temporaire qui remplace ensuite
+        la base existante.
+
+        Args:
+            open_table: Fonction nom de fichier -> flux texte, ou None si absent
+            progress: Rappel optionnel progress(message)
+        """
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        self.close()
+
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                for name, insert in (
+                    ('stops.txt', self._insert_stops),
+                    ('routes.txt', self._insert_routes),
+                    ('trips.txt', self._insert_trips),
+                    ('stop_times.txt', self._insert_stop_times),
+                    ('shapes.txt', self._insert_shapes)
+                ):
+                    source = open_table(name)
+                    if source is None:
+                        continue
+                    if progress:
+                        progress(f"Base SQLite: {name}")
+                    with source as f:
+                        insert(connection, f)
+            connection.executescript(INDEXES)
+            connection.execute("ANALYZE")
+        finally:
+            connection.close()
+        os.replace(tmp_path, self.path)
+
+    def _insert_stops(self, connection, f):
+        connection.executemany(
+            "INSERT OR REPLACE INTO stops VALUES (?, ?, ?, ?, ?)",
+            (
+                (row['stop_id'], row.get('stop_name'), _float(row.get('stop_lat')),
+                 _float(row.get('stop_lon')), json.dumps(row))
+                for row in csv.DictReader(f) if row.get('stop_id')
+            )
+        )
+
+    def _insert_routes(self, connection, f):
+        connection.executemany(
+            "INSERT OR REPLACE INTO routes VALUES (?, ?)",
+            ((row['route_id'], json.dumps(row)) for row in csv.DictReader(f) if row.get('route_id'))
+        )
+
+    def _insert_trips(self, connection, f):
+        connection.executemany(
+            "INSERT OR REPLACE INTO trips VALUES (?, ?, ?, ?, ?)",
+            (
+                (row['trip_id'], row.get('route_id'), row.get('service_id'), row.get('shape_id'), json.dumps(row))
+                for row in csv.DictReader(f) if row.get('trip_id')
+            )
+        )
+
+    def _insert_stop_times(self, connection, f):
+        for batch in parse_stop_times_rows(read_columns(f, STOP_TIMES_COLUMNS)):
+            connection.executemany("INSERT INTO stop_times VALUES (?, ?, ?, ?, ?)", zip(*batch))
+
+    def _insert_shapes(self, connection, f):
+        rows = (
+            (shape_id, int(sequence or 0), _float(lat), _float(lon))
+            for shape_id, sequence, lat, lon in read_columns(f, SHAPES_COLUMNS) if shape_id
+        )
+        connection.executemany(
+            "INSERT INTO shapes VALUES (?, ?, ?, ?)",
+            (row for row in rows if row[2] is not None and row[3] is not None)
+        )
+
+    def count(self, table):
+        """Nombre de lignes d'une table"""
+        if table not in ('stops', 'routes', 'trips', 'stop_times', 'shapes'):
+            raise ValueError(f"Table inconnue: {table}")
+        return self.connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _row(self, query, key):
+        row = self.connection().execute(query, (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_stop(self, stop_id):
+        """Ligne de stops.txt d'un arrêt (dict), ou None"""
+        return self._row("SELECT data FROM stops WHERE stop_id = ?", stop_id)
+
+    def get_trip(self, trip_id):
+        """Ligne de trips.txt d'un trajet (dict), ou None"""
+        return self._row("SELECT data FROM trips WHERE trip_id = ?", trip_id)
+
+    def stops_within(self, lat, lon, radius):
+        """
+        Arrêts à moins de radius mètres d'un point (même format que
+        StopSpatialIndex.within_radius)
+
+        Le rectangle englobant est lu par l'index stops_by_position, puis
+        les distances exactes sont calculées sur les seuls candidats.
+
+        Returns:
+            Liste de tuples (stop_id, distance) triée par distance croissante
+        """
+        lat_delta = radius / METERS_PER_DEGREE
+        lon_delta = radius / (METERS_PER_DEGREE * max(cos(radians(lat)), 0.01))
+        rows = self.connection().execute(
+            "SELECT stop_id, stop_lat, stop_lon FROM stops "
+            "WHERE stop_lat BETWEEN ? AND ? AND stop_lon BETWEEN ? AND ?",
+            (lat - lat_delta, lat + lat_delta, lon - lon_delta, lon + lon_delta)
+        ).fetchall()
+        results = [
+            (stop_id, haversine(lat, lon, stop_lat, stop_lon))
+            for stop_id, stop_lat, stop_lon in rows
+        ]
+        return sorted((result for result in results if result[1] <= radius), key=lambda result: result[1])
+
+    def trips_for_stop(self, stop_id, after=None):
+        """
+        Passages à un arrêt, au format et dans l'ordre de
+        GTFSManager.get_trips_for_stop: trajets dans l'ordre de leur première
+        ligne dans stop_times.txt, puis par stop_sequence
+
+        Args:
+            after: Heure minimale de départ en secondes (tous si None)
+        """
+        # Les lignes sont insérées dans l'ordre du fichier: le rowid minimal
+        # d'un trajet donne son rang dans le stockage colonnaire (calculé une
+        # fois par trajet desservant l'arrêt)
+        rows = self.connection().execute(
+            "WITH first_rows AS ("
+            "SELECT trip_id, MIN(rowid) AS first_row FROM stop_times "
+            "WHERE trip_id IN (SELECT trip_id FROM stop_times WHERE stop_id = ?) GROUP BY trip_id) "
+            "SELECT s.trip_id, s.arrival, s.departure FROM stop_times AS s JOIN first_rows USING (trip_id) "
+            "WHERE s.stop_id = ? AND s.departure >= ? "
+            "ORDER BY first_rows.first_row, s.stop_sequence",
+            (stop_id, stop_id, -1 if after is None else after)
+        )
+        return [
+            {
+                'trip_id': trip_id,
+                'arrival_time': format_gtfs_time(arrival),
+                'departure_time': format_gtfs_time(departure)
+            }
+            for trip_id, arrival, departure in rows
+        ]
+
+    def trip_stop_ids(self, trip_id):
+        """Arrêts desservis par un trajet, dans l'ordre de passage"""
+        return [
+            stop_id for (stop_id,) in self.connection().execute(
+                "SELECT stop_id FROM stop_times WHERE trip_id = ? ORDER BY stop_sequence", (trip_id,)
+            )
+        ]
+
+    def has_shape(self, shape_id):
+        """Indique si la base contient des points pour une forme"""
+        return self.connection().execute(
+            "SELECT 1 FROM shapes WHERE shape_id = ? LIMIT 1", (shape_id,)
+        ).fetchone() is not None
+
+    def shape_points(self, shape_id):
+        """Points d'une forme triés par séquence: (lats, lons)"""
+        rows = self.connection().execute(
+            "SELECT lat, lon FROM shapes WHERE shape_id = ? ORDER BY sequence", (shape_id,)
+        ).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def shape_store(self, levels=SIMPLIFICATION_LEVELS):
+        """ShapeStore alimenté à la demande depuis la base"""
+        return DatabaseShapeStore(self, levels)
+
+
+class DatabaseShapeStore(ShapeStore):
+    """ShapeStore dont chaque forme est lue dans la base SQLite à sa première utilisation"""
+
+    def __init__(self, database, levels=SIMPLIFICATION_LEVELS):
+        super().__init__(levels=levels)
+        self.database = database
+        self.count = None  # Nombre de formes de la base, compté au premier appel
+
+    def __len__(self):
+        if self.count is None:
+            self.count = self.database.connection().execute(
+                "SELECT COUNT(DISTINCT shape_id) FROM shapes"
+            ).fetchone()[0]
+        return self.count
+
+    def __contains__(self, shape_id):
+        return shape_id in self.shape_index or self.database.has_shape(shape_id)
+
+    def shape_number(self, shape_id):
+        shape = self.shape_index.get(shape_id)
+        if shape is None and shape_id:
+            lats, lons = self.database.shape_points(shape_id)
+            if lats:
+                self.add(shape_id, lats, lons)
+                shape = self.shape_index[shape_id]
+        return shape
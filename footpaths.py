@@ -0,0 +1,86 @@
+"""
+Correspondances à pied - Graphe creux des trajets à pied entre arrêts
+proches, complété par transfers.txt, au format CSR
+"""
+
+from array import array
+from math import ceil
+
+from geo import haversine
+
+
+WALKING_SPEED = 1.2  # Vitesse de marche en mètres par seconde
+
+
+class Footpaths:
+    """
+    Correspondances à pied indexées par identifiant dense d'arrêt (celui du
+    stockage stop_times)
+
+    Les correspondances au départ de l'arrêt s sont
+    targets[offsets[s]:offsets[s + 1]], de durées durations[...] en secondes.
+    Elles relient tous les couples d'arrêts distincts à moins de max_distance
+    mètres; transfers.txt impose ensuite sa durée minimale (transfer_type 2),
+    ajoute des correspondances explicites (0 et 1) ou en interdit (3).
+    """
+
+    def __init__(self, store, spatial_index, transfers=(), max_distance=400, walking_speed=WALKING_SPEED):
+        self.stop_ids = store.stop_ids
+        self.stop_index = store.stop_index
+        self.max_distance = max_distance
+        self.walking_speed = walking_speed
+        count = len(store.stop_ids)
+
+        edges = {}
+        coordinates = {}
+        for source_id, lat, lon in zip(spatial_index.stop_ids, spatial_index.lats, spatial_index.lons):
+            source = store.stop_index.get(source_id)
+            if source is None:
+                continue
+            coordinates[source] = (lat, lon)
+            for target_id, distance in spatial_index.within_radius(lat, lon, max_distance):
+                target = store.stop_index.get(target_id)
+                if target is not None and target != source:
+                    edges[(source, target)] = self.walking_time(distance)
+
+        for row in transfers:
+            source = store.stop_index.get(row.get('from_stop_id'))
+            target = store.stop_index.get(row.get('to_stop_id'))
+            # Les durées minimales de correspondance sur un même arrêt ne sont pas gérées
+            if source is None or target is None or source == target:
+                continue
+            transfer_type = (row.get('transfer_type') or '0').strip()
+            if transfer_type == '3':
+                edges.pop((source, target), None)
+                continue
+            try:
+                duration = int(row.get('min_transfer_time') or '')
+            except ValueError:
+                duration = None
+            if duration is None:
+                duration = edges.get((source, target))
+            if duration is None and source in coordinates and target in coordinates:
+                duration = self.walking_time(haversine(*coordinates[source], *coordinates[target]))
+            edges[(source, target)] = duration or 0
+
+        self.offsets = array('i', [0]) * (count + 1)
+        self.targets = array('i')
+        self.durations = array('i')
+        for (source, target), duration in sorted(edges.items()):
+            self.offsets[source + 1] += 1
+            self.targets.append(target)
+            self.durations.append(duration)
+        for i in range(1, count + 1):
+            self.offsets[i] += self.offsets[i - 1]
+
+    def __len__(self):
+        return len(self.targets)
+
+    def walking_time(self, distance):
+        """Durée de marche (secondes entières) pour une distance en mètres"""
+        return int(ceil(distance / self.walking_speed))
+
+    def from_stop(self, stop):
+        """Itère sur les couples (arrêt dense, durée) accessibles à pied depuis un arrêt dense"""
+        for edge in range(self.offsets[stop], self.offsets[stop + 1]):
+            yield self.targets[edge], self.durations[edge]
@@ -0,0 +1,112 @@
+"""
+Calculs de distance - Haversine et approximation équirectangulaire, en
+version scalaire et en noyaux vectorisés (NumPy si disponible)
+"""
+
+from math import radians, sin, cos, sqrt, atan2, pi
+
+try:
+    import numpy as np
+except ImportError:  # Builds Android sans NumPy: repli en Python pur
+    np = None
+
+
+EARTH_RADIUS = 6371000  # Rayon de la Terre en mètres
+METERS_PER_DEGREE = EARTH_RADIUS * pi / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distance en mètres entre deux points (formule de Haversine)"""
+    lat1_rad = radians(lat1)
+    lat2_rad = radians(lat2)
+    delta_lat = radians(lat2 - lat1)
+    delta_lon = radians(lon2 - lon1)
+
+    a = sin(delta_lat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon / 2) ** 2
+    return EARTH_RADIUS * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def equirectangular(lat1, lon1, lat2, lon2):
+    """Distance approchée en mètres (projection équirectangulaire, précise à courte distance)"""
+    x = radians(lon2 - lon1) * cos(radians((lat1 + lat2) / 2))
+    y = radians(lat2 - lat1)
+    return EARTH_RADIUS * sqrt(x * x + y * y)
+
+
+def _select(values, indices):
+    """Sous-ensemble des coordonnées désigné par indices (toutes si None)"""
+    if indices is None:
+        return values
+    return [values[i] for i in indices]
+
+
+def haversine_one_to_many(lat, lon, lats, lons, indices=None):
+    """
+    Distances Haversine d'un point vers un ensemble de points
+
+    Args:
+        lats, lons: séquences de coordonnées (list, array('d') ou ndarray)
+        indices: sous-ensemble optionnel des points à évaluer
+
+    Returns:
+        ndarray de distances en mètres avec NumPy, liste sinon
+    """
+    if np is None:
+        return [haversine(lat, lon, lat2, lon2) for lat2, lon2 in zip(_select(lats, indices), _select(lons, indices))]
+
+    lats2 = np.asarray(lats, dtype=np.float64)
+    lons2 = np.asarray(lons, dtype=np.float64)
+    if indices is not None:
+        indices = np.asarray(indices, dtype=np.intp)
+        lats2, lons2 = lats2[indices], lons2[indices]
+    lats2, lons2 = np.radians(lats2), np.radians(lons2)
+    lat1, lon1 = radians(lat), radians(lon)
+    a = np.sin((lats2 - lat1) / 2) ** 2 + cos(lat1) * np.cos(lats2) * np.sin((lons2 - lon1) / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_many_to_many(lats1, lons1, lats2, lons2):
+    """
+    Matrice des distances Haversine entre deux ensembles de points
+
+    Returns:
+        ndarray (len(lats1) × len(lats2)) avec NumPy, liste de listes sinon
+    """
+    if np is None:
+        return [haversine_one_to_many(lat, lon, lats2, lons2) for lat, lon in zip(lats1, lons1)]
+
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lons1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def equirectangular_one_to_many(lat, lon, lats, lons, indices=None):
+    """Distances équirectangulaires d'un point vers un ensemble de points (voir haversine_one_to_many)"""
+    if np is None:
+        return [equirectangular(lat, lon, lat2, lon2) for lat2, lon2 in zip(_select(lats, indices), _select(lons, indices))]
+
+    lats2 = np.asarray(lats, dtype=np.float64)
+    lons2 = np.asarray(lons, dtype=np.float64)
+    if indices is not None:
+        indices = np.asarray(indices, dtype=np.intp)
+        lats2, lons2 = lats2[indices], lons2[indices]
+    x = np.radians(lons2 - lon) * np.cos(np.radians((lats2 + lat) / 2))
+    y = np.radians(lats2 - lat)
+    return EARTH_RADIUS * np.sqrt(x * x + y * y)
+
+
+def equirectangular_many_to_many(lats1, lons1, lats2, lons2):
+    """Matrice des distances équirectangulaires (voir haversine_many_to_many)"""
+    if np is None:
+        return [equirectangular_one_to_many(lat, lon, lats2, lons2) for lat, lon in zip(lats1, lons1)]
+
+    lat1 = np.asarray(lats1, dtype=np.float64)[:, None]
+    lon1 = np.asarray(lons1, dtype=np.float64)[:, None]
+    lat2 = np.asarray(lats2, dtype=np.float64)[None, :]
+    lon2 = np.asarray(lons2, dtype=np.float64)[None, :]
+    x = np.radians(lon2 - lon1) * np.cos(np.radians((lat1 + lat2) / 2))
+    y = np.radians(lat2 - lat1)
+    return EARTH_RADIUS * np.sqrt(x * x + y * y)
@@ -2,221 +2,1132 @@
 Gestionnaire GTFS - Gère l'importation et le traitement des fichiers GTFS
 """
 
+import io
 import os
+import shutil
 import zipfile
 import csv
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+from feed_database import DatabaseShapeStore, FeedDatabase
+from fast_csv import STOP_TIMES_COLUMNS, parse_stop_times_rows, read_columns, read_dict, read_shapes
+from footpaths import Footpaths
+from geo import haversine
+from hub_labels import HUB_LABELS_VERSION, HubLabels
+from instrumentation import instrumented, metrics
+from lazy_tables import LazyAttribute, LazyShapeStore
+from parallel_loader import submit_stop_times_chunks
+from service_calendar import ServiceCalendar
+from shape_store import ShapeStore
+from spatial_index import StopSpatialIndex
+from stop_graph import StopGraph
+from stop_times_store import StopTimesBuilder, StopTimesStore, format_gtfs_time, parse_gtfs_time
+from trip_patterns import TripPatterns
+
 
 class GTFSManager:
     """Gère les données GTFS (General Transit Feed Specification)"""
     
+    # Version du format des snapshots: à incrémenter à chaque modification
+    # des structures sérialisées par get_snapshot_state
+    SNAPSHOT_VERSION = 9
+    
+    # Colonnes de trips.txt conservées en mémoire
+    TRIP_FIELDS = ('trip_id', 'route_id', 'service_id', 'shape_id', 'trip_headsign', 'direction_id')
+    
+    # Tables peu utilisées chargées au premier accès (voir load_table_lazily)
+    calendar = LazyAttribute()
+    calendar_dates = LazyAttribute()
+    service_calendar = LazyAttribute()
+    shapes = LazyAttribute()
+    
     def __init__(self, storage_manager):
         self.storage_manager = storage_manager
+        self.lazy_loaders = {}  # Chargeurs des attributs paresseux en attente
+        self.lazy_sources = {}  # Fichiers extraits des tables paresseuses, pour les snapshots
         self.stops = {}
         self.routes = {}
         self.trips = {}
-        self.stop_times = {}
+        self.stop_times_store = StopTimesStore()
+        self._stop_times_view = None  # Vue {trip_id: [ligne, ...]} construite à la demande
         self.calendar = {}
-        self.shapes = {}
-        self.stop_to_trips_index = {}  # Index pour accélérer la recherche de trajets par arrêt
+        self.calendar_dates = []
+        self.service_calendar = None  # Bitsets des jours de circulation par service_id
+        self.shapes = ShapeStore()  # Tracés en float32 avec niveaux simplifiés par zoom
+        self.transfers = []  # Lignes de transfers.txt
+        # Index arrêt -> trajets: motifs de trajets (arrêt -> (motif, position))
+        self.trip_patterns = None
+        self._stop_to_trips_view = None  # Vue historique {stop_id: [trajet, ...]} construite à la demande
+        self.spatial_index = None  # Grille spatiale des arrêts pour les recherches de proximité
+        self.stop_graph = None  # Graphe arrêt -> arrêt suivant à coûts entiers (A*)
+        self.footpaths = None  # Correspondances à pied entre arrêts proches (CSR)
+        self.footpath_radius = 400  # Distance de marche maximale d'une correspondance, en mètres
+        self.progress = None  # Rappel d'avancement progress(fraction, message) pendant un import
+        self.database = None  # Base SQLite du réseau (FeedDatabase), optionnelle
+        self.hub_labels = None  # Étiquettes de hubs du graphe des arrêts (prétraitement hors ligne), optionnelles
+        self.hub_labels_graph = None  # Graphe pour lequel les étiquettes ont été vérifiées
+        # Génération du réseau: incrémentée à chaque remplacement d'une structure
+        # de routage (import, mise à jour, restauration, reconstruction d'un index)
+        self.generation = 0
+    
+    @property
+    def stop_times(self):
+        """Vue historique des horaires {trip_id: [ligne, ...]}, construite au premier accès"""
+        if self._stop_times_view is None:
+            self._stop_times_view = self.stop_times_store.to_dict_of_lists()
+        return self._stop_times_view
+    
+    @stop_times.setter
+    def stop_times(self, stop_times):
+        self.stop_times_store = StopTimesStore.from_dict_of_lists(stop_times, self.stops)
+        self._stop_times_view = None
+        self._stop_to_trips_view = None
+    
+    @property
+    def stop_to_trips_index(self):
+        """Vue historique {stop_id: [infos trajet, ...]}, construite au premier accès"""
+        if self._stop_to_trips_view is None:
+            self._stop_to_trips_view = self.build_stop_to_trips_view()
+        return self._stop_to_trips_view
+        
+    @instrumented('import_gtfs')
+    def import_gtfs(self, zip_path, extract=True, progress=None, workers=None, database=False, hub_labels=False):
+        """
+        Importe un fichier GTFS depuis un fichier ZIP
         
-    def import_gtfs(self, zip_path):
-        """Importe un fichier GTFS depuis un fichier ZIP"""
+        Args:
+            zip_path: Chemin du fichier ZIP GTFS
+            extract: Si False, les fichiers sont lus directement dans le ZIP
+                     sans être extraits sur le disque
+            progress: Rappel optionnel progress(fraction, message) appelé à
+                      chaque étape; il peut lever une exception pour
+                      interrompre l'import
+            workers: Nombre de processus du chargement parallèle des
+                     fichiers extraits (None ou 1: séquentiel)
+            database: Si True, construit aussi la base SQLite du réseau
+                      (voir build_database)
+            hub_labels: Si True, précalcule aussi les étiquettes de hubs
+                        des recherches A* (voir build_hub_labels)
+        """
+        self.progress = progress
+        created_dir = None  # Répertoire d'extraction créé par cet import
         try:
-            # Créer le répertoire de données GTFS si nécessaire
-            gtfs_dir = self.storage_manager.get_gtfs_dir()
-            
-            # Extraire le fichier ZIP
-            extract_dir = os.path.join(gtfs_dir, os.path.basename(zip_path).replace('.zip', ''))
+            extract_dir = None
             
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
+            if extract:
+                self.report_progress(0.0, "Extraction du ZIP")
+                # Créer le répertoire de données GTFS si nécessaire
+                gtfs_dir = self.storage_manager.get_gtfs_dir()
+                
+                # Extraire le fichier ZIP
+                extract_dir = os.path.join(gtfs_dir, os.path.basename(zip_path).replace('.zip', ''))
+                if not os.path.isdir(extract_dir):
+                    created_dir = extract_dir
+                
+                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                    zip_ref.extractall(extract_dir)
+                
+                # Charger les données GTFS
+                self.load_gtfs_data(extract_dir, workers)
+            else:
+                # Lire les fichiers en flux depuis le ZIP
+                self.load_gtfs_zip(zip_path)
             
-            # Charger les données GTFS
-            self.load_gtfs_data(extract_dir)
+            # Sauvegarder les métadonnées et le snapshot du réseau chargé
+            self.report_progress(0.95, "Écriture du snapshot")
+            details = self.write_snapshot(zip_path)
+            if database:
+                self.report_progress(0.97, "Construction de la base SQLite")
+                details['database_path'] = self.build_database(
+                    zip_path, self.storage_manager.get_database_path(details['source_hash'])
+                )
+            if hub_labels:
+                self.report_progress(0.98, "Précalcul des étiquettes de hubs")
+                details['hub_labels_path'] = self.build_hub_labels(details['source_hash'])
+            member_hashes = self.storage_manager.compute_member_hashes(zip_path)
             
-            # Sauvegarder les métadonnées
+            # Dernier point d'annulation: l'écriture des métadonnées valide
+            # l'import, qui devient l'import actif au prochain démarrage
+            self.report_progress(1.0, "Enregistrement de l'import")
             self.storage_manager.save_gtfs_metadata(
                 os.path.basename(zip_path),
                 extract_dir,
-                datetime.now()
+                datetime.now(),
+                source_path=os.path.abspath(zip_path),
+                member_hashes=member_hashes,
+                **details
             )
+            return True
+        except BaseException as e:
+            # Import annulé (TaskCancelled) ou en échec: rien n'a été enregistré
+            if created_dir is not None:
+                shutil.rmtree(created_dir, ignore_errors=True)
+            if not isinstance(e, Exception):
+                raise
+            print(f"Erreur lors de l'importation GTFS: {e}")
+            return False
+        finally:
+            self.progress = None
+    
+    @instrumented('update_gtfs')
+    def update_gtfs(self, zip_path, progress=None):
+        """
+        Met à jour le réseau chargé depuis une nouvelle version du ZIP GTFS
+        
+        Seuls les fichiers dont l'empreinte (CRC-32 et taille du ZIP) a
+        changé depuis le dernier import sont relus. Pour les horaires, seuls
+        les trajets ajoutés, supprimés ou modifiés sont remplacés dans le
+        stockage et dans les motifs; les autres structures dérivées ne sont
+        reconstruites que si leurs tables sources ont changé.
+        Sans import précédent comparable, un import complet est effectué.
+        
+        Returns:
+            True si la mise à jour a réussi
+        """
+        storage = self.storage_manager
+        previous = storage.get_active_gtfs_import() or {}
+        old_hashes = previous.get('member_hashes') or {}
+        database = 'database_path' in previous
+        hub_labels = 'hub_labels_path' in previous
+        if not old_hashes or not self.stop_times_store.trip_ids:
+            return self.import_gtfs(zip_path, extract=False, progress=progress, database=database,
+                                    hub_labels=hub_labels)
+        
+        self.progress = progress
+        try:
+            new_hashes = storage.compute_member_hashes(zip_path)
+            changed = {
+                name for name in set(old_hashes) | set(new_hashes)
+                if old_hashes.get(name) != new_hashes.get(name)
+            }
+            
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                self.report_progress(0.05, f"Mise à jour de {len(changed)} fichier(s)")
+                self.update_gtfs_tables(self.zip_table_opener(zip_ref), changed)
+            
+            self.report_progress(0.95, "Écriture du snapshot")
+            details = self.write_snapshot(zip_path)
+            # La base de l'import précédent décrit l'ancien réseau: reconstruite
+            # pour la nouvelle version, ou détachée si l'import n'en avait pas
+            self.detach_database()
+            if database:
+                self.report_progress(0.97, "Construction de la base SQLite")
+                details['database_path'] = self.build_database(
+                    zip_path, storage.get_database_path(details['source_hash'])
+                )
+            if hub_labels:
+                self.report_progress(0.98, "Précalcul des étiquettes de hubs")
+                details['hub_labels_path'] = self.build_hub_labels(details['source_hash'])
             
+            # Dernier point d'annulation avant la validation de la mise à jour
+            self.report_progress(1.0, "Enregistrement de la mise à jour")
+            # Les tables paresseuses non modifiées sont encore lues dans le
+            # répertoire extrait de l'import complet d'origine
+            lazy_tables_dir = previous.get('extract_dir') or previous.get('lazy_tables_dir')
+            if lazy_tables_dir:
+                details['lazy_tables_dir'] = lazy_tables_dir
+            storage.save_gtfs_metadata(
+                os.path.basename(zip_path),
+                None,
+                datetime.now(),
+                source_path=os.path.abspath(zip_path),
+                member_hashes=new_hashes,
+                **details
+            )
             return True
         except Exception as e:
-            print(f"Erreur lors de l'importation GTFS: {e}")
+            print(f"Erreur lors de la mise à jour GTFS: {e}")
             return False
+        finally:
+            self.progress = None
+    
+    def update_gtfs_tables(self, open_table, changed):
+        """
+        Recharge les tables modifiées et met à jour les structures dérivées
+        
+        Args:
+            open_table: Fonction nom de fichier -> flux texte, ou None si absent
+            changed: Noms des fichiers modifiés, ajoutés ou supprimés
+        """
+        self.generation += 1
+        def reload(name, loader, empty):
+            if name not in changed:
+                return None
+            source = open_table(name)
+            return loader(source) if source else empty
+        
+        tables = {
+            'stops': ('stops.txt', lambda source: self.load_csv_to_dict(source, 'stop_id'), {}),
+            'routes': ('routes.txt', lambda source: self.load_csv_to_dict(source, 'route_id'), {}),
+            'calendar': ('calendar.txt', lambda source: self.load_csv_to_dict(source, 'service_id'), {}),
+            'calendar_dates': ('calendar_dates.txt', self.load_csv_rows, []),
+            'shapes': ('shapes.txt', self.load_shapes, ShapeStore()),
+            'transfers': ('transfers.txt', self.load_csv_rows, [])
+        }
+        for attribute, (name, loader, empty) in tables.items():
+            data = reload(name, loader, empty)
+            if data is not None:
+                setattr(self, attribute, data)
+        
+        trips = reload('trips.txt', lambda source: self.load_csv_to_dict(source, 'trip_id', self.TRIP_FIELDS), {})
+        old_trips = self.trips
+        if trips is not None:
+            self.trips = trips
+        
+        stops_changed = 'stops.txt' in changed
+        stop_times_changed = bool({'stops.txt', 'trips.txt', 'stop_times.txt'} & changed)
+        if stop_times_changed:
+            self.report_progress(0.15, "Comparaison des horaires")
+            self.update_stop_times(open_table('stop_times.txt'), old_trips)
+            # De nouveaux arrêts denses invalident les structures indexées par arrêt
+            stops_changed = stops_changed or self.footpaths is None or \
+                self.footpaths.stop_ids is not self.stop_times_store.stop_ids
+        
+        if {'calendar.txt', 'calendar_dates.txt'} & changed:
+            self.build_service_calendar()
+        
+        if stops_changed:
+            self.report_progress(0.82, "Construction de l'index spatial")
+            self.build_spatial_index()
+        if stops_changed or 'transfers.txt' in changed:
+            self.report_progress(0.85, "Calcul des correspondances à pied")
+            self.build_footpaths()
+        if stop_times_changed or stops_changed or 'transfers.txt' in changed:
+            self.report_progress(0.9, "Construction du graphe des arrêts")
+            self.build_stop_graph()
     
-    def load_gtfs_data(self, gtfs_dir):
-        """Charge les données GTFS depuis un répertoire extrait"""
+    def update_stop_times(self, source, old_trips):
+        """
+        Remplace dans le stockage et les motifs les trajets ajoutés, supprimés ou modifiés
+        
+        Un trajet est modifié si ses lignes stop_times ou sa ligne (route_id)
+        ont changé; les identifiants denses des arrêts existants sont conservés.
+        """
+        old = self.stop_times_store
+        if source is None:
+            fresh = StopTimesStore()
+        else:
+            # Pré-interner les anciens arrêts pour garder des identifiants compatibles
+            builder = StopTimesBuilder(list(old.stop_ids) + list(self.stops))
+            try:
+                with self.open_source(source) as f:
+                    for batch in parse_stop_times_rows(read_columns(f, STOP_TIMES_COLUMNS)):
+                        builder.extend(*batch)
+            except Exception as e:
+                print(f"Erreur lors du chargement des stop_times: {e}")
+            fresh = builder.build()
+        
+        removed = {trip_id for trip_id in old.trip_ids if trip_id not in fresh.trip_index}
+        changed = set()
+        for trip_index, trip_id in enumerate(fresh.trip_ids):
+            old_index = old.trip_index.get(trip_id)
+            if old_index is None or not old.trip_rows_equal(old_index, fresh, trip_index) or \
+                    old_trips.get(trip_id, {}).get('route_id') != self.trips.get(trip_id, {}).get('route_id'):
+                changed.add(trip_id)
+        
+        store, kept = old.apply_trip_changes(fresh, changed, removed)
+        inserted = [store.trip_index[trip_id] for trip_id in store.trip_ids if trip_id in changed]
+        
+        patterns = self.trip_patterns
+        if patterns is None or patterns.store is not old:
+            self.stop_times_store = store
+            self.build_stop_to_trips_index()
+        else:
+            patterns.apply_trip_changes(store, self.trips, kept, inserted)
+            self.stop_times_store = store
+        self._stop_times_view = None
+        self._stop_to_trips_view = None
+    
+    def report_progress(self, fraction, message):
+        """Transmet l'avancement de l'import au rappel éventuel"""
+        if self.progress:
+            self.progress(fraction, message)
+    
+    @instrumented('write_snapshot')
+    def write_snapshot(self, zip_path):
+        """
+        Écrit le snapshot binaire du réseau chargé, indexé par l'empreinte du ZIP
+        
+        Returns:
+            Informations à enregistrer dans l'entrée de metadata.json
+        """
+        storage = self.storage_manager
+        source_hash = storage.compute_file_hash(zip_path)
+        source_size, source_mtime = storage.get_file_fingerprint(zip_path)
+        return {
+            'source_hash': source_hash,
+            'source_size': source_size,
+            'source_mtime': source_mtime,
+            'snapshot_path': storage.save_snapshot(
+                source_hash, self.SNAPSHOT_VERSION, self.get_snapshot_state()
+            ),
+            'snapshot_version': self.SNAPSHOT_VERSION
+        }
+    
+    def load_last_import(self, database_only=False):
+        """
+        Recharge le dernier import GTFS actif (démarrage à chaud)
+        
+        Le snapshot binaire est utilisé tant que le ZIP source n'a pas changé.
+        Si le ZIP a été modifié, il est réimporté; si le snapshot est absent
+        ou d'une ancienne version, il est reconstruit depuis la source.
+        
+        Args:
+            database_only: Si True et que l'import a une base SQLite, seule
+                           la base est rattachée: arrêts (y compris les
+                           recherches par position), trajets, passages et
+                           tracés y sont lus, sans charger le snapshot (pas
+                           de calcul d'itinéraires)
+        
+        Returns:
+            True si des données ont été chargées
+        """
+        storage = self.storage_manager
+        gtfs_info = storage.get_active_gtfs_import()
+        if not gtfs_info:
+            return False
+        
+        source_path = gtfs_info.get('source_path')
+        source_hash = gtfs_info.get('source_hash')
+        extract_dir = gtfs_info.get('extract_dir')
+        fingerprint = storage.get_file_fingerprint(source_path) if source_path else None
+        
+        # Le ZIP a changé depuis l'import: le snapshot est invalidé
+        if fingerprint and list(fingerprint) != [gtfs_info.get('source_size'), gtfs_info.get('source_mtime')]:
+            if storage.compute_file_hash(source_path) != source_hash:
+                return self.import_gtfs(
+                    source_path, extract=extract_dir is not None, database='database_path' in gtfs_info,
+                    hub_labels='hub_labels_path' in gtfs_info
+                )
+        
+        database_path = gtfs_info.get('database_path')
+        if database_only and database_path and os.path.exists(database_path):
+            self.attach_database(FeedDatabase(database_path))
+            return True
+        
+        state = storage.load_snapshot(
+            gtfs_info.get('snapshot_path'), source_hash, self.SNAPSHOT_VERSION
+        )
+        if state is not None:
+            self.restore_snapshot_state(state)
+            if database_path and os.path.exists(database_path):
+                self.attach_database(FeedDatabase(database_path))
+            self.load_hub_labels(gtfs_info.get('hub_labels_path'), source_hash)
+            return True
+        
+        # Pas de snapshot utilisable: recharger depuis la source
+        if extract_dir and os.path.isdir(extract_dir):
+            self.load_gtfs_data(extract_dir)
+        elif fingerprint:
+            self.load_gtfs_zip(source_path)
+        else:
+            return False
+        if database_path and os.path.exists(database_path):
+            self.attach_database(FeedDatabase(database_path))
+        self.load_hub_labels(gtfs_info.get('hub_labels_path'), source_hash)
+        
+        if fingerprint:
+            gtfs_info.update(self.write_snapshot(source_path))
+            storage.save_metadata()
+        return True
+    
+    def get_snapshot_state(self):
+        """
+        Retourne les structures chargées et indexées, à sérialiser dans un snapshot
+        
+        Les tables du calendrier encore en attente de chargement ne sont pas
+        lues: le snapshot conserve le chemin de leur fichier extrait et elles
+        restent paresseuses après restauration.
+        """
+        pending = {
+            attribute: self.lazy_sources.get(attribute)
+            for attribute in ('calendar', 'calendar_dates', 'service_calendar')
+            if attribute in self.lazy_loaders
+        }
+        
+        def loaded(attribute):
+            return None if attribute in pending else getattr(self, attribute)
+        
+        return {
+            'stops': self.stops,
+            'routes': self.routes,
+            'trips': self.trips,
+            'stop_times_store': self.stop_times_store,
+            'calendar': loaded('calendar'),
+            'calendar_dates': loaded('calendar_dates'),
+            'service_calendar': loaded('service_calendar'),
+            'lazy_sources': pending,
+            'shapes': self.shapes,
+            'transfers': self.transfers,
+            'trip_patterns': self.trip_patterns,
+            'spatial_index': self.spatial_index,
+            'footpaths': self.footpaths,
+            'stop_graph': self.stop_graph
+        }
+    
+    @instrumented('restore_snapshot')
+    def restore_snapshot_state(self, state):
+        """Restaure les structures depuis un snapshot"""
+        self.generation += 1
+        self.stops = state['stops']
+        self.routes = state['routes']
+        self.trips = state['trips']
+        self.stop_times_store = state['stop_times_store']
+        self._stop_times_view = None
+        self.calendar = state['calendar']
+        self.calendar_dates = state['calendar_dates']
+        self.service_calendar = state['service_calendar']
+        for attribute, source in state['lazy_sources'].items():
+            if attribute == 'service_calendar':
+                self.lazy_loaders[attribute] = self.create_service_calendar
+            else:
+                self.load_table_lazily(attribute, source, self.lazy_table_loader(attribute))
+        self.shapes = state['shapes']
+        self.transfers = state['transfers']
+        self.trip_patterns = state['trip_patterns']
+        self._stop_to_trips_view = None
+        self.spatial_index = state['spatial_index']
+        self.footpaths = state['footpaths']
+        self.stop_graph = state['stop_graph']
+    
+    @instrumented('build_database')
+    def build_database(self, zip_path, database_path):
+        """
+        Construit la base SQLite du réseau en lisant le ZIP en flux, puis l'attache
+        
+        Returns:
+            Chemin de la base, ou None en cas d'erreur
+        """
+        database = FeedDatabase(database_path)
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                database.load_tables(self.zip_table_opener(zip_ref))
+        except Exception as e:
+            print(f"Erreur lors de la construction de la base SQLite: {e}")
+            return None
+        self.attach_database(database)
+        return database_path
+    
+    def attach_database(self, database):
+        """
+        Attache une base SQLite du réseau
+        
+        Les recherches d'arrêts, de passages et de tracés l'interrogent
+        lorsque les tables correspondantes ne sont pas chargées en mémoire:
+        un processus peut ainsi répondre à ces requêtes sans charger le réseau.
+        """
+        self.database = database
+        shapes = self.shapes
+        # Un LazyShapeStore couvre un shapes.txt extrait: inutile de parcourir son index
+        if isinstance(shapes, DatabaseShapeStore) or \
+                not isinstance(shapes, LazyShapeStore) and not len(shapes):
+            self.shapes = database.shape_store()
+    
+    def detach_database(self):
+        """Détache la base SQLite et les tracés qu'elle alimentait"""
+        if self.database is None:
+            return
+        if isinstance(self.shapes, DatabaseShapeStore):
+            self.shapes = ShapeStore()
+        self.database.close()
+        self.database = None
+    
+    @instrumented('build_hub_labels')
+    def build_hub_labels(self, source_hash=None):
+        """
+        Prétraitement hors ligne: précalcule les étiquettes de hubs du graphe
+        des arrêts et les persiste avec le StorageManager
+        
+        Les recherches A* se réduisent ensuite à l'intersection de deux
+        listes d'étiquettes. Les étiquettes ne valent que pour le graphe
+        courant: elles sont ignorées après une mise à jour du réseau jusqu'au
+        prochain précalcul.
+        
+        Args:
+            source_hash: Empreinte du ZIP source (par défaut celle de l'import actif)
+        
+        Returns:
+            Chemin du fichier des étiquettes, ou None s'il n'a pas été écrit
+        """
+        self.hub_labels = HubLabels(
+            self.get_stop_graph(),
+            lambda fraction, message: self.report_progress(0.98 + 0.01 * fraction, message)
+        )
+        self.hub_labels_graph = self.stop_graph
+        self.generation += 1
+        
+        storage = self.storage_manager
+        if storage is None:
+            return None
+        gtfs_info = None
+        if source_hash is None:
+            gtfs_info = storage.get_active_gtfs_import()
+            source_hash = gtfs_info.get('source_hash') if gtfs_info else None
+        if not source_hash:
+            return None
+        path = storage.save_snapshot(
+            source_hash, HUB_LABELS_VERSION, self.hub_labels, storage.get_hub_labels_path(source_hash)
+        )
+        if gtfs_info is not None and path:
+            gtfs_info['hub_labels_path'] = path
+            storage.save_metadata()
+        return path
+    
+    def load_hub_labels(self, path, source_hash):
+        """
+        Charge des étiquettes de hubs persistées
+        
+        Returns:
+            True si elles ont été chargées et correspondent au graphe des arrêts
+        """
+        if not path:
+            return False
+        labels = self.storage_manager.load_snapshot(path, source_hash, HUB_LABELS_VERSION)
+        if labels is None or not labels.matches(self.get_stop_graph()):
+            return False
+        self.hub_labels = labels
+        self.hub_labels_graph = self.stop_graph
+        self.generation += 1
+        return True
+    
+    def get_hub_labels(self):
+        """Retourne les étiquettes de hubs si elles correspondent au graphe des arrêts courant, sinon None"""
+        if self.hub_labels is None:
+            return None
+        graph = self.get_stop_graph()
+        if self.hub_labels_graph is not graph:
+            if not self.hub_labels.matches(graph):
+                return None
+            self.hub_labels_graph = graph
+        return self.hub_labels
+    
+    @instrumented('load_gtfs_data')
+    def load_gtfs_data(self, gtfs_dir, workers=None):
+        """
+        Charge les données GTFS depuis un répertoire extrait
+        
+        Args:
+            workers: Nombre de processus pour le chargement parallèle
+                     (None ou 1: chargement séquentiel)
+        """
+        def open_table(name):
+            file_path = os.path.join(gtfs_dir, name)
+            return file_path if os.path.exists(file_path) else None
+        
+        if workers and workers > 1:
+            self.load_gtfs_tables_parallel(open_table, workers)
+        else:
+            self.load_gtfs_tables(open_table)
+    
+    @instrumented('load_gtfs_zip')
+    def load_gtfs_zip(self, zip_path):
+        """Charge les données GTFS en lisant chaque fichier en flux depuis le ZIP"""
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            self.load_gtfs_tables(self.zip_table_opener(zip_ref))
+    
+    def zip_table_opener(self, zip_ref):
+        """
+        Retourne une fonction nom de fichier -> flux texte lu dans un ZIP ouvert
+        (None si le fichier est absent)
+        """
+        # Les fichiers peuvent être dans un sous-répertoire de l'archive:
+        # retenir pour chaque nom le membre le moins profond
+        members = {}
+        for name in sorted(zip_ref.namelist(), key=lambda n: n.count('/')):
+            if not name.endswith('/'):
+                members.setdefault(os.path.basename(name), name)
+        
+        def open_table(name):
+            member = members.get(name)
+            if member is None:
+                return None
+            return io.TextIOWrapper(zip_ref.open(member), encoding='utf-8-sig', newline='')
+        
+        return open_table
+    
+    def load_gtfs_tables(self, open_table, indexes=True):
+        """
+        Charge les tables GTFS
+        
+        Args:
+            open_table: Fonction nom de fichier -> source (chemin ou flux texte),
+                        ou None si le fichier est absent
+            indexes: Si False, les index ne sont pas construits (voir build_indexes)
+        """
         # Charger les arrêts
-        stops_file = os.path.join(gtfs_dir, 'stops.txt')
-        if os.path.exists(stops_file):
+        self.report_progress(0.05, "Chargement des arrêts")
+        stops_file = open_table('stops.txt')
+        if stops_file:
             self.stops = self.load_csv_to_dict(stops_file, 'stop_id')
         
         # Charger les routes
-        routes_file = os.path.join(gtfs_dir, 'routes.txt')
-        if os.path.exists(routes_file):
+        self.report_progress(0.08, "Chargement des lignes")
+        routes_file = open_table('routes.txt')
+        if routes_file:
             self.routes = self.load_csv_to_dict(routes_file, 'route_id')
         
         # Charger les trajets
-        trips_file = os.path.join(gtfs_dir, 'trips.txt')
-        if os.path.exists(trips_file):
-            self.trips = self.load_csv_to_dict(trips_file, 'trip_id')
+        self.report_progress(0.1, "Chargement des trajets")
+        trips_file = open_table('trips.txt')
+        if trips_file:
+            self.trips = self.load_csv_to_dict(trips_file, 'trip_id', self.TRIP_FIELDS)
         
         # Charger les horaires d'arrêt
-        stop_times_file = os.path.join(gtfs_dir, 'stop_times.txt')
-        if os.path.exists(stop_times_file):
-            self.stop_times = self.load_stop_times(stop_times_file)
+        self.report_progress(0.15, "Chargement des horaires")
+        stop_times_file = open_table('stop_times.txt')
+        if stop_times_file:
+            self.stop_times_store = self.load_stop_times(stop_times_file)
+            self._stop_times_view = None
         
         # Charger le calendrier
-        calendar_file = os.path.join(gtfs_dir, 'calendar.txt')
-        if os.path.exists(calendar_file):
-            self.calendar = self.load_csv_to_dict(calendar_file, 'service_id')
+        self.report_progress(0.6, "Chargement du calendrier")
+        calendar_file = open_table('calendar.txt')
+        if calendar_file:
+            self.load_table_lazily('calendar', calendar_file, self.lazy_table_loader('calendar'))
+        
+        # Charger les exceptions de calendrier
+        calendar_dates_file = open_table('calendar_dates.txt')
+        if calendar_dates_file:
+            self.load_table_lazily('calendar_dates', calendar_dates_file, self.lazy_table_loader('calendar_dates'))
         
         # Charger les formes (shapes)
-        shapes_file = os.path.join(gtfs_dir, 'shapes.txt')
-        if os.path.exists(shapes_file):
-            self.shapes = self.load_shapes(shapes_file)
+        self.report_progress(0.65, "Chargement des tracés")
+        shapes_file = open_table('shapes.txt')
+        if shapes_file:
+            self.load_table_lazily('shapes', shapes_file, self.lazy_table_loader('shapes'))
+        
+        # Charger les correspondances
+        self.report_progress(0.72, "Chargement des correspondances")
+        transfers_file = open_table('transfers.txt')
+        if transfers_file:
+            self.transfers = self.load_csv_rows(transfers_file)
+        
+        if indexes:
+            self.build_indexes()
+    
+    def load_gtfs_tables_parallel(self, open_table, workers):
+        """
+        Charge les tables GTFS d'un répertoire en parallèle
+        
+        stop_times.txt est découpé en plages de lignes analysées par un pool
+        de processus, pendant que les autres fichiers sont lus par des
+        threads; les plages sont ensuite fusionnées dans l'ordre du fichier.
+        
+        Args:
+            open_table: Fonction nom de fichier -> chemin, ou None si absent
+            workers: Nombre de processus d'analyse de stop_times.txt
+        """
+        tables = {
+            'stops': ('stops.txt', lambda source: self.load_csv_to_dict(source, 'stop_id')),
+            'routes': ('routes.txt', lambda source: self.load_csv_to_dict(source, 'route_id')),
+            'trips': ('trips.txt', lambda source: self.load_csv_to_dict(source, 'trip_id', self.TRIP_FIELDS)),
+            'transfers': ('transfers.txt', self.load_csv_rows)
+        }
+        for attribute in ('calendar', 'calendar_dates', 'shapes'):
+            source = open_table(attribute + '.txt')
+            if source:
+                self.load_table_lazily(attribute, source, self.lazy_table_loader(attribute))
+        
+        self.report_progress(0.05, "Chargement parallèle des fichiers")
+        stop_times_path = open_table('stop_times.txt')
+        with ProcessPoolExecutor(workers) as processes:
+            # Soumettre les plages avant de démarrer les threads de lecture
+            chunks = submit_stop_times_chunks(processes, stop_times_path, workers) if stop_times_path else None
+            
+            with ThreadPoolExecutor(len(tables)) as threads:
+                futures = {}
+                for attribute, (name, loader) in tables.items():
+                    source = open_table(name)
+                    if source:
+                        futures[attribute] = threads.submit(loader, source)
+                for attribute, future in futures.items():
+                    setattr(self, attribute, future.result())
+            
+            if chunks is not None:
+                self.report_progress(0.4, "Fusion des horaires")
+                builder = StopTimesBuilder(self.stops)
+                try:
+                    for chunk in chunks:
+                        builder.extend(*chunk.result())
+                except Exception as e:
+                    print(f"Erreur lors du chargement des stop_times: {e}")
+                self.stop_times_store = builder.build()
+                self._stop_times_view = None
+        
+        self.build_indexes()
+    
+    @instrumented('build_indexes')
+    def build_indexes(self):
+        """Précalcule les structures dérivées des tables chargées"""
+        self.generation += 1
+        # Jours de circulation de chaque service: calculés au premier besoin
+        self.lazy_loaders['service_calendar'] = self.create_service_calendar
         
         # Construire l'index stop_id -> trips
+        self.report_progress(0.75, "Construction des motifs de trajets")
         self.build_stop_to_trips_index()
+        
+        # Construire l'index spatial des arrêts
+        self.report_progress(0.82, "Construction de l'index spatial")
+        self.build_spatial_index()
+        
+        # Précalculer les correspondances à pied entre arrêts proches
+        self.report_progress(0.85, "Calcul des correspondances à pied")
+        self.build_footpaths()
+        
+        # Précalculer le graphe des arrêts pour A*
+        self.report_progress(0.9, "Construction du graphe des arrêts")
+        self.build_stop_graph()
+    
+    def load_table_lazily(self, attribute, source, loader):
+        """
+        Charge une table peu utilisée au premier accès à son attribut
+        
+        Un fichier extrait est relu à la demande: shapes.txt n'est alors
+        qu'indexé (positions des lignes de chaque shape_id), chaque forme
+        étant lue lors de sa première utilisation. Un flux (lecture dans le
+        ZIP) ne peut pas être relu plus tard et est chargé immédiatement.
+        """
+        if not isinstance(source, str):
+            setattr(self, attribute, loader(source))
+        elif attribute == 'shapes':
+            self.shapes = LazyShapeStore(source)
+        else:
+            self.lazy_loaders[attribute] = lambda: loader(source)
+            self.lazy_sources[attribute] = source
+    
+    def lazy_table_loader(self, attribute):
+        """Fonction source -> valeur d'une table chargée paresseusement"""
+        if attribute == 'calendar':
+            return lambda source: self.load_csv_to_dict(source, 'service_id')
+        if attribute == 'calendar_dates':
+            return self.load_csv_rows
+        return self.load_shapes
+    
+    def open_source(self, source):
+        """Ouvre une source CSV: chemin de fichier ou flux texte déjà ouvert"""
+        if isinstance(source, str):
+            return open(source, 'r', encoding='utf-8-sig', newline='')
+        return source
     
-    def load_csv_to_dict(self, file_path, key_field):
-        """Charge un fichier CSV GTFS dans un dictionnaire"""
+    def load_csv_to_dict(self, source, key_field, fields=None):
+        """
+        Charge un fichier CSV GTFS (chemin ou flux) dans un dictionnaire
+        
+        Args:
+            fields: Colonnes à conserver dans chaque ligne (toutes si None)
+        """
         data = {}
         try:
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    key = row.get(key_field)
-                    if key:
-                        data[key] = row
+            with self.open_source(source) as f:
+                data = read_dict(f, key_field, fields)
+            metrics.count('csv_rows_parsed', len(data))
         except Exception as e:
-            print(f"Erreur lors du chargement de {file_path}: {e}")
+            print(f"Erreur lors du chargement de {getattr(source, 'name', source)}: {e}")
         return data
     
-    def load_stop_times(self, file_path):
-        """Charge les horaires d'arrêt, organisés par trip_id"""
-        stop_times = {}
+    def load_csv_rows(self, source):
+        """Charge un fichier CSV GTFS (chemin ou flux) sous forme de liste de lignes"""
+        rows = []
         try:
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    trip_id = row.get('trip_id')
-                    if trip_id:
-                        if trip_id not in stop_times:
-                            stop_times[trip_id] = []
-                        stop_times[trip_id].append(row)
-            
-            # Trier par séquence
-            for trip_id in stop_times:
-                stop_times[trip_id].sort(
-                    key=lambda x: int(x.get('stop_sequence', 0))
-                )
+            with self.open_source(source) as f:
+                rows = list(csv.DictReader(f))
+        except Exception as e:
+            print(f"Erreur lors du chargement de {getattr(source, 'name', source)}: {e}")
+        return rows
+    
+    @instrumented('load_stop_times')
+    def load_stop_times(self, source):
+        """Charge les horaires d'arrêt dans un stockage colonnaire, organisé par trip_id"""
+        builder = StopTimesBuilder(self.stops)
+        try:
+            with self.open_source(source) as f:
+                for batch in parse_stop_times_rows(read_columns(f, STOP_TIMES_COLUMNS)):
+                    builder.extend(*batch)
+                    metrics.count('stop_times_rows_parsed', len(batch[0]))
+                    self.report_progress(0.15, f"Chargement des horaires ({len(builder.trips)} lignes)")
         except Exception as e:
             print(f"Erreur lors du chargement des stop_times: {e}")
-        return stop_times
+        
+        # Regrouper par trajet et trier par séquence
+        return builder.build()
     
-    def load_shapes(self, file_path):
-        """Charge les formes géographiques, organisées par shape_id"""
-        shapes = {}
+    @instrumented('load_shapes')
+    def load_shapes(self, source):
+        """Charge les formes géographiques dans un ShapeStore (points triés par séquence)"""
+        shapes = ShapeStore()
         try:
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    shape_id = row.get('shape_id')
-                    if shape_id:
-                        if shape_id not in shapes:
-                            shapes[shape_id] = []
-                        shapes[shape_id].append(row)
-            
-            # Trier par séquence
-            for shape_id in shapes:
-                shapes[shape_id].sort(
-                    key=lambda x: int(x.get('shape_pt_sequence', 0))
-                )
+            with self.open_source(source) as f:
+                shapes = read_shapes(f)
         except Exception as e:
             print(f"Erreur lors du chargement des shapes: {e}")
         return shapes
     
+    def get_trip_shape(self, trip_id, from_stop_id, to_stop_id, zoom=None):
+        """
+        Tracé d'un trajet entre deux de ses arrêts
+        
+        Le tracé provient de shapes.txt, au niveau de simplification du zoom
+        de carte; sans forme associée au trajet, la polyligne relie les
+        arrêts desservis entre les deux arrêts.
+        
+        Returns:
+            Liste [(lat, lon), ...], vide si le trajet ou un arrêt est inconnu
+        """
+        trip = self.get_trip(trip_id)
+        from_stop = self.get_stop(from_stop_id)
+        to_stop = self.get_stop(to_stop_id)
+        if trip is None or not from_stop or not to_stop:
+            return []
+        
+        shape_id = trip.get('shape_id')
+        if shape_id in self.shapes:
+            return self.shapes.slice_between(
+                shape_id,
+                float(from_stop['stop_lat']), float(from_stop['stop_lon']),
+                float(to_stop['stop_lat']), float(to_stop['stop_lon']),
+                zoom
+            )
+        
+        stop_ids = self.get_trip_stop_ids(trip_id)
+        if from_stop_id not in stop_ids:
+            return []
+        first = stop_ids.index(from_stop_id)
+        if to_stop_id not in stop_ids[first:]:
+            return []
+        last = stop_ids.index(to_stop_id, first)
+        stops = [self.get_stop(stop_id) for stop_id in stop_ids[first:last + 1]]
+        return [(float(stop['stop_lat']), float(stop['stop_lon'])) for stop in stops if stop]
+    
+    def get_stop(self, stop_id):
+        """Retourne un arrêt (dict), lu dans la base SQLite s'il n'est pas en mémoire"""
+        stop = self.stops.get(stop_id)
+        if stop is None and self.database is not None:
+            stop = self.database.get_stop(stop_id)
+        return stop
+    
+    def get_trip(self, trip_id):
+        """Retourne un trajet (dict), lu dans la base SQLite s'il n'est pas en mémoire"""
+        trip = self.trips.get(trip_id)
+        if trip is None and self.database is not None:
+            trip = self.database.get_trip(trip_id)
+        return trip
+    
+    def get_trip_stop_ids(self, trip_id):
+        """Arrêts desservis par un trajet, dans l'ordre de passage"""
+        store = self.stop_times_store
+        trip_index = store.trip_index.get(trip_id)
+        if trip_index is not None:
+            start, end = store.trip_range(trip_index)
+            return [store.stop_ids[stop] for stop in store.stops[start:end]]
+        if self.database is not None:
+            return self.database.trip_stop_ids(trip_id)
+        return []
+    
+    @instrumented('build_trip_patterns')
     def build_stop_to_trips_index(self):
-        """Construit un index pour accélérer la recherche de trajets par arrêt"""
-        self.stop_to_trips_index = {}
+        """
+        Construit l'index arrêt -> trajets sous forme de motifs de trajets
+        
+        Les trajets d'une ligne partageant la même séquence d'arrêts forment
+        un motif dont les horaires sont une table entière trajets × arrêts;
+        chaque arrêt est indexé vers ses couples (motif, position).
+        """
+        self.trip_patterns = TripPatterns(self.stop_times_store, self.trips)
+        self._stop_to_trips_view = None
+        self.generation += 1
+    
+    def build_stop_to_trips_view(self):
+        """Construit la vue historique {stop_id: [infos trajet, ...]} depuis le stockage colonnaire"""
+        stop_to_trips = {}
+        store = self.stop_times_store
+        stop_ids = store.stop_ids
         
-        for trip_id, stop_time_list in self.stop_times.items():
-            for i, stop_time in enumerate(stop_time_list):
-                stop_id = stop_time.get('stop_id')
+        for trip_index, trip_id in enumerate(store.trip_ids):
+            start, end = store.trip_range(trip_index)
+            for row in range(start, end):
+                stop_id = stop_ids[store.stops[row]]
                 if stop_id:
-                    if stop_id not in self.stop_to_trips_index:
-                        self.stop_to_trips_index[stop_id] = []
+                    if stop_id not in stop_to_trips:
+                        stop_to_trips[stop_id] = []
                     
                     # Stocker trip_id, position dans le trajet, et l'arrêt suivant s'il existe
                     trip_info = {
                         'trip_id': trip_id,
-                        'position': i,
-                        'arrival_time': stop_time.get('arrival_time'),
-                        'departure_time': stop_time.get('departure_time')
+                        'position': row - start,
+                        'arrival_time': format_gtfs_time(store.arrivals[row]),
+                        'departure_time': format_gtfs_time(store.departures[row])
                     }
                     
                     # Ajouter l'arrêt suivant si disponible
-                    if i + 1 < len(stop_time_list):
-                        trip_info['next_stop_id'] = stop_time_list[i + 1].get('stop_id')
-                        trip_info['next_arrival_time'] = stop_time_list[i + 1].get('arrival_time')
+                    if row + 1 < end:
+                        trip_info['next_stop_id'] = stop_ids[store.stops[row + 1]]
+                        trip_info['next_arrival_time'] = format_gtfs_time(store.arrivals[row + 1])
                     
-                    self.stop_to_trips_index[stop_id].append(trip_info)
-    
-    def find_nearest_stop(self, lat, lon, max_distance=1000):
-        """Trouve l'arrêt le plus proche d'une coordonnée donnée"""
-        nearest_stop = None
-        min_distance = float('inf')
-        
-        for stop_id, stop in self.stops.items():
-            try:
-                stop_lat = float(stop['stop_lat'])
-                stop_lon = float(stop['stop_lon'])
-                
-                # Calcul de la distance approximative (formule simple)
-                distance = self.calculate_distance(lat, lon, stop_lat, stop_lon)
-                
-                if distance < min_distance and distance < max_distance:
-                    min_distance = distance
-                    nearest_stop = stop
-            except (ValueError, KeyError):
-                continue
+                    stop_to_trips[stop_id].append(trip_info)
         
-        return nearest_stop, min_distance
+        return stop_to_trips
     
-    def calculate_distance(self, lat1, lon1, lat2, lon2):
-        """Calcule la distance entre deux points (formule de Haversine)"""
-        from math import radians, sin, cos, sqrt, atan2
+    def next_departures(self, stop_id, departure_time, count=5, day=None):
+        """
+        Prochains départs depuis un arrêt (recherche dichotomique par motif)
         
-        R = 6371000  # Rayon de la Terre en mètres
+        Args:
+            stop_id: ID de l'arrêt
+            departure_time: Heure à partir de laquelle chercher (secondes ou HH:MM:SS)
+            count: Nombre maximal de départs
+            day: date optionnelle pour ne garder que les trajets circulant ce jour
         
-        lat1_rad = radians(lat1)
-        lat2_rad = radians(lat2)
-        delta_lat = radians(lat2 - lat1)
-        delta_lon = radians(lon2 - lon1)
+        Returns:
+            Liste de dictionnaires (trip_id, route_id, departure_time) triée par heure
+        """
+        stop = self.stop_times_store.stop_index.get(stop_id)
+        if stop is None:
+            return []
+        if isinstance(departure_time, str):
+            departure_time = parse_gtfs_time(departure_time)
         
-        a = sin(delta_lat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
+        patterns = self.get_trip_patterns()
+        active_trips = self.get_active_trips(day) if day else None
+        departures = []
+        for time, pattern, trip in patterns.next_departures(stop, departure_time, count, active_trips):
+            departures.append({
+                'trip_id': self.stop_times_store.trip_ids[patterns.pattern_trips[pattern][trip]],
+                'route_id': patterns.pattern_route[pattern],
+                'departure_time': format_gtfs_time(time)
+            })
+        return departures
+    
+    def build_service_calendar(self):
+        """Précalcule les bitsets de jours de circulation (calendar + calendar_dates)"""
+        self.service_calendar = self.create_service_calendar()
+        self.generation += 1
+    
+    @instrumented('build_service_calendar')
+    def create_service_calendar(self):
+        """Crée le calendrier de service, ou None si le réseau ne définit aucun calendrier"""
+        if self.calendar or self.calendar_dates:
+            return ServiceCalendar(self.calendar, self.calendar_dates)
+        return None
+    
+    def get_active_trips(self, day):
+        """
+        Retourne le masque des trajets circulant un jour donné
         
-        distance = R * c
-        return distance
+        Returns:
+            bytearray indexé par identifiant dense de trajet (1 = circule),
+            ou None si le réseau ne définit aucun calendrier
+        """
+        if self.service_calendar is None:
+            return None
+        services = self.service_calendar.active_services(day)
+        return bytearray(
+            self.trips.get(trip_id, {}).get('service_id') in services
+            for trip_id in self.stop_times_store.trip_ids
+        )
+    
+    def get_trip_patterns(self):
+        """Retourne les motifs de trajets, reconstruits si les stop_times ont changé"""
+        if self.trip_patterns is None or self.trip_patterns.store is not self.stop_times_store:
+            self.build_stop_to_trips_index()
+        return self.trip_patterns
+    
+    @instrumented('build_footpaths')
+    def build_footpaths(self):
+        """Précalcule les correspondances à pied (rayon de marche + transfers.txt)"""
+        self.footpaths = Footpaths(
+            self.stop_times_store, self.get_spatial_index(), self.transfers, self.footpath_radius
+        )
+        self.generation += 1
+    
+    def get_footpaths(self):
+        """Retourne les correspondances à pied, reconstruites si les stop_times ont changé"""
+        if self.footpaths is None or self.footpaths.stop_ids is not self.stop_times_store.stop_ids:
+            self.build_footpaths()
+        return self.footpaths
+    
+    @instrumented('build_stop_graph')
+    def build_stop_graph(self):
+        """Précalcule le graphe des arrêts (CSR, coûts en secondes) utilisé par A*"""
+        self.stop_graph = StopGraph(self.stop_times_store, self.get_spatial_index(), self.get_footpaths())
+        self.generation += 1
+    
+    def get_stop_graph(self):
+        """Retourne le graphe des arrêts, reconstruit si les stop_times ont changé"""
+        if self.stop_graph is None or self.stop_graph.stop_ids is not self.stop_times_store.stop_ids:
+            self.build_stop_graph()
+        return self.stop_graph
+    
+    @instrumented('build_spatial_index')
+    def build_spatial_index(self):
+        """Construit la grille spatiale sur les coordonnées des arrêts"""
+        self.spatial_index = StopSpatialIndex(self.stops)
+        self.generation += 1
+    
+    def get_spatial_index(self):
+        """Retourne l'index spatial, construit au premier besoin"""
+        if self.spatial_index is None:
+            self.build_spatial_index()
+        return self.spatial_index
+    
+    @instrumented('find_nearest_stop')
+    def find_nearest_stop(self, lat, lon, max_distance=1000):
+        """Trouve l'arrêt le plus proche d'une coordonnée donnée"""
+        if self.serves_stops_from_database():
+            nearest = self.find_nearest_stops(lat, lon, 1, max_distance)
+            return nearest[0] if nearest else (None, float('inf'))
+        stop_id, distance = self.get_spatial_index().nearest(lat, lon, max_distance)
+        if stop_id is None:
+            return None, distance
+        return self.stops[stop_id], distance
+    
+    def find_nearest_stops(self, lat, lon, count, max_distance=1000):
+        """Trouve les count arrêts les plus proches, triés par distance (liste de (arrêt, distance))"""
+        if self.serves_stops_from_database():
+            return self.find_stops_within(lat, lon, max_distance)[:count]
+        return [
+            (self.stops[stop_id], distance)
+            for stop_id, distance in self.get_spatial_index().k_nearest(lat, lon, count, max_distance)
+        ]
+    
+    def find_stops_within(self, lat, lon, radius):
+        """Trouve tous les arrêts à moins de radius mètres (liste de (arrêt, distance))"""
+        if self.serves_stops_from_database():
+            return [
+                (self.database.get_stop(stop_id), distance)
+                for stop_id, distance in self.database.stops_within(lat, lon, radius)
+            ]
+        return [
+            (self.stops[stop_id], distance)
+            for stop_id, distance in self.get_spatial_index().within_radius(lat, lon, radius)
+        ]
+    
+    def serves_stops_from_database(self):
+        """Indique si les arrêts ne sont pas en mémoire et sont lus dans la base SQLite"""
+        return not self.stops and self.database is not None
+    
+    def calculate_distance(self, lat1, lon1, lat2, lon2):
+        """Calcule la distance entre deux points (formule de Haversine)"""
+        return haversine(lat1, lon1, lat2, lon2)
     
     def get_trips_for_stop(self, stop_id):
-        """Récupère tous les trajets passant par un arrêt donné (utilise l'index pour performance)"""
-        if stop_id in self.stop_to_trips_index:
-            trips = []
-            for trip_info in self.stop_to_trips_index[stop_id]:
-                trips.append({
-                    'trip_id': trip_info['trip_id'],
-                    'arrival_time': trip_info['arrival_time'],
-                    'departure_time': trip_info['departure_time']
-                })
-            return trips
-        return []
+        """
+        Récupère tous les trajets passant par un arrêt donné (lecture du
+        stockage colonnaire, ou de la base SQLite si les horaires ne sont pas
+        chargés en mémoire)
+        """
+        store = self.stop_times_store
+        if stop_id not in store.stop_index and self.database is not None:
+            return self.database.trips_for_stop(stop_id)
+        trips = []
+        for row in store.rows_for_stop(stop_id):
+            trips.append({
+                'trip_id': store.trip_ids[store.trip_of_row(row)],
+                'arrival_time': format_gtfs_time(store.arrivals[row]),
+                'departure_time': format_gtfs_time(store.departures[row])
+            })
+        return trips
     
     def is_gtfs_loaded(self):
         """Vérifie si des données GTFS sont chargées"""
@@ -0,0 +1,233 @@
+"""
+Étiquettes de hubs - Prétraitement hors ligne du graphe des arrêts pour
+répondre aux recherches de plus court chemin par intersection d'étiquettes
+(Pruned Landmark Labeling sur graphe orienté)
+"""
+
+import heapq
+import zlib
+from array import array
+from bisect import bisect_left
+
+from instrumentation import instrumented, metrics
+
+
+# Version du format des étiquettes persistées
+HUB_LABELS_VERSION = 1
+
+INFINITY = 2 ** 31 - 1
+
+
+def graph_signature(graph):
+    """Empreinte d'un StopGraph: les étiquettes ne valent que pour ce graphe"""
+    return (
+        len(graph.stop_ids),
+        len(graph.targets),
+        zlib.crc32(graph.offsets.tobytes()),
+        zlib.crc32(graph.targets.tobytes()),
+        zlib.crc32(graph.costs.tobytes())
+    )
+
+
+class HubLabels:
+    """
+    Étiquettes de hubs d'un StopGraph
+
+    Chaque arrêt v reçoit des étiquettes sortantes (hub, coût v -> hub,
+    arrêt suivant vers le hub) et entrantes (hub, coût hub -> v, arrêt
+    précédent depuis le hub), au format CSR et triées par rang de hub. Le
+    coût minimal s -> t est le minimum, sur les hubs communs, de la somme
+    des deux coûts; le chemin se déroule en suivant les arrêts suivants et
+    précédents, eux-mêmes étiquetés par le même hub.
+
+    Les hubs sont traités par degré décroissant (les gares les plus
+    connectées d'abord) et chaque recherche de Dijkstra est élaguée dès
+    qu'un hub précédent couvre déjà le couple: les étiquettes restent
+    petites et une requête ne parcourt que deux courtes listes.
+    """
+
+    def __init__(self, graph, progress=None):
+        """
+        Args:
+            graph: StopGraph à prétraiter
+            progress: Rappel optionnel progress(fraction, message)
+        """
+        self.stop_ids = graph.stop_ids
+        self.stop_index = graph.stop_index
+        self.signature = graph_signature(graph)
+        count = len(graph)
+
+        offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+        reverse_offsets, reverse_targets, reverse_costs = self.reverse_graph(graph)
+
+        degree = [
+            offsets[v + 1] - offsets[v] + reverse_offsets[v + 1] - reverse_offsets[v]
+            for v in range(count)
+        ]
+        order = sorted(range(count), key=lambda v: (-degree[v], v))
+        self.hub_stops = array('i', order)  # rang -> arrêt dense
+
+        out_labels = [([], [], []) for _ in range(count)]  # (rangs, coûts, arrêts suivants)
+        in_labels = [([], [], []) for _ in range(count)]  # (rangs, coûts, arrêts précédents)
+        root_costs = [INFINITY] * count  # coûts de l'étiquette du hub courant, par rang
+
+        for rank, hub in enumerate(order):
+            if progress and rank % 500 == 0:
+                progress(rank / max(count, 1), f"Étiquettes de hubs ({rank}/{count})")
+            # Coûts hub -> v: étiquettes entrantes, élaguées par les étiquettes sortantes du hub
+            self.pruned_search(hub, rank, offsets, targets, costs, out_labels[hub], in_labels, root_costs)
+            # Coûts v -> hub: étiquettes sortantes, sur le graphe inversé
+            self.pruned_search(hub, rank, reverse_offsets, reverse_targets, reverse_costs,
+                               in_labels[hub], out_labels, root_costs)
+
+        self.out_offsets, self.out_hubs, self.out_costs, self.out_hops = self.compact(out_labels)
+        self.in_offsets, self.in_hubs, self.in_costs, self.in_hops = self.compact(in_labels)
+
+    @staticmethod
+    def reverse_graph(graph):
+        """Graphe inversé (arcs entrants) au format CSR"""
+        count = len(graph)
+        offsets = array('i', [0]) * (count + 1)
+        for target in graph.targets:
+            offsets[target + 1] += 1
+        for i in range(1, count + 1):
+            offsets[i] += offsets[i - 1]
+        position = array('i', offsets[:count])
+        targets = array('i', [0]) * len(graph.targets)
+        costs = array('i', [0]) * len(graph.targets)
+        for source in range(count):
+            for edge in range(graph.offsets[source], graph.offsets[source + 1]):
+                target = graph.targets[edge]
+                targets[position[target]] = source
+                costs[position[target]] = graph.costs[edge]
+                position[target] += 1
+        return offsets, targets, costs
+
+    @staticmethod
+    def pruned_search(hub, rank, offsets, targets, costs, hub_label, labels, root_costs):
+        """
+        Dijkstra depuis un hub, élagué aux arrêts dont le coût est déjà
+        atteint par les étiquettes existantes
+
+        hub_label: étiquettes du hub dans l'autre sens (élagage)
+        labels: étiquettes à compléter (rang, coût, arrêt d'où vient l'arc)
+        """
+        hub_ranks, hub_costs, _ = hub_label
+        for other, cost in zip(hub_ranks, hub_costs):
+            root_costs[other] = cost
+
+        best = {hub: 0}
+        hops = {hub: -1}
+        settled = set()
+        heap = [(0, hub)]
+        while heap:
+            cost, stop = heapq.heappop(heap)
+            if stop in settled:
+                continue
+            settled.add(stop)
+            ranks, stop_costs, stop_hops = labels[stop]
+            if stop != hub:
+                covered = INFINITY
+                for other, other_cost in zip(ranks, stop_costs):
+                    if root_costs[other] + other_cost < covered:
+                        covered = root_costs[other] + other_cost
+                if covered <= cost:
+                    continue
+            ranks.append(rank)
+            stop_costs.append(cost)
+            stop_hops.append(hops[stop])
+            for edge in range(offsets[stop], offsets[stop + 1]):
+                target = targets[edge]
+                new_cost = cost + costs[edge]
+                if new_cost < best.get(target, INFINITY):
+                    best[target] = new_cost
+                    hops[target] = stop
+                    heapq.heappush(heap, (new_cost, target))
+
+        for other in hub_ranks:
+            root_costs[other] = INFINITY
+
+    @staticmethod
+    def compact(labels):
+        """Convertit les listes d'étiquettes par arrêt en tableaux CSR"""
+        offsets = array('i', [0])
+        hubs = array('i')
+        costs = array('i')
+        hops = array('i')
+        for ranks, stop_costs, stop_hops in labels:
+            hubs.extend(ranks)
+            costs.extend(stop_costs)
+            hops.extend(stop_hops)
+            offsets.append(len(hubs))
+        return offsets, hubs, costs, hops
+
+    def __len__(self):
+        return len(self.stop_ids)
+
+    def label_count(self):
+        """Nombre total d'étiquettes (sortantes et entrantes)"""
+        return len(self.out_hubs) + len(self.in_hubs)
+
+    def matches(self, graph):
+        """Indique si les étiquettes ont été calculées pour ce graphe"""
+        return graph is not None and self.signature == graph_signature(graph)
+
+    def query(self, source, target):
+        """
+        Coût minimal entre deux arrêts denses
+
+        Returns:
+            (coût, rang du hub) ou (INFINITY, None) si la cible est inaccessible
+        """
+        out_hubs, out_costs = self.out_hubs, self.out_costs
+        in_hubs, in_costs = self.in_hubs, self.in_costs
+        i, i_end = self.out_offsets[source], self.out_offsets[source + 1]
+        j, j_end = self.in_offsets[target], self.in_offsets[target + 1]
+        best, best_hub = INFINITY, None
+        while i < i_end and j < j_end:
+            hub_i, hub_j = out_hubs[i], in_hubs[j]
+            if hub_i == hub_j:
+                cost = out_costs[i] + in_costs[j]
+                if cost < best:
+                    best, best_hub = cost, hub_i
+                i += 1
+                j += 1
+            elif hub_i < hub_j:
+                i += 1
+            else:
+                j += 1
+        return best, best_hub
+
+    @instrumented('hub_label_query')
+    def shortest_path(self, source, target):
+        """
+        Chemin de coût minimal entre deux arrêts denses
+
+        Returns:
+            Liste d'arrêts denses de source à target, ou None
+        """
+        cost, rank = self.query(source, target)
+        if rank is None:
+            return None
+
+        path = [source]
+        stop = source
+        while self.out_hops[self.label_position(self.out_offsets, self.out_hubs, stop, rank)] != -1:
+            stop = self.out_hops[self.label_position(self.out_offsets, self.out_hubs, stop, rank)]
+            path.append(stop)
+
+        tail = []
+        stop = target
+        while self.in_hops[self.label_position(self.in_offsets, self.in_hubs, stop, rank)] != -1:
+            tail.append(stop)
+            stop = self.in_hops[self.label_position(self.in_offsets, self.in_hubs, stop, rank)]
+        path.extend(reversed(tail))
+
+        if metrics.enabled:
+            metrics.count('hub_label_path_stops', len(path))
+        return path
+
+    @staticmethod
+    def label_position(offsets, hubs, stop, rank):
+        """Position de l'étiquette d'un hub dans les étiquettes d'un arrêt"""
+        return bisect_left(hubs, rank, offsets[stop], offsets[stop + 1])
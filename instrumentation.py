@@ -0,0 +1,190 @@
+"""
+Instrumentation - Durées par étape, compteurs des chemins critiques et
+variations mémoire, exportables en journal JSON ou au format texte Prometheus
+
+Désactivée par défaut: une étape ne coûte alors qu'un test de booléen.
+Activation par la variable d'environnement GTFSPY_METRICS (1, ou
+'tracemalloc' pour mesurer aussi la mémoire allouée par étape) ou par
+metrics.enable(); GTFSPY_METRICS_LOG=chemin ajoute chaque étape terminée
+au fichier, une ligne JSON par étape.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows: pas de mémoire résidente maximale
+    resource = None
+
+
+# Contexte sans effet renvoyé par stage() quand l'instrumentation est désactivée
+NULL_STAGE = nullcontext()
+
+
+def _memory_usage():
+    """
+    Mémoire de référence pour les variations par étape, en octets: mémoire
+    allouée suivie par tracemalloc si actif, sinon mémoire résidente maximale
+    """
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+class Stage:
+    """Mesure d'une étape (gestionnaire de contexte)"""
+
+    __slots__ = ('metrics', 'name', 'start', 'memory')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.memory = _memory_usage()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.record(self.name, elapsed, _memory_usage() - self.memory)
+        return False
+
+
+class Metrics:
+    """Registre des mesures: étapes (appels, durées, mémoire) et compteurs"""
+
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remet toutes les mesures à zéro"""
+        with self.lock:
+            self.stages = {}  # nom -> [appels, durée totale, durée max, variation mémoire totale]
+            self.counters = {}
+            self.events = deque(maxlen=1000)  # Dernières étapes terminées (journal structuré)
+
+    def enable(self, log_path=None, trace_memory=False):
+        """Active l'instrumentation (trace_memory: mesure les allocations avec tracemalloc)"""
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if log_path is not None:
+            self.log_path = log_path
+        self.enabled = True
+
+    def disable(self):
+        """Désactive l'instrumentation (les mesures sont conservées)"""
+        self.enabled = False
+
+    def stage(self, name):
+        """
+        Mesure une étape: `with metrics.stage('nom'):`
+
+        Returns:
+            Un contexte de mesure, ou NULL_STAGE si l'instrumentation est désactivée
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def count(self, name, value=1):
+        """Incrémente un compteur (sans effet si l'instrumentation est désactivée)"""
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name, seconds, memory_bytes=0):
+        """Enregistre une exécution d'étape"""
+        event = {'stage': name, 'seconds': seconds, 'memory_bytes': memory_bytes, 'time': time.time()}
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] += memory_bytes
+            self.events.append(event)
+            if self.log_path:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(event) + '\n')
+                except OSError as e:
+                    print(f"Erreur lors de l'écriture du journal de mesures: {e}")
+
+    def snapshot(self):
+        """Retourne les mesures sous forme de dictionnaire sérialisable en JSON"""
+        with self.lock:
+            return {
+                'stages': {
+                    name: {'calls': calls, 'seconds': total, 'max_seconds': longest, 'memory_bytes': memory}
+                    for name, (calls, total, longest, memory) in self.stages.items()
+                },
+                'counters': dict(self.counters)
+            }
+
+    def to_json(self):
+        """Mesures au format JSON"""
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='gtfspy'):
+        """Mesures au format texte d'exposition Prometheus"""
+        data = self.snapshot()
+        lines = []
+        stage_metrics = (
+            ('stage_calls_total', 'counter', "Nombre d'exécutions de l'étape", 'calls'),
+            ('stage_seconds_total', 'counter', "Durée cumulée de l'étape", 'seconds'),
+            ('stage_seconds_max', 'gauge', "Durée maximale d'une exécution de l'étape", 'max_seconds'),
+            ('stage_memory_bytes_total', 'counter', "Variation mémoire cumulée de l'étape", 'memory_bytes')
+        )
+        for metric, kind, description, field in stage_metrics:
+            lines.append(f'# HELP {prefix}_{metric} {description}')
+            lines.append(f'# TYPE {prefix}_{metric} {kind}')
+            for name, stats in sorted(data['stages'].items()):
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {stats[field]}')
+        for name, value in sorted(data['counters'].items()):
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_total"
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Écrit les mesures dans un fichier (.prom: format Prometheus, sinon JSON)"""
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json() + '\n'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def instrumented(name):
+    """Décorateur mesurant chaque appel d'une fonction comme une étape"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with Stage(metrics, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Registre global, configuré par l'environnement au chargement du module
+metrics = Metrics()
+if os.environ.get('GTFSPY_METRICS', '').strip() not in ('', '0'):
+    metrics.enable(
+        log_path=os.environ.get('GTFSPY_METRICS_LOG') or None,
+        trace_memory=os.environ['GTFSPY_METRICS'].strip().lower() == 'tracemalloc'
+    )
@@ -0,0 +1,147 @@
+"""
+Tables paresseuses - Chargement différé des tables GTFS peu utilisées et
+index des positions (octets) des lignes de chaque entité d'un fichier CSV
+"""
+
+import csv
+import io
+
+from fast_csv import read_shapes
+from shape_store import ShapeStore, SIMPLIFICATION_LEVELS
+
+
+class LazyAttribute:
+    """
+    Attribut chargé au premier accès
+
+    Le chargeur est une fonction sans argument enregistrée dans le
+    dictionnaire lazy_loaders de l'instance; une affectation directe
+    remplace la valeur et annule le chargement en attente.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        loader = instance.lazy_loaders.pop(self.name, None)
+        if loader is not None:
+            setattr(instance, self.slot, loader())
+        return getattr(instance, self.slot)
+
+    def __set__(self, instance, value):
+        instance.lazy_loaders.pop(self.name, None)
+        setattr(instance, self.slot, value)
+
+
+class TableManifest:
+    """
+    Index des plages d'octets occupées par chaque valeur d'une colonne clé
+    (shape_id, trip_id...) dans un fichier CSV extrait
+
+    L'index est construit au premier besoin par un seul parcours du
+    fichier, sans conversion des autres colonnes; les lignes d'une entité
+    peuvent ensuite être relues sans analyser le reste du fichier.
+    """
+
+    def __init__(self, path, key_field):
+        self.path = path
+        self.key_field = key_field
+        self.header = None
+        self.ranges = None  # {clé: [(début, fin), ...]}
+
+    def __len__(self):
+        return len(self.get_ranges())
+
+    def __contains__(self, key):
+        return key in self.get_ranges()
+
+    def keys(self):
+        return self.get_ranges().keys()
+
+    def get_ranges(self):
+        """Retourne l'index {clé: plages}, construit au premier appel"""
+        if self.ranges is None:
+            self.build()
+        return self.ranges
+
+    def build(self):
+        """Parcourt le fichier et regroupe les lignes consécutives de même clé en plages"""
+        ranges = {}
+        with open(self.path, 'rb') as f:
+            self.header = f.readline()
+            columns = next(csv.reader([self.header.decode('utf-8-sig')]), [])
+            if self.key_field not in columns:
+                self.ranges = ranges
+                return
+            column = columns.index(self.key_field)
+
+            position = f.tell()
+            current, start = None, position
+            for line in f:
+                end = position + len(line)
+                if b'"' in line:
+                    values = next(csv.reader([line.decode('utf-8')]), [])
+                    key = values[column] if column < len(values) else ''
+                else:
+                    values = line.rstrip(b'\r\n').split(b',', column + 1)
+                    key = values[column].decode('utf-8') if column < len(values) else ''
+                if key != current:
+                    if current:
+                        ranges.setdefault(current, []).append((start, position))
+                    current, start = key, position
+                position = end
+            if current:
+                ranges.setdefault(current, []).append((start, position))
+        self.ranges = ranges
+
+    def open_entity(self, key):
+        """
+        Relit les lignes d'une entité
+
+        Returns:
+            Flux texte CSV (en-tête compris) lisible par les lecteurs de
+            fast_csv, vide hormis l'en-tête si la clé est inconnue
+        """
+        chunks = [self.header or b'']
+        with open(self.path, 'rb') as f:
+            for start, end in self.get_ranges().get(key, ()):
+                f.seek(start)
+                chunks.append(f.read(end - start))
+        return io.StringIO(b''.join(chunks).decode('utf-8-sig'), newline='')
+
+
+class LazyShapeStore(ShapeStore):
+    """
+    ShapeStore alimenté forme par forme depuis shapes.txt
+
+    Seul l'index des positions du fichier est construit (au premier accès);
+    chaque forme est lue, convertie et simplifiée lors de sa première
+    utilisation, puis conservée.
+    """
+
+    def __init__(self, path, levels=SIMPLIFICATION_LEVELS):
+        super().__init__(levels=levels)
+        self.manifest = TableManifest(path, 'shape_id')
+
+    def __len__(self):
+        return len(self.manifest)
+
+    def __contains__(self, shape_id):
+        return shape_id in self.shape_index or shape_id in self.manifest
+
+    def shape_number(self, shape_id):
+        shape = self.shape_index.get(shape_id)
+        if shape is None and shape_id in self.manifest:
+            try:
+                read_shapes(self.manifest.open_entity(shape_id), self)
+            except Exception as e:
+                print(f"Erreur lors du chargement de la forme {shape_id}: {e}")
+            shape = self.shape_index.get(shape_id)
+        return shape
+
+    def loaded_count(self):
+        """Nombre de formes déjà chargées en mémoire"""
+        return len(self.shape_ids)
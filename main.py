@@ -6,14 +6,17 @@ en utilisant les données GTFS
 
 import os
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
+from kivy.uix.progressbar import ProgressBar
 from kivy.uix.textinput import TextInput
 from kivy.uix.filechooser import FileChooserListView
 from kivy.uix.popup import Popup
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy_garden.mapview import MapView, MapMarker
+from background_tasks import BackgroundWorker
 from gtfs_manager import GTFSManager
 from routing_engine import RoutingEngine
 from storage_manager import StorageManager
@@ -82,21 +85,33 @@ class MainScreen(Screen):
         self.add_widget(layout)
     
     def calculate_route(self, instance):
-        """Calcule l'itinéraire entre deux points"""
+        """
+        Calcule l'itinéraire entre deux points en arrière-plan
+        
+        Les demandes répétées sont regroupées: seule la dernière est livrée.
+        """
         try:
             origin = self.parse_coordinates(self.origin_input.text)
             destination = self.parse_coordinates(self.destination_input.text)
-            
-            app = App.get_running_app()
-            route = app.routing_engine.find_route(origin, destination)
-            
-            if route:
-                self.display_route(route)
-                self.show_popup('Succès', 'Itinéraire calculé!')
-            else:
-                self.show_popup('Erreur', 'Aucun itinéraire trouvé')
         except Exception as e:
             self.show_popup('Erreur', f'Erreur: {str(e)}')
+            return
+        
+        app = App.get_running_app()
+        app.worker.submit(
+            lambda task: app.routing_engine.find_route(origin, destination),
+            key='route',
+            on_done=self.on_route_found,
+            on_error=lambda e: self.show_popup('Erreur', f'Erreur: {str(e)}')
+        )
+    
+    def on_route_found(self, route):
+        """Affiche le résultat du calcul d'itinéraire (thread principal)"""
+        if route:
+            self.display_route(route)
+            self.show_popup('Succès', 'Itinéraire calculé!')
+        else:
+            self.show_popup('Erreur', 'Aucun itinéraire trouvé')
     
     def parse_coordinates(self, text):
         """Parse les coordonnées depuis le texte"""
@@ -151,19 +166,81 @@ class MainScreen(Screen):
         
         def on_select(instance):
             if filechooser.selection:
-                app = App.get_running_app()
-                success = app.gtfs_manager.import_gtfs(filechooser.selection[0])
-                if success:
-                    self.show_popup('Succès', 'GTFS importé avec succès!')
-                else:
-                    self.show_popup('Erreur', 'Échec de l\'importation')
                 popup.dismiss()
+                self.start_import(filechooser.selection[0])
         
         select_btn.bind(on_press=on_select)
         cancel_btn.bind(on_press=popup.dismiss)
         
         popup.open()
     
+    def start_import(self, zip_path):
+        """
+        Importe un GTFS en arrière-plan avec une fenêtre de progression
+        
+        Le réseau est chargé dans un GTFSManager séparé puis substitué au
+        réseau courant une fois l'import réussi: un import annulé ou en échec
+        laisse le réseau précédent intact.
+        """
+        app = App.get_running_app()
+        
+        content = BoxLayout(orientation='vertical', padding=10, spacing=5)
+        status = Label(text='Import en cours...')
+        progress_bar = ProgressBar(max=1.0, value=0)
+        cancel_btn = Button(text='Annuler', size_hint=(1, 0.3))
+        content.add_widget(status)
+        content.add_widget(progress_bar)
+        content.add_widget(cancel_btn)
+        
+        popup = Popup(
+            title='Import GTFS',
+            content=content,
+            size_hint=(0.8, 0.4),
+            auto_dismiss=False
+        )
+        
+        def run_import(task):
+            gtfs_manager = GTFSManager(app.storage_manager)
+            if not gtfs_manager.import_gtfs(zip_path, progress=task.report):
+                return False
+            # L'import est enregistré comme import actif: le réseau courant est
+            # remplacé même si une annulation arrive maintenant, pour rester
+            # identique à celui du prochain démarrage
+            current = app.gtfs_manager
+            current.detach_database()
+            current.restore_snapshot_state(gtfs_manager.get_snapshot_state())
+            # La base SQLite et les étiquettes de hubs ne font pas partie du snapshot
+            current.database = gtfs_manager.database
+            current.hub_labels = gtfs_manager.hub_labels
+            current.hub_labels_graph = gtfs_manager.hub_labels_graph
+            return True
+        
+        def on_progress(fraction, message):
+            progress_bar.value = fraction
+            status.text = message
+        
+        def on_done(success):
+            popup.dismiss()
+            if success:
+                self.show_popup('Succès', 'GTFS importé avec succès!')
+            else:
+                self.show_popup('Erreur', 'Échec de l\'importation')
+        
+        def on_error(e):
+            popup.dismiss()
+            self.show_popup('Erreur', f'Erreur: {str(e)}')
+        
+        task = app.worker.submit(
+            run_import, key='import', on_done=on_done, on_error=on_error, on_progress=on_progress
+        )
+        
+        def on_cancel(instance):
+            task.cancel()
+            popup.dismiss()
+        
+        cancel_btn.bind(on_press=on_cancel)
+        popup.open()
+    
     def download_map(self, instance):
         """Télécharge les données de carte pour utilisation hors ligne"""
         app = App.get_running_app()
@@ -207,11 +284,24 @@ class GTFSPyApp(App):
         self.gtfs_manager = GTFSManager(self.storage_manager)
         self.routing_engine = RoutingEngine(self.gtfs_manager)
         
+        # Thread de calcul: imports et itinéraires s'y exécutent dans l'ordre,
+        # leurs résultats sont renvoyés sur le thread de l'interface
+        self.worker = BackgroundWorker(
+            dispatch=lambda callback: Clock.schedule_once(lambda dt: callback())
+        )
+        
+        # Recharger le dernier GTFS importé (depuis son snapshot si possible)
+        self.worker.submit(lambda task: self.gtfs_manager.load_last_import(), key='import')
+        
         # Créer le gestionnaire d'écrans
         sm = ScreenManager()
         sm.add_widget(MainScreen())
         
         return sm
+    
+    def on_stop(self):
+        """Arrête le thread de calcul à la fermeture de l'application"""
+        self.worker.shutdown()
 
 
 if __name__ == '__main__':
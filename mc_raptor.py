@@ -0,0 +1,205 @@
+"""
+McRAPTOR - Recherche multicritère (heure d'arrivée, nombre de trajets,
+durée de marche) par tours sur les motifs de trajets, avec des ensembles
+d'étiquettes Pareto bornés
+"""
+
+from instrumentation import instrumented, metrics
+from raptor import INFINITY, RaptorEngine
+
+
+# Taille maximale par défaut d'un ensemble d'étiquettes (par arrêt, par
+# motif parcouru et à destination)
+MAX_LABELS = 8
+
+
+def dominates(a, b):
+    """
+    Indique si l'étiquette a est au moins aussi bonne que b: heure
+    d'arrivée, trajets, marche, et arrivée à pied (une arrivée à pied ne
+    peut être prolongée à pied et ne domine donc pas une arrivée en véhicule)
+    """
+    return a[0] <= b[0] and a[1] <= b[1] and a[2] <= b[2] and a[3] <= b[3]
+
+
+def add_label(bag, label, max_labels=MAX_LABELS):
+    """
+    Ajoute une étiquette à un ensemble Pareto (liste de tuples dont les
+    quatre premiers champs sont les critères)
+
+    Les étiquettes dominées sont retirées; au-delà de max_labels, la plus
+    tardive (puis la plus coûteuse en trajets et en marche) est évincée.
+
+    Returns:
+        True si l'étiquette a été conservée
+    """
+    for other in bag:
+        if dominates(other, label):
+            return False
+    bag[:] = [other for other in bag if not dominates(label, other)]
+    bag.append(label)
+    if len(bag) > max_labels:
+        worst = max(bag, key=lambda other: other[:4])
+        bag.remove(worst)
+        return worst is not label
+    return True
+
+
+class McRaptorEngine(RaptorEngine):
+    """
+    Calcule les itinéraires Pareto-optimaux en heure d'arrivée, nombre de
+    trajets et durée de marche
+
+    Chaque étiquette est un tuple (arrivée, trajets, marche, à pied, étape,
+    étiquette précédente): l'étape vaut (motif, rang du trajet, position
+    de montée, position de descente) en véhicule, (arrêt de départ, arrêt
+    d'arrivée, durée) à pied, ou None à la source. Les itinéraires se
+    reconstruisent en remontant les étiquettes, sans tableau de parents
+    par tour. Les ensembles sont limités à max_labels étiquettes pour borner
+    la mémoire et la durée des recherches sur les réseaux denses.
+    """
+
+    def __init__(self, patterns, footpaths=None, max_labels=MAX_LABELS):
+        super().__init__(patterns, footpaths)
+        self.max_labels = max_labels
+
+    @instrumented('mcraptor_search')
+    def search(self, sources, targets, max_transfers=4, active_trips=None, departure=None):
+        """
+        Recherche multicritère
+
+        Args:
+            sources: dict {stop_id: heure de départ possible en secondes}
+            targets: dict {stop_id: temps de sortie à pied jusqu'à la destination en secondes}
+            max_transfers: nombre maximal de correspondances
+            active_trips: masque optionnel des trajets circulant le jour de la requête
+            departure: heure de départ de l'origine; la marche d'accès à une
+                       source est son écart à cette heure (par défaut la
+                       plus précoce des sources)
+
+        Returns:
+            Liste d'itinéraires (format de build_journey complété par
+            walking_time et walking_distance) triée par heure d'arrivée
+        """
+        patterns = self.patterns
+        stop_index = self.store.stop_index
+        max_labels = self.max_labels
+
+        target_egress = {
+            stop_index[stop_id]: egress
+            for stop_id, egress in targets.items() if stop_id in stop_index
+        }
+        bags = {}  # arrêt -> étiquettes non dominées, tous tours confondus
+        arrivals_bag = []  # (arrivée, trajets, marche, 0, arrêt, étiquette) à destination
+
+        def reach(stop, label):
+            """Ajoute une étiquette à un arrêt, sauf si une arrivée connue la domine"""
+            for other in arrivals_bag:
+                if dominates(other, label):
+                    return False
+            if not add_label(bags.setdefault(stop, []), label, max_labels):
+                return False
+            egress = target_egress.get(stop)
+            if egress is not None:
+                add_label(arrivals_bag, (label[0] + egress, label[1], label[2] + egress, 0, stop, label), max_labels)
+            return True
+
+        if departure is None:
+            departure = min(sources.values(), default=INFINITY)
+        new_labels = {}
+        for stop_id, time in sources.items():
+            stop = stop_index.get(stop_id)
+            if stop is None:
+                continue
+            label = (time, 0, time - departure, 0, None, None)
+            if reach(stop, label):
+                new_labels.setdefault(stop, []).append(label)
+        self.relax_walks(new_labels, reach)
+
+        scanned = 0
+        for k in range(1, max_transfers + 2):
+            if not new_labels:
+                break
+            queue = {}
+            for stop in new_labels:
+                for pattern, position in patterns.patterns_at(stop):
+                    if position < queue.get(pattern, INFINITY):
+                        queue[pattern] = position
+            scanned += len(queue)
+
+            previous = new_labels
+            new_labels = {}
+            for pattern, start in queue.items():
+                stops = patterns.pattern_stops[pattern]
+                width = len(stops)
+                arrivals = patterns.pattern_arrivals[pattern]
+                route_bag = []  # (rang du trajet, trajets, marche, 0, position de montée, étiquette)
+                for position in range(start, width):
+                    stop = stops[position]
+                    for trip, _, walking, _, board, boarded in route_bag:
+                        label = (arrivals[trip * width + position], k, walking, 0,
+                                 (pattern, trip, board, position), boarded)
+                        if reach(stop, label):
+                            new_labels.setdefault(stop, []).append(label)
+                    # Monter depuis les étiquettes obtenues au tour précédent
+                    if position < width - 1:
+                        for label in previous.get(stop, ()):
+                            trip = patterns.earliest_trip(pattern, position, label[0], active_trips)
+                            if trip is not None:
+                                add_label(route_bag, (trip, label[1], label[2], 0, position, label), max_labels)
+
+            self.relax_walks(new_labels, reach)
+
+        if metrics.enabled:
+            metrics.count('mcraptor_searches')
+            metrics.count('mcraptor_patterns_scanned', scanned)
+            metrics.count('mcraptor_labels', sum(len(bag) for bag in bags.values()))
+
+        journeys = [self.build_label_journey(entry) for entry in sorted(arrivals_bag, key=lambda e: e[:4])]
+        return [journey for journey in journeys if journey['legs']]
+
+    def relax_walks(self, new_labels, reach):
+        """
+        Prolonge à pied les étiquettes du tour (les marches ne s'enchaînent
+        pas: seules les arrivées en véhicule et les sources sont prolongées)
+        """
+        if self.footpaths is None:
+            return
+        offsets = self.footpaths.offsets
+        targets = self.footpaths.targets
+        durations = self.footpaths.durations
+        walked = {}
+        for stop, labels in new_labels.items():
+            for label in labels:
+                for edge in range(offsets[stop], offsets[stop + 1]):
+                    target = targets[edge]
+                    duration = durations[edge]
+                    walk = (label[0] + duration, label[1], label[2] + duration, 1, (stop, target, duration), label)
+                    if reach(target, walk):
+                        walked.setdefault(target, []).append(walk)
+        for stop, labels in walked.items():
+            new_labels.setdefault(stop, []).extend(labels)
+
+    def build_label_journey(self, entry):
+        """Reconstruit un itinéraire en remontant la chaîne d'étiquettes d'une arrivée"""
+        arrival, trips, walking, _, stop, label = entry
+        legs = []
+        while label[4] is not None:
+            leg = label[4]
+            if len(leg) == 4:
+                legs.append(self.build_leg(*leg))
+            else:
+                source, target, duration = leg
+                legs.append(self.build_walk(source, target, label[0] - duration, duration))
+            label = label[5]
+        legs.reverse()
+
+        walking_speed = self.footpaths.walking_speed if self.footpaths is not None else None
+        return {
+            'departure_time': legs[0]['departure_time'] if legs else label[0],
+            'arrival_time': arrival,
+            'transfers': max(trips - 1, 0),
+            'walking_time': walking,
+            'walking_distance': round(walking * walking_speed) if walking_speed else None,
+            'legs': legs
+        }
@@ -0,0 +1,81 @@
+"""
+Chargement parallèle - Découpage de stop_times.txt en plages d'octets
+alignées sur les fins de ligne, analysées dans des processus séparés
+"""
+
+import csv
+import io
+import os
+from array import array
+
+from fast_csv import STOP_TIMES_COLUMNS, parse_stop_times_rows, select_columns
+
+
+def read_header(path):
+    """
+    Lit l'en-tête d'un fichier CSV
+
+    Returns:
+        Tuple (liste des colonnes, position en octets de la première ligne de données)
+    """
+    with open(path, 'rb') as f:
+        line = f.readline()
+        data_start = f.tell()
+    columns = next(csv.reader([line.decode('utf-8-sig')]), [])
+    return columns, data_start
+
+
+def split_line_ranges(path, start, chunks):
+    """
+    Découpe un fichier en au plus chunks plages [début, fin) d'octets, chaque
+    plage commençant en début de ligne
+
+    Les champs entre guillemets contenant un saut de ligne ne sont pas
+    supportés (ils n'apparaissent pas dans les colonnes de stop_times).
+    """
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, 'rb') as f:
+        for i in range(1, chunks):
+            position = start + (size - start) * i // chunks
+            if position <= bounds[-1]:
+                continue
+            f.seek(position - 1)
+            f.readline()  # Avancer jusqu'à la fin de la ligne en cours
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def parse_stop_times_chunk(path, start, end, columns):
+    """
+    Analyse une plage de lignes de stop_times.txt (exécuté dans un processus)
+
+    Returns:
+        Tuple (trip_ids, stop_ids, arrivées, départs, séquences): listes de
+        chaînes et colonnes array('i') dans l'ordre du fichier
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8')
+
+    rows = select_columns(csv.reader(io.StringIO(data, newline='')), columns, STOP_TIMES_COLUMNS)
+    for batch in parse_stop_times_rows(rows, batch_size=None):
+        return batch
+    return [], [], array('i'), array('i'), array('i')
+
+
+def submit_stop_times_chunks(executor, path, chunks):
+    """
+    Soumet l'analyse de stop_times.txt par plages à un pool de processus
+
+    Returns:
+        Liste des futures, dans l'ordre du fichier
+    """
+    columns, data_start = read_header(path)
+    return [
+        executor.submit(parse_stop_times_chunk, path, start, end, columns)
+        for start, end in split_line_ranges(path, data_start, chunks)
+    ]
@@ -0,0 +1,436 @@
+"""
+Moteur RAPTOR - Recherche d'itinéraires par tours (Round-bAsed Public
+Transit Optimized Router) sur les motifs de trajets
+"""
+
+from instrumentation import instrumented, metrics
+
+
+INFINITY = 2 ** 31 - 1
+
+
+class RaptorEngine:
+    """
+    Calcule les itinéraires d'arrivée au plus tôt avec un nombre borné de
+    correspondances
+
+    Le tour k détermine les meilleures heures d'arrivée atteignables avec
+    k trajets en véhicule; chaque tour parcourt une seule fois les motifs
+    desservant les arrêts améliorés au tour précédent, puis les
+    correspondances à pied depuis les arrêts atteints en véhicule.
+    """
+
+    def __init__(self, patterns, footpaths=None):
+        self.patterns = patterns
+        self.store = patterns.store
+        self.footpaths = footpaths
+
+    def earliest_arrival(self, sources, targets, max_transfers=4, active_trips=None):
+        """
+        Recherche d'arrivée au plus tôt
+
+        Args:
+            sources: dict {stop_id: heure de départ possible en secondes}
+            targets: dict {stop_id: temps de sortie jusqu'à la destination en secondes}
+            max_transfers: nombre maximal de correspondances
+            active_trips: masque optionnel des trajets circulant le jour de la requête
+
+        Returns:
+            Dictionnaire décrivant l'itinéraire (voir build_journey) ou None
+        """
+        rounds = self.run(sources, targets, max_transfers, active_trips)
+        return self.build_journey(rounds, targets)
+
+    def earliest_arrivals(self, sources, target_stop_ids, max_transfers=4, active_trips=None):
+        """
+        Recherche un-vers-plusieurs: un seul arbre de recherche depuis les
+        sources, dont on extrait l'itinéraire vers chaque cible
+
+        Returns:
+            dict {stop_id cible: itinéraire ou None}
+        """
+        rounds = self.run(sources, {}, max_transfers, active_trips)
+        return {
+            stop_id: self.build_journey(rounds, {stop_id: 0})
+            for stop_id in target_stop_ids
+        }
+
+    @instrumented('raptor_search')
+    def run(self, sources, targets, max_transfers=4, active_trips=None):
+        """
+        Exécute les tours RAPTOR
+
+        Returns:
+            Liste de (étiquettes, parents, marches) par tour; parents[s] vaut
+            (motif, rang du trajet, position de montée, position de descente)
+            et marches[s] (arrêt de départ à pied, durée)
+        """
+        store = self.store
+        patterns = self.patterns
+        stop_index = store.stop_index
+
+        labels = [INFINITY] * len(store.stop_ids)
+        best = [INFINITY] * len(store.stop_ids)
+        # Meilleure arrivée en véhicule: une arrivée plus tardive qu'une
+        # arrivée à pied peut encore ouvrir de nouvelles marches
+        best_transit = [INFINITY] * len(store.stop_ids)
+        marked = set()
+        for stop_id, time in sources.items():
+            stop = stop_index.get(stop_id)
+            if stop is not None and time < labels[stop]:
+                labels[stop] = best[stop] = best_transit[stop] = time
+                marked.add(stop)
+
+        target_stops = [
+            (stop_index[stop_id], egress)
+            for stop_id, egress in targets.items() if stop_id in stop_index
+        ]
+        walks = self.relax_footpaths({stop: labels[stop] for stop in marked}, labels, best, marked, INFINITY)
+        rounds = [(labels, {}, walks)]
+        scanned = 0  # Motifs parcourus (instrumentation)
+
+        for _ in range(max_transfers + 1):
+            previous = labels
+            labels = list(previous)
+            parents = {}
+            # Meilleure arrivée connue à destination: élagage des étiquettes inutiles
+            target_bound = min((best[stop] + egress for stop, egress in target_stops), default=INFINITY)
+
+            # Motifs à parcourir, depuis la première position marquée
+            queue = {}
+            for stop in marked:
+                for pattern, position in patterns.patterns_at(stop):
+                    if position < queue.get(pattern, INFINITY):
+                        queue[pattern] = position
+
+            marked = set()
+            alighted = {}
+            for pattern, start in queue.items():
+                stops = patterns.pattern_stops[pattern]
+                width = len(stops)
+                arrivals = patterns.pattern_arrivals[pattern]
+                departures = patterns.pattern_departures[pattern]
+                trip = None
+                board = None
+                for position in range(start, width):
+                    stop = stops[position]
+                    if trip is not None:
+                        arrival = arrivals[trip * width + position]
+                        if arrival < best_transit[stop] and arrival < target_bound:
+                            best_transit[stop] = alighted[stop] = arrival
+                            parents[stop] = (pattern, trip, board, position)
+                            if arrival < best[stop]:
+                                labels[stop] = best[stop] = arrival
+                                marked.add(stop)
+                    # Monter dans un trajet plus tôt si l'arrêt a été atteint au tour précédent
+                    time = previous[stop]
+                    if time < INFINITY and (trip is None or time <= departures[trip * width + position]):
+                        earlier = patterns.earliest_trip(pattern, position, time, active_trips)
+                        if earlier is not None and (trip is None or earlier < trip):
+                            trip = earlier
+                            board = position
+
+            walks = self.relax_footpaths(alighted, labels, best, marked, target_bound)
+            rounds.append((labels, parents, walks))
+            scanned += len(queue)
+            if not marked:
+                break
+
+        if metrics.enabled:
+            metrics.count('raptor_searches')
+            metrics.count('raptor_rounds', len(rounds) - 1)
+            metrics.count('raptor_patterns_scanned', scanned)
+        return rounds
+
+    @instrumented('raptor_profile')
+    def profile(self, sources, targets, window_start, window_end, max_transfers=4, active_trips=None):
+        """
+        Recherche de profil (rRAPTOR): itinéraires Pareto-optimaux en
+        (départ, arrivée, correspondances) pour les départs d'une plage horaire
+
+        Les départs possibles sont traités du plus tard au plus tôt en
+        conservant les étiquettes de chaque tour d'un départ à l'autre: un
+        itinéraire pris plus tard reste accessible en partant plus tôt, et
+        seuls les arrêts améliorés par le nouveau départ sont reparcourus.
+        L'élagage compare chaque tour à lui-même (et non au meilleur tous
+        tours confondus) pour conserver les itinéraires à moins de
+        correspondances.
+
+        Args:
+            sources: dict {stop_id: temps d'accès depuis l'origine en secondes}
+            targets: dict {stop_id: temps de sortie jusqu'à la destination en secondes}
+            window_start, window_end: bornes (secondes) du départ de l'origine
+            max_transfers: nombre maximal de correspondances
+            active_trips: masque optionnel des trajets circulant le jour de la requête
+
+        Returns:
+            Liste d'itinéraires (format de build_journey) triée par départ:
+            le meilleur choix pour chaque instant de la plage, qui peut
+            partir après window_end lorsqu'il faut attendre le départ suivant
+        """
+        store = self.store
+        patterns = self.patterns
+        stop_index = store.stop_index
+        access = {
+            stop_index[stop_id]: duration
+            for stop_id, duration in sources.items() if stop_id in stop_index
+        }
+        target_stops = [
+            (stop_index[stop_id], egress)
+            for stop_id, egress in targets.items() if stop_id in stop_index
+        ]
+
+        # Départs de l'origine: heures de passage des trajets aux arrêts
+        # d'accès et à ceux atteints ensuite par une correspondance à pied
+        reach = dict(access)
+        if self.footpaths is not None:
+            offsets = self.footpaths.offsets
+            for stop, duration in access.items():
+                for edge in range(offsets[stop], offsets[stop + 1]):
+                    target = self.footpaths.targets[edge]
+                    walk = duration + self.footpaths.durations[edge]
+                    if walk < reach.get(target, INFINITY):
+                        reach[target] = walk
+        # La fin de la plage couvre les instants après son dernier départ
+        departures = {window_end}
+        for stop, duration in reach.items():
+            for pattern, position in patterns.patterns_at(stop):
+                width = len(patterns.pattern_stops[pattern])
+                if position == width - 1:
+                    continue
+                trips = patterns.pattern_trips[pattern]
+                times = patterns.pattern_departures[pattern]
+                trip = patterns.earliest_trip(pattern, position, window_start + duration, active_trips)
+                while trip is not None and trip < len(trips):
+                    departure = times[trip * width + position] - duration
+                    if departure > window_end:
+                        break
+                    if active_trips is None or active_trips[trips[trip]]:
+                        departures.add(departure)
+                    trip += 1
+
+        stop_count = len(store.stop_ids)
+        rounds = [([INFINITY] * stop_count, {}, {}) for _ in range(max_transfers + 2)]
+        best_transit = [[INFINITY] * stop_count for _ in range(max_transfers + 2)]
+        recorded = [INFINITY] * len(rounds)
+        journeys = []
+        scanned = 0
+
+        for departure in sorted(departures, reverse=True):
+            labels, _, walks = rounds[0]
+            marked = set()
+            for stop, duration in access.items():
+                time = departure + duration
+                if time < labels[stop]:
+                    labels[stop] = time
+                    walks.pop(stop, None)
+                    marked.add(stop)
+            walked = self.relax_footpaths({stop: labels[stop] for stop in marked}, labels, labels, marked, INFINITY)
+            walks.update(walked)
+            improved = set(marked)
+
+            for k in range(1, len(rounds)):
+                previous = rounds[k - 1][0]
+                labels, parents, walks = rounds[k]
+                transit = best_transit[k]
+                # Une étiquette du tour k ne peut être moins bonne qu'au tour k - 1
+                propagated = set()
+                for stop in improved:
+                    if previous[stop] < labels[stop]:
+                        labels[stop] = previous[stop]
+                        walks.pop(stop, None)
+                        propagated.add(stop)
+                if not marked:
+                    improved = propagated
+                    continue
+                target_bound = min((labels[stop] + egress for stop, egress in target_stops), default=INFINITY)
+
+                queue = {}
+                for stop in marked:
+                    for pattern, position in patterns.patterns_at(stop):
+                        if position < queue.get(pattern, INFINITY):
+                            queue[pattern] = position
+                scanned += len(queue)
+
+                marked = set()
+                alighted = {}
+                for pattern, start in queue.items():
+                    stops = patterns.pattern_stops[pattern]
+                    width = len(stops)
+                    arrivals = patterns.pattern_arrivals[pattern]
+                    pattern_departures = patterns.pattern_departures[pattern]
+                    trip = None
+                    board = None
+                    for position in range(start, width):
+                        stop = stops[position]
+                        if trip is not None:
+                            arrival = arrivals[trip * width + position]
+                            if arrival < transit[stop] and arrival < target_bound:
+                                transit[stop] = alighted[stop] = arrival
+                                parents[stop] = (pattern, trip, board, position)
+                                if arrival < labels[stop]:
+                                    labels[stop] = arrival
+                                    walks.pop(stop, None)
+                                    marked.add(stop)
+                        time = previous[stop]
+                        if time < INFINITY and (trip is None or time <= pattern_departures[trip * width + position]):
+                            earlier = patterns.earliest_trip(pattern, position, time, active_trips)
+                            if earlier is not None and (trip is None or earlier < trip):
+                                trip = earlier
+                                board = position
+
+                walks.update(self.relax_footpaths(alighted, labels, labels, marked, target_bound))
+                improved = marked | propagated
+
+            # Nouveaux itinéraires de ce départ: arrivée améliorée au tour k,
+            # strictement meilleure qu'avec moins de correspondances
+            fewer = INFINITY
+            for k in range(1, len(rounds)):
+                labels = rounds[k][0]
+                arrival = min((labels[stop] + egress for stop, egress in target_stops), default=INFINITY)
+                if arrival < recorded[k] and arrival < fewer:
+                    journey = self.build_journey(rounds[:k + 1], targets)
+                    if journey is not None and journey['legs']:
+                        journeys.append(journey)
+                recorded[k] = min(recorded[k], arrival)
+                fewer = min(fewer, arrival)
+
+        if metrics.enabled:
+            metrics.count('raptor_profile_departures', len(departures))
+            metrics.count('raptor_patterns_scanned', scanned)
+        return pareto_journeys(journeys)
+
+    def relax_footpaths(self, alighted, labels, best, marked, target_bound):
+        """
+        Prolonge à pied les arrivées en véhicule du tour (les arrêts
+        améliorés sont ajoutés à marked)
+
+        Les marches partent des heures de descente alighted {arrêt: heure}:
+        elles ne s'enchaînent pas entre elles.
+
+        Returns:
+            dict {arrêt atteint à pied: (arrêt de départ, durée)}
+        """
+        walks = {}
+        if self.footpaths is None:
+            return walks
+        offsets = self.footpaths.offsets
+        targets = self.footpaths.targets
+        durations = self.footpaths.durations
+        for stop, time in alighted.items():
+            for edge in range(offsets[stop], offsets[stop + 1]):
+                target = targets[edge]
+                arrival = time + durations[edge]
+                if arrival < best[target] and arrival < target_bound:
+                    labels[target] = best[target] = arrival
+                    walks[target] = (stop, durations[edge])
+                    marked.add(target)
+        return walks
+
+    def build_journey(self, rounds, targets):
+        """
+        Reconstruit le meilleur itinéraire à partir des tours
+
+        Returns:
+            {'departure_time', 'arrival_time', 'transfers', 'legs'} où chaque
+            étape en véhicule contient trip_id, route_id, stop_ids et les
+            horaires (secondes) de chaque arrêt parcouru, et chaque étape à
+            pied ses deux arrêts et sa durée, ou None
+        """
+        stop_index = self.store.stop_index
+        best_arrival, best_round, best_stop = INFINITY, None, None
+        for k, (labels, parents, walks) in enumerate(rounds):
+            for stop_id, egress in targets.items():
+                stop = stop_index.get(stop_id)
+                if stop is None or labels[stop] == INFINITY:
+                    continue
+                if labels[stop] + egress < best_arrival:
+                    best_arrival, best_round, best_stop = labels[stop] + egress, k, stop
+        if best_round is None:
+            return None
+
+        legs = []
+        k, stop = best_round, best_stop
+        while True:
+            labels, parents, walks = rounds[k]
+            # Une marche du tour prime sur le parent en véhicule qu'elle a amélioré
+            walked = stop in walks
+            if walked:
+                source, duration = walks[stop]
+                legs.append(self.build_walk(source, stop, labels[stop] - duration, duration))
+                stop = source
+            if k == 0:
+                break
+            # Le parent en véhicule ne vaut que s'il a fixé l'étiquette (ou
+            # précède une marche); sinon l'étiquette est héritée du tour précédent
+            if stop in parents:
+                leg = self.build_leg(*parents[stop])
+                if walked or leg['arrival_time'] == labels[stop]:
+                    legs.append(leg)
+                    stop = stop_index[leg['stop_ids'][0]]
+            k -= 1
+        legs.reverse()
+
+        departure = legs[0]['departure_time'] if legs else rounds[0][0][best_stop]
+        transit_legs = sum(1 for leg in legs if leg['type'] == 'transit')
+        return {
+            'departure_time': departure,
+            'arrival_time': best_arrival,
+            'transfers': max(transit_legs - 1, 0),
+            'legs': legs
+        }
+
+    def build_leg(self, pattern, trip, board, alight):
+        """Décrit le parcours en véhicule entre deux positions d'un motif"""
+        patterns = self.patterns
+        store = self.store
+        stops = patterns.pattern_stops[pattern]
+        width = len(stops)
+        offset = trip * width
+        return {
+            'type': 'transit',
+            'trip_id': store.trip_ids[patterns.pattern_trips[pattern][trip]],
+            'route_id': patterns.pattern_route[pattern],
+            'stop_ids': [store.stop_ids[stops[i]] for i in range(board, alight + 1)],
+            'arrival_times': list(patterns.pattern_arrivals[pattern][offset + board:offset + alight + 1]),
+            'departure_times': list(patterns.pattern_departures[pattern][offset + board:offset + alight + 1]),
+            'departure_time': patterns.pattern_departures[pattern][offset + board],
+            'arrival_time': patterns.pattern_arrivals[pattern][offset + alight]
+        }
+
+    def build_walk(self, source, target, departure, duration):
+        """Décrit une correspondance à pied entre deux arrêts denses"""
+        return walk_leg(self.store, source, target, departure, duration)
+
+
+def walk_leg(store, source, target, departure, duration):
+    """Étape à pied au format des étapes d'itinéraire (partagé avec CSA)"""
+    return {
+        'type': 'walk',
+        'trip_id': None,
+        'route_id': None,
+        'stop_ids': [store.stop_ids[source], store.stop_ids[target]],
+        'arrival_times': [departure, departure + duration],
+        'departure_times': [departure, departure + duration],
+        'departure_time': departure,
+        'arrival_time': departure + duration,
+        'duration': duration
+    }
+
+
+def pareto_journeys(journeys):
+    """
+    Ne garde que les itinéraires non dominés en (départ le plus tard,
+    arrivée la plus tôt, moins de correspondances), triés par départ
+    """
+    kept = []
+    for journey in sorted(journeys, key=lambda j: (-j['departure_time'], j['arrival_time'], j['transfers'])):
+        criteria = (journey['departure_time'], journey['arrival_time'], journey['transfers'])
+        if not any(
+            other['departure_time'] >= criteria[0] and other['arrival_time'] <= criteria[1]
+            and other['transfers'] <= criteria[2]
+            for other in kept
+        ):
+            kept.append(journey)
+    kept.reverse()
+    return kept
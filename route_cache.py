@@ -0,0 +1,120 @@
+"""
+Cache des itinéraires - Résultats de recherche récents indexés par arrêts
+de départ/arrivée, date de service et tranche horaire (LRU + durée de vie)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class RouteCache:
+    """
+    Cache LRU borné des résultats de recherche d'itinéraire
+
+    Les entrées expirent après ttl secondes et le cache est vidé lorsque la
+    version du réseau (jeton comparable, par exemple la génération du
+    GTFSManager) change.
+
+    Args:
+        max_size: nombre maximal d'entrées (0: cache désactivé)
+        ttl: durée de vie d'une entrée en secondes (None: illimitée)
+        time_bucket: largeur en secondes des tranches d'heure de départ
+        clock: horloge en secondes (time.monotonic par défaut)
+    """
+
+    def __init__(self, max_size=512, ttl=600, time_bucket=300, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.time_bucket = time_bucket
+        self.clock = clock
+        self.entries = OrderedDict()  # clé -> (date d'insertion, valeur), du moins au plus récent
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def make_key(self, origin_stop_id, destination_stop_id, departure_time, *options):
+        """
+        Clé d'une recherche: (départ, arrivée, date de service, tranche
+        horaire, options de recherche...); départ et arrivée sont des
+        identifiants d'arrêts ou des ensembles hachables d'arrêts d'accès
+        """
+        seconds = departure_time.hour * 3600 + departure_time.minute * 60 + departure_time.second
+        return (origin_stop_id, destination_stop_id, departure_time.date(),
+                seconds // self.time_bucket) + options
+
+    def check_version(self, version):
+        """Vide le cache si la version du réseau a changé depuis le dernier appel"""
+        with self.lock:
+            if self.version is None or version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+
+    def get(self, key):
+        """
+        Retourne la valeur d'une clé, ou None (absente ou expirée)
+
+        Une valeur trouvée devient la plus récemment utilisée.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and self.clock() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def reject(self, key):
+        """
+        Requalifie en échec le dernier succès de get pour une valeur
+        inutilisable, et retire l'entrée
+        """
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.hits -= 1
+                self.misses += 1
+
+    def put(self, key, value):
+        """Enregistre une valeur, en évinçant les entrées les moins récemment utilisées"""
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Compteurs du cache, pour le réglage de sa taille et de sa durée de vie"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -4,16 +4,83 @@ en utilisant les données GTFS
 """
 
 import heapq
+import multiprocessing
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
+from connection_scan import ConnectionScanEngine
+from instrumentation import instrumented, metrics
+from mc_raptor import MAX_LABELS, McRaptorEngine
+from raptor import RaptorEngine
+from route_cache import RouteCache
+from stop_graph import StopGraph
+from stop_times_store import format_gtfs_time
+
+
+# Moteur de routage des processus de calcul par lots: hérité du processus
+# parent (fork) ou rechargé depuis le snapshot binaire du réseau
+_worker_engine = None
+
+
+def _attach_snapshot(storage_manager, snapshot_path, source_hash):
+    """Initialise un processus de calcul depuis le snapshot du réseau"""
+    global _worker_engine
+    from gtfs_manager import GTFSManager
+    
+    gtfs_manager = GTFSManager(storage_manager)
+    state = storage_manager.load_snapshot(snapshot_path, source_hash, GTFSManager.SNAPSHOT_VERSION)
+    gtfs_manager.restore_snapshot_state(state)
+    _worker_engine = RoutingEngine(gtfs_manager)
+
+
+def _search_from_origin(origin_stop_id, target_stop_ids, departure_time, max_transfers):
+    """Recherche un-vers-plusieurs exécutée dans un processus de calcul"""
+    return _worker_engine.get_raptor().earliest_arrivals(
+        {origin_stop_id: _worker_engine.seconds_since_midnight(departure_time)},
+        target_stop_ids,
+        max_transfers,
+        _worker_engine.get_active_trips(departure_time.date())
+    )
+
 
 class RoutingEngine:
     """Moteur de routage pour calculer les itinéraires de transport en commun"""
     
-    def __init__(self, gtfs_manager):
+    # Algorithmes disponibles pour find_route
+    ALGORITHMS = ('astar', 'raptor', 'csa')
+    
+    # Nombre maximal de dates dont le masque des trajets actifs est conservé
+    ACTIVE_TRIPS_CACHE_SIZE = 32
+    
+    # Nombre maximal de graphes des arrêts restreints à un jour de service conservés
+    STOP_GRAPH_CACHE_SIZE = 4
+    
+    def __init__(self, gtfs_manager, route_cache=None, max_labels=MAX_LABELS):
+        """
+        Args:
+            gtfs_manager: Gestionnaire des données GTFS
+            route_cache: Cache des résultats de find_route (RouteCache par
+                         défaut; RouteCache(max_size=0) pour le désactiver)
+            max_labels: Taille maximale des ensembles d'étiquettes de la
+                        recherche multicritère (mémoire et durée bornées)
+        """
         self.gtfs_manager = gtfs_manager
+        self.route_cache = route_cache if route_cache is not None else RouteCache()
+        self.max_labels = max_labels
+        self.raptor = None
+        self.mcraptor = None
+        self.csa = None
+        # Masques des trajets actifs par date (LRU), pour les horaires et le calendrier courants
+        self.active_trips_cache = OrderedDict()
+        self.active_trips_version = None
+        # Graphes des arrêts restreints aux trajets d'un jour (LRU, clé: masque des trajets)
+        self.day_graphs = OrderedDict()
+        self.day_graphs_base = None
     
-    def find_route(self, origin, destination, departure_time=None):
+    @instrumented('find_route')
+    def find_route(self, origin, destination, departure_time=None, algorithm='astar', max_transfers=4):
         """
         Trouve l'itinéraire optimal entre deux points
         
@@ -21,6 +88,8 @@ class RoutingEngine:
             origin: tuple (lat, lon) du point de départ
             destination: tuple (lat, lon) du point d'arrivée
             departure_time: datetime optionnel pour le départ
+            algorithm: 'astar' (graphe statique), 'raptor' ou 'csa' (horaires réels)
+            max_transfers: nombre maximal de correspondances (RAPTOR)
         
         Returns:
             Liste des étapes de l'itinéraire ou None si aucun itinéraire trouvé
@@ -29,6 +98,55 @@ class RoutingEngine:
             print("Aucune donnée GTFS chargée")
             return None
         
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Algorithme inconnu: {algorithm}")
+        
+        departure_time = departure_time or datetime.now()
+        cache = self.route_cache
+        # Jeton de version bon marché: ne force ni le calendrier paresseux ni les index
+        cache.check_version(self.gtfs_manager.generation)
+        
+        if algorithm in ('raptor', 'csa'):
+            # Accès et sortie à pied vers tous les arrêts proches des deux points
+            access = self.walking_access(origin)
+            egress = self.walking_access(destination)
+            if not access or not egress:
+                print("Impossible de trouver des arrêts à proximité")
+                return None
+            
+            departure = self.seconds_since_midnight(departure_time)
+            # La clé porte les ensembles d'accès et de sortie complets (durées
+            # entières): deux points voisins aux marches différentes ne
+            # partagent pas un itinéraire dont l'arrivée inclut la sortie à pied
+            key = cache.make_key(tuple(sorted(access.items())), tuple(sorted(egress.items())),
+                                 departure_time, algorithm, max_transfers)
+            journey = None
+            entry = cache.get(key)
+            # Un itinéraire calculé pour un départ antérieur de la tranche reste
+            # optimal s'il est encore atteignable: partir plus tard ne peut
+            # qu'aboutir plus tard. Partir plus tôt peut permettre un trajet
+            # plus rapide: l'entrée n'est alors pas réutilisée.
+            if entry is not None:
+                cached_departure, journey = entry
+                if cached_departure > departure or \
+                        not self.journey_reachable(journey, access, egress, departure):
+                    cache.reject(key)
+                    journey = None
+            
+            if journey is None:
+                # Arrivée au plus tôt selon les horaires réels
+                sources = {stop_id: departure + duration for stop_id, duration in access.items()}
+                active_trips = self.get_active_trips(departure_time.date())
+                if algorithm == 'raptor':
+                    journey = self.get_raptor().earliest_arrival(sources, egress, max_transfers, active_trips)
+                else:
+                    journey = self.get_csa().earliest_arrival(sources, egress, active_trips)
+                if journey and journey['legs']:
+                    cache.put(key, (departure, journey))
+            if journey:
+                return self.format_journey(journey, origin, destination)
+            return None
+        
         # Trouver les arrêts les plus proches
         origin_stop, origin_dist = self.gtfs_manager.find_nearest_stop(
             origin[0], origin[1]
@@ -42,11 +160,16 @@ class RoutingEngine:
             return None
         
         # Utiliser l'algorithme A* pour trouver le meilleur itinéraire
-        route = self.a_star_search(
-            origin_stop['stop_id'],
-            destination_stop['stop_id'],
-            departure_time or datetime.now()
-        )
+        key = cache.make_key(origin_stop['stop_id'], destination_stop['stop_id'], departure_time, algorithm)
+        route = cache.get(key)
+        if route is None:
+            route = self.a_star_search(
+                origin_stop['stop_id'],
+                destination_stop['stop_id'],
+                departure_time
+            )
+            if route:
+                cache.put(key, route)
         
         if route:
             # Convertir l'itinéraire en format utilisable
@@ -54,10 +177,47 @@ class RoutingEngine:
         
         return None
     
+    def journey_reachable(self, journey, access, egress, departure):
+        """
+        Indique si un itinéraire en cache peut être pris en partant à
+        departure: son premier arrêt doit être accessible à temps et son
+        dernier arrêt faire partie des arrêts de sortie
+        """
+        first_stop = journey['legs'][0]['stop_ids'][0]
+        last_stop = journey['legs'][-1]['stop_ids'][-1]
+        return first_stop in access and last_stop in egress and \
+            departure + access[first_stop] <= journey['departure_time']
+    
+    @instrumented('walking_access')
+    def walking_access(self, point):
+        """
+        Arrêts accessibles à pied depuis un point, dans le rayon des
+        correspondances (à défaut, l'arrêt le plus proche)
+        
+        Returns:
+            dict {stop_id: durée de marche en secondes}
+        """
+        footpaths = self.gtfs_manager.get_footpaths()
+        stops = self.gtfs_manager.find_stops_within(point[0], point[1], footpaths.max_distance)
+        if not stops:
+            stop, distance = self.gtfs_manager.find_nearest_stop(point[0], point[1])
+            stops = [(stop, distance)] if stop else []
+        return {stop['stop_id']: footpaths.walking_time(distance) for stop, distance in stops}
+    
+    @instrumented('a_star_search')
     def a_star_search(self, start_stop_id, end_stop_id, departure_time):
         """
         Algorithme A* pour trouver le meilleur chemin entre deux arrêts
         
+        La recherche travaille sur le graphe précalculé des arrêts
+        (identifiants denses, coûts entiers en secondes) et mémorise pour
+        chaque arrêt son prédécesseur; le chemin n'est reconstruit qu'à la fin.
+        L'heuristique lit les distances vers la cible calculées par lot.
+        Seuls les trajets circulant à la date de départ sont retenus (voir
+        get_day_stop_graph). Si des étiquettes de hubs ont été précalculées
+        pour ce graphe (GTFSManager.build_hub_labels), le chemin de coût
+        minimal est lu directement dans les étiquettes sans parcourir le réseau.
+        
         Args:
             start_stop_id: ID de l'arrêt de départ
             end_stop_id: ID de l'arrêt d'arrivée
@@ -66,110 +226,445 @@ class RoutingEngine:
         Returns:
             Liste des arrêts formant l'itinéraire
         """
-        # File de priorité: (coût_total, coût_actuel, arrêt_actuel, chemin)
-        open_set = []
-        heapq.heappush(open_set, (0, 0, start_stop_id, [start_stop_id]))
+        graph = self.get_day_stop_graph(departure_time.date())
+        start = graph.stop_index.get(start_stop_id)
+        end = graph.stop_index.get(end_stop_id)
+        if start is None or end is None:
+            return [start_stop_id] if start_stop_id == end_stop_id else None
         
-        # Ensemble des arrêts visités
-        visited = set()
+        hub_labels = self.gtfs_manager.get_hub_labels()
+        if hub_labels is not None and graph is self.gtfs_manager.stop_graph:
+            path = hub_labels.shortest_path(start, end)
+            return [graph.stop_ids[stop] for stop in path] if path is not None else None
+        
+        offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+        # Vitesse moyenne de 30 km/h, en mètres par seconde
+        speed = 30000 / 3600
+        
+        count = len(graph)
+        best_cost = [float('inf')] * count
+        parents = array('i', [-1]) * count
+        settled = bytearray(count)
+        distances = graph.distances_to(end)
+        
+        # File de priorité: (coût_total, coût_actuel, arrêt_actuel)
+        best_cost[start] = 0
+        open_set = [(distances[start] / speed, 0, start)]
+        expanded = pushes = relaxed = 0  # Compteurs de l'instrumentation
         
         while open_set:
-            total_cost, current_cost, current_stop, path = heapq.heappop(open_set)
-            
-            # Si on a atteint la destination
-            if current_stop == end_stop_id:
-                return path
+            total_cost, current_cost, current = heapq.heappop(open_set)
             
             # Si déjà visité, passer
-            if current_stop in visited:
+            if settled[current]:
                 continue
+            settled[current] = 1
+            expanded += 1
             
-            visited.add(current_stop)
-            
-            # Trouver les arrêts voisins (arrêts connectés par des trajets)
-            neighbors = self.get_connected_stops(current_stop)
+            # Si on a atteint la destination, remonter les prédécesseurs
+            if current == end:
+                self.count_a_star(expanded, pushes, relaxed)
+                path = []
+                while current != -1:
+                    path.append(graph.stop_ids[current])
+                    current = parents[current]
+                path.reverse()
+                return path
             
-            for next_stop_id, transfer_cost in neighbors:
-                if next_stop_id not in visited:
-                    new_cost = current_cost + transfer_cost
-                    heuristic = self.calculate_heuristic(next_stop_id, end_stop_id)
-                    total = new_cost + heuristic
-                    
-                    new_path = path + [next_stop_id]
-                    heapq.heappush(open_set, (total, new_cost, next_stop_id, new_path))
+            relaxed += offsets[current + 1] - offsets[current]
+            for edge in range(offsets[current], offsets[current + 1]):
+                next_stop = targets[edge]
+                if settled[next_stop]:
+                    continue
+                new_cost = current_cost + costs[edge]
+                if new_cost < best_cost[next_stop]:
+                    best_cost[next_stop] = new_cost
+                    parents[next_stop] = current
+                    heapq.heappush(open_set, (new_cost + distances[next_stop] / speed, new_cost, next_stop))
+                    pushes += 1
         
+        self.count_a_star(expanded, pushes, relaxed)
         return None
     
-    def get_connected_stops(self, stop_id):
+    def get_day_stop_graph(self, day):
+        """
+        Graphe des arrêts limité aux trajets circulant à une date
+        
+        Le graphe complet du GTFSManager est retourné si tous les trajets
+        circulent ce jour-là (ou sans calendrier). Sinon un graphe restreint
+        est construit et conservé par masque de trajets: les dates de même
+        service (jours de semaine...) partagent le même graphe.
         """
-        Récupère les arrêts connectés à un arrêt donné via des trajets
-        Utilise l'index stop_to_trips pour des performances optimales
+        manager = self.gtfs_manager
+        graph = manager.get_stop_graph()
+        active_trips = self.get_active_trips(day)
+        if active_trips is None or 0 not in active_trips:
+            return graph
+        
+        graphs = self.day_graphs
+        if self.day_graphs_base is not graph:
+            graphs.clear()
+            self.day_graphs_base = graph
+        key = bytes(active_trips)
+        day_graph = graphs.get(key)
+        if day_graph is None:
+            day_graph = graphs[key] = StopGraph(
+                manager.stop_times_store, manager.get_spatial_index(), manager.get_footpaths(), active_trips
+            )
+            while len(graphs) > self.STOP_GRAPH_CACHE_SIZE:
+                graphs.popitem(last=False)
+        else:
+            graphs.move_to_end(key)
+        return day_graph
+    
+    def count_a_star(self, expanded, pushes, relaxed):
+        """Reporte les compteurs d'une recherche A* dans l'instrumentation"""
+        if metrics.enabled:
+            metrics.count('astar_searches')
+            metrics.count('astar_nodes_expanded', expanded)
+            metrics.count('astar_heap_pushes', pushes)
+            metrics.count('astar_edges_relaxed', relaxed)
+    
+    def find_routes_batch(self, pairs, departure_time=None, max_transfers=4, workers=None):
+        """
+        Calcule les itinéraires d'une liste de couples origine/destination
+        
+        Les points sont rattachés une seule fois à leur arrêt le plus proche
+        et une seule recherche RAPTOR est effectuée par arrêt d'origine.
+        
+        Args:
+            pairs: liste de couples ((lat, lon), (lat, lon))
+            departure_time: datetime optionnel pour le départ
+            max_transfers: nombre maximal de correspondances
+            workers: nombre de processus de calcul (None ou 1: séquentiel)
         
         Returns:
-            Liste de tuples (stop_id, coût)
-        """
-        connected = []
-        
-        # Utiliser l'index pour trouver rapidement les trajets
-        if stop_id in self.gtfs_manager.stop_to_trips_index:
-            for trip_info in self.gtfs_manager.stop_to_trips_index[stop_id]:
-                # Si un arrêt suivant existe
-                if 'next_stop_id' in trip_info:
-                    next_stop_id = trip_info['next_stop_id']
-                    # Coût basé sur le temps de trajet
-                    cost = self.calculate_time_cost(
-                        trip_info['departure_time'],
-                        trip_info['next_arrival_time']
-                    )
-                    connected.append((next_stop_id, cost))
-        
-        return connected
-    
-    def calculate_time_cost(self, departure_time, arrival_time):
-        """Calcule le coût en temps entre deux horaires"""
-        if not departure_time or not arrival_time:
-            return 1  # Coût par défaut
-        
-        try:
-            # Format GTFS: HH:MM:SS
-            dep_parts = departure_time.split(':')
-            arr_parts = arrival_time.split(':')
-            
-            dep_minutes = int(dep_parts[0]) * 60 + int(dep_parts[1])
-            arr_minutes = int(arr_parts[0]) * 60 + int(arr_parts[1])
-            
-            # Différence en minutes
-            diff = arr_minutes - dep_minutes
-            if diff < 0:
-                diff += 24 * 60  # Passage minuit
-            
-            return diff / 60  # Convertir en heures
-        except:
-            return 1
+            Liste des itinéraires formatés (ou None), dans l'ordre des couples
+        """
+        snapped = self.snap_points([point for pair in pairs for point in pair])
+        requests = {}
+        for origin, destination in pairs:
+            if snapped[origin] and snapped[destination]:
+                requests.setdefault(snapped[origin], set()).add(snapped[destination])
+        
+        journeys = self.search_one_to_many(requests, departure_time, max_transfers, workers)
+        
+        routes = []
+        for origin, destination in pairs:
+            journey = journeys.get(snapped[origin], {}).get(snapped[destination])
+            routes.append(self.format_journey(journey, origin, destination) if journey else None)
+        return routes
     
-    def calculate_heuristic(self, stop_id1, stop_id2):
+    def od_matrix(self, origins, destinations, departure_time=None, max_transfers=4, workers=None):
         """
-        Calcule l'heuristique (distance estimée) entre deux arrêts
-        pour l'algorithme A*
+        Calcule la matrice des temps de parcours origines × destinations
+        
+        Returns:
+            Liste de lignes (une par origine) des durées en secondes entre
+            l'heure de départ et l'arrivée, None si la destination est inaccessible
         """
-        try:
-            stop1 = self.gtfs_manager.stops.get(stop_id1)
-            stop2 = self.gtfs_manager.stops.get(stop_id2)
-            
-            if not stop1 or not stop2:
-                return 0
-            
-            lat1 = float(stop1['stop_lat'])
-            lon1 = float(stop1['stop_lon'])
-            lat2 = float(stop2['stop_lat'])
-            lon2 = float(stop2['stop_lon'])
-            
-            # Distance en mètres divisée par vitesse moyenne (30 km/h)
-            distance = self.gtfs_manager.calculate_distance(lat1, lon1, lat2, lon2)
-            return distance / (30000 / 60)  # Temps estimé en heures
-        except:
-            return 0
+        departure_time = departure_time or datetime.now()
+        departure = self.seconds_since_midnight(departure_time)
+        snapped = self.snap_points(list(origins) + list(destinations))
+        targets = {snapped[d] for d in destinations if snapped[d]}
+        requests = {snapped[o]: targets for o in origins if snapped[o]}
+        
+        journeys = self.search_one_to_many(requests, departure_time, max_transfers, workers)
+        
+        matrix = []
+        for origin in origins:
+            row = []
+            for destination in destinations:
+                journey = journeys.get(snapped[origin], {}).get(snapped[destination])
+                row.append(journey['arrival_time'] - departure if journey else None)
+            matrix.append(row)
+        return matrix
+    
+    def snap_points(self, points):
+        """Rattache chaque point distinct (lat, lon) à l'identifiant de son arrêt le plus proche"""
+        snapped = {}
+        for point in points:
+            if point not in snapped:
+                stop, _ = self.gtfs_manager.find_nearest_stop(point[0], point[1])
+                snapped[point] = stop['stop_id'] if stop else None
+        return snapped
+    
+    def search_one_to_many(self, requests, departure_time, max_transfers=4, workers=None):
+        """
+        Exécute une recherche un-vers-plusieurs par arrêt d'origine
+        
+        Args:
+            requests: dict {stop_id origine: ensemble des stop_id cibles}
+        
+        Returns:
+            dict {stop_id origine: {stop_id cible: itinéraire ou None}}
+        """
+        departure_time = departure_time or datetime.now()
+        departure = self.seconds_since_midnight(departure_time)
+        active_trips = self.get_active_trips(departure_time.date())
+        raptor = self.get_raptor()
+        
+        executor = None
+        if workers and workers > 1 and len(requests) > 1:
+            executor = self.create_worker_pool(workers)
+        
+        if executor is None:
+            return {
+                origin: raptor.earliest_arrivals({origin: departure}, targets, max_transfers, active_trips)
+                for origin, targets in requests.items()
+            }
+        
+        with executor:
+            futures = {
+                origin: executor.submit(_search_from_origin, origin, list(targets), departure_time, max_transfers)
+                for origin, targets in requests.items()
+            }
+            return {origin: future.result() for origin, future in futures.items()}
+    
+    def create_worker_pool(self, workers):
+        """
+        Crée un pool de processus partageant les index du réseau en lecture seule
+        
+        Avec fork, les processus héritent des index déjà construits (mémoire
+        partagée en copie sur écriture). Sinon, chaque processus recharge le
+        snapshot binaire du dernier import. Retourne None si aucun des deux
+        n'est possible (le calcul reste alors séquentiel).
+        """
+        global _worker_engine
+        
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _worker_engine = self
+            return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+        
+        storage_manager = self.gtfs_manager.storage_manager
+        gtfs_info = storage_manager.get_active_gtfs_import() if storage_manager else None
+        if not gtfs_info or not gtfs_info.get('snapshot_path'):
+            return None
+        return ProcessPoolExecutor(
+            workers,
+            initializer=_attach_snapshot,
+            initargs=(storage_manager, gtfs_info['snapshot_path'], gtfs_info['source_hash'])
+        )
+    
+    def get_raptor(self):
+        """Retourne le moteur RAPTOR, reconstruit si les motifs de trajets ont changé"""
+        patterns = self.gtfs_manager.get_trip_patterns()
+        footpaths = self.gtfs_manager.get_footpaths()
+        if self.raptor is None or self.raptor.patterns is not patterns or self.raptor.footpaths is not footpaths:
+            self.raptor = RaptorEngine(patterns, footpaths)
+        return self.raptor
+    
+    def raptor_search(self, start_stop_id, end_stop_id, departure_time, max_transfers=4):
+        """
+        Recherche RAPTOR d'arrivée au plus tôt entre deux arrêts
+        
+        Args:
+            start_stop_id: ID de l'arrêt de départ
+            end_stop_id: ID de l'arrêt d'arrivée
+            departure_time: Heure de départ (datetime)
+            max_transfers: Nombre maximal de correspondances
+        
+        Returns:
+            Itinéraire (dictionnaire avec legs, horaires en secondes) ou None
+        """
+        return self.get_raptor().earliest_arrival(
+            {start_stop_id: self.seconds_since_midnight(departure_time)},
+            {end_stop_id: 0},
+            max_transfers,
+            self.get_active_trips(departure_time.date())
+        )
+    
+    def raptor_profile(self, start_stop_id, end_stop_id, window_start, window_end, max_transfers=4):
+        """
+        Recherche de profil RAPTOR entre deux arrêts: tous les itinéraires
+        Pareto-optimaux (départ, arrivée, correspondances) partant entre
+        window_start et window_end, en un seul passage sur la plage
+        
+        Args:
+            start_stop_id: ID de l'arrêt de départ
+            end_stop_id: ID de l'arrêt d'arrivée
+            window_start, window_end: Bornes de la plage de départ (datetime)
+            max_transfers: Nombre maximal de correspondances
+        
+        Returns:
+            Liste d'itinéraires (format de raptor_search) triée par départ
+        """
+        start, end = self.window_seconds(window_start, window_end)
+        return self.get_raptor().profile(
+            {start_stop_id: 0},
+            {end_stop_id: 0},
+            start,
+            end,
+            max_transfers,
+            self.get_active_trips(window_start.date())
+        )
+    
+    def find_routes_in_window(self, origin, destination, window_start, window_end, max_transfers=4):
+        """
+        Trouve toutes les bonnes options entre deux points pour une plage de
+        départ (par exemple entre 08:00 et 09:00): aucune n'est à la fois
+        partie plus tôt, arrivée plus tard et avec plus de correspondances
+        qu'une autre
+        
+        Args:
+            origin: tuple (lat, lon) du point de départ
+            destination: tuple (lat, lon) du point d'arrivée
+            window_start, window_end: Bornes de la plage de départ (datetime)
+            max_transfers: Nombre maximal de correspondances
+        
+        Returns:
+            Liste d'itinéraires formatés (voir format_journey) triée par
+            départ, vide si aucun, ou None sans données ou arrêts proches
+        """
+        if not self.gtfs_manager.is_gtfs_loaded():
+            print("Aucune donnée GTFS chargée")
+            return None
+        
+        access = self.walking_access(origin)
+        egress = self.walking_access(destination)
+        if not access or not egress:
+            print("Impossible de trouver des arrêts à proximité")
+            return None
+        
+        start, end = self.window_seconds(window_start, window_end)
+        journeys = self.get_raptor().profile(
+            access, egress, start, end, max_transfers, self.get_active_trips(window_start.date())
+        )
+        return [self.format_journey(journey, origin, destination) for journey in journeys]
     
+    def window_seconds(self, window_start, window_end):
+        """
+        Convertit une plage de départ en secondes depuis le début du jour de
+        service de window_start (au-delà de 24:00 si elle passe minuit)
+        """
+        if window_end < window_start:
+            raise ValueError("La fin de la plage de départ précède son début")
+        start = self.seconds_since_midnight(window_start)
+        return start, start + int((window_end - window_start).total_seconds())
+    
+    def get_mcraptor(self):
+        """Retourne le moteur McRAPTOR, reconstruit si les motifs ou la taille des ensembles ont changé"""
+        patterns = self.gtfs_manager.get_trip_patterns()
+        footpaths = self.gtfs_manager.get_footpaths()
+        engine = self.mcraptor
+        if engine is None or engine.patterns is not patterns or engine.footpaths is not footpaths:
+            engine = self.mcraptor = McRaptorEngine(patterns, footpaths, self.max_labels)
+        engine.max_labels = self.max_labels
+        return engine
+    
+    def mcraptor_search(self, start_stop_id, end_stop_id, departure_time, max_transfers=4):
+        """
+        Recherche multicritère entre deux arrêts: itinéraires Pareto-optimaux
+        en heure d'arrivée, nombre de correspondances et durée de marche
+        
+        Args:
+            start_stop_id: ID de l'arrêt de départ
+            end_stop_id: ID de l'arrêt d'arrivée
+            departure_time: Heure de départ (datetime)
+            max_transfers: Nombre maximal de correspondances
+        
+        Returns:
+            Liste d'itinéraires (format de raptor_search complété par
+            walking_time et walking_distance) triée par heure d'arrivée
+        """
+        return self.get_mcraptor().search(
+            {start_stop_id: self.seconds_since_midnight(departure_time)},
+            {end_stop_id: 0},
+            max_transfers,
+            self.get_active_trips(departure_time.date())
+        )
+    
+    def find_routes_multicriteria(self, origin, destination, departure_time=None, max_transfers=4):
+        """
+        Trouve les compromis entre heure d'arrivée, nombre de correspondances
+        et marche (accès et sortie compris) entre deux points
+        
+        Args:
+            origin: tuple (lat, lon) du point de départ
+            destination: tuple (lat, lon) du point d'arrivée
+            departure_time: datetime optionnel pour le départ
+            max_transfers: Nombre maximal de correspondances
+        
+        Returns:
+            Liste d'itinéraires formatés (voir format_journey) triée par
+            heure d'arrivée, ou None sans données ou arrêts proches
+        """
+        if not self.gtfs_manager.is_gtfs_loaded():
+            print("Aucune donnée GTFS chargée")
+            return None
+        
+        access = self.walking_access(origin)
+        egress = self.walking_access(destination)
+        if not access or not egress:
+            print("Impossible de trouver des arrêts à proximité")
+            return None
+        
+        departure_time = departure_time or datetime.now()
+        departure = self.seconds_since_midnight(departure_time)
+        journeys = self.get_mcraptor().search(
+            {stop_id: departure + duration for stop_id, duration in access.items()},
+            egress,
+            max_transfers,
+            self.get_active_trips(departure_time.date()),
+            departure
+        )
+        return [self.format_journey(journey, origin, destination) for journey in journeys]
+    
+    def get_csa(self):
+        """Retourne le moteur CSA, reconstruit si les stop_times ont changé"""
+        store = self.gtfs_manager.stop_times_store
+        footpaths = self.gtfs_manager.get_footpaths()
+        if self.csa is None or self.csa.store is not store or self.csa.footpaths is not footpaths:
+            self.csa = ConnectionScanEngine(store, self.gtfs_manager.trips, footpaths)
+        return self.csa
+    
+    def csa_search(self, start_stop_id, end_stop_id, departure_time):
+        """
+        Recherche CSA d'arrivée au plus tôt entre deux arrêts
+        
+        Args:
+            start_stop_id: ID de l'arrêt de départ
+            end_stop_id: ID de l'arrêt d'arrivée
+            departure_time: Heure de départ (datetime)
+        
+        Returns:
+            Itinéraire (même format que raptor_search) ou None
+        """
+        return self.get_csa().earliest_arrival(
+            {start_stop_id: self.seconds_since_midnight(departure_time)},
+            {end_stop_id: 0},
+            self.get_active_trips(departure_time.date())
+        )
+    
+    def get_active_trips(self, day):
+        """
+        Retourne le masque des trajets circulant à une date (None: pas de calendrier)
+        
+        Le masque est calculé une fois par date puis conservé pour les
+        ACTIVE_TRIPS_CACHE_SIZE dates les plus récemment utilisées; le cache
+        est vidé lorsque les stop_times, les trajets ou le calendrier de
+        service sont remplacés (import ou mise à jour).
+        """
+        manager = self.gtfs_manager
+        cache = self.active_trips_cache
+        version = (manager.stop_times_store, manager.trips, manager.service_calendar)
+        if self.active_trips_version is None or any(a is not b for a, b in zip(version, self.active_trips_version)):
+            cache.clear()
+            self.active_trips_version = version
+        mask = cache.get(day)
+        if mask is None and day not in cache:
+            mask = cache[day] = manager.get_active_trips(day)
+            while len(cache) > self.ACTIVE_TRIPS_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(day)
+        return mask
+    
+    def seconds_since_midnight(self, departure_time):
+        """Convertit un datetime en secondes depuis le début du jour de service"""
+        return departure_time.hour * 3600 + departure_time.minute * 60 + departure_time.second
+    
+    @instrumented('format_route')
     def format_route(self, stop_ids, origin, destination):
         """
         Formate l'itinéraire pour l'affichage
@@ -213,3 +708,47 @@ class RoutingEngine:
         })
         
         return route
+    
+    @instrumented('format_journey')
+    def format_journey(self, journey, origin, destination):
+        """
+        Formate un itinéraire horaire (RAPTOR) pour l'affichage
+        
+        Chaque arrêt parcouru est complété par le trajet emprunté et ses
+        horaires de passage (HH:MM:SS); les arrêts des correspondances à pied
+        sont de type 'walk' (sans trajet).
+        """
+        route = [{
+            'type': 'origin',
+            'lat': origin[0],
+            'lon': origin[1],
+            'name': 'Départ',
+            'departure_time': format_gtfs_time(journey['departure_time'])
+        }]
+        
+        for leg in journey['legs']:
+            for i, stop_id in enumerate(leg['stop_ids']):
+                stop = self.gtfs_manager.stops.get(stop_id)
+                if not stop:
+                    continue
+                route.append({
+                    'type': 'stop' if leg['type'] == 'transit' else 'walk',
+                    'lat': float(stop['stop_lat']),
+                    'lon': float(stop['stop_lon']),
+                    'name': stop.get('stop_name', 'Arrêt'),
+                    'stop_id': stop_id,
+                    'trip_id': leg['trip_id'],
+                    'route_id': leg['route_id'],
+                    'arrival_time': format_gtfs_time(leg['arrival_times'][i]),
+                    'departure_time': format_gtfs_time(leg['departure_times'][i])
+                })
+        
+        route.append({
+            'type': 'destination',
+            'lat': destination[0],
+            'lon': destination[1],
+            'name': 'Arrivée',
+            'arrival_time': format_gtfs_time(journey['arrival_time'])
+        })
+        
+        return route
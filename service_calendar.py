@@ -0,0 +1,90 @@
+"""
+Calendrier de service - Jours de circulation de chaque service_id sous forme
+de bitsets couvrant la période de validité du réseau
+"""
+
+from datetime import datetime, timedelta
+
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def parse_gtfs_date(value):
+    """Convertit une date GTFS YYYYMMDD en date (None si invalide)"""
+    try:
+        return datetime.strptime(value.strip(), '%Y%m%d').date()
+    except (AttributeError, ValueError):
+        return None
+
+
+class ServiceCalendar:
+    """
+    Jours actifs de chaque service
+
+    Le bit i du bitset d'un service indique s'il circule le jour
+    start_date + i. Les bitsets combinent calendar.txt (jours de semaine sur
+    une période) et les exceptions de calendar_dates.txt (1 = ajout, 2 = retrait).
+    """
+
+    def __init__(self, calendar, calendar_dates):
+        periods = []
+        for service_id, row in calendar.items():
+            start = parse_gtfs_date(row.get('start_date'))
+            end = parse_gtfs_date(row.get('end_date'))
+            if start and end and start <= end:
+                weekdays = [row.get(day, '0').strip() == '1' for day in WEEKDAYS]
+                periods.append((service_id, start, end, weekdays))
+
+        exceptions = []
+        for row in calendar_dates:
+            day = parse_gtfs_date(row.get('date'))
+            if day and row.get('service_id'):
+                exceptions.append((row['service_id'], day, row.get('exception_type', '').strip()))
+
+        days = [p[1] for p in periods] + [p[2] for p in periods] + [e[1] for e in exceptions]
+        self.start_date = min(days) if days else None
+        self.end_date = max(days) if days else None
+        self.bitsets = {}
+
+        for service_id, start, end, weekdays in periods:
+            bits = self.bitsets.get(service_id, 0)
+            offset = (start - self.start_date).days
+            day = start
+            while day <= end:
+                if weekdays[day.weekday()]:
+                    bits |= 1 << offset
+                day += timedelta(days=1)
+                offset += 1
+            self.bitsets[service_id] = bits
+
+        for service_id, day, exception_type in exceptions:
+            bit = 1 << (day - self.start_date).days
+            bits = self.bitsets.get(service_id, 0)
+            if exception_type == '1':
+                bits |= bit
+            elif exception_type == '2':
+                bits &= ~bit
+            self.bitsets[service_id] = bits
+
+    def __len__(self):
+        return len(self.bitsets)
+
+    def day_offset(self, day):
+        """Rang du jour dans la période de validité (None s'il est hors période)"""
+        if self.start_date is None or not self.start_date <= day <= self.end_date:
+            return None
+        return (day - self.start_date).days
+
+    def is_active(self, service_id, day):
+        """Indique si un service circule un jour donné"""
+        offset = self.day_offset(day)
+        if offset is None:
+            return False
+        return bool(self.bitsets.get(service_id, 0) >> offset & 1)
+
+    def active_services(self, day):
+        """Ensemble des service_id circulant un jour donné"""
+        offset = self.day_offset(day)
+        if offset is None:
+            return set()
+        return {service_id for service_id, bits in self.bitsets.items() if bits >> offset & 1}
@@ -0,0 +1,225 @@
+"""
+Stockage des tracés - Coordonnées des formes (shapes.txt) en tableaux
+float32 contigus, avec niveaux simplifiés (Douglas-Peucker) par zoom
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from math import radians, cos
+
+from geo import METERS_PER_DEGREE, equirectangular_one_to_many, np
+
+
+# Niveaux de simplification (zoom maximal, tolérance en mètres), du plus
+# grossier au plus fin; au-delà du dernier zoom le tracé complet est utilisé
+SIMPLIFICATION_LEVELS = ((11, 100.0), (14, 20.0), (16, 4.0))
+
+# Taille de segment au-delà de laquelle les distances sont calculées avec NumPy
+VECTORIZE_THRESHOLD = 64
+
+
+def _farthest_point(xs, ys, first, last, tolerance2):
+    """Point de ]first, last[ le plus éloigné du segment, s'il dépasse la tolérance (-1 sinon)"""
+    x1, y1 = xs[first], ys[first]
+    dx, dy = xs[last] - x1, ys[last] - y1
+    length2 = dx * dx + dy * dy
+    px = xs[first + 1:last] - x1
+    py = ys[first + 1:last] - y1
+    if length2 > 0:
+        t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+        px = px - t * dx
+        py = py - t * dy
+    distances2 = px * px + py * py
+    best = int(np.argmax(distances2))
+    return first + 1 + best if distances2[best] > tolerance2 else -1
+
+
+def douglas_peucker(lats, lons, tolerance):
+    """
+    Simplifie une polyligne (algorithme de Douglas-Peucker, itératif)
+
+    Les distances sont calculées dans une projection équirectangulaire
+    locale, suffisante à l'échelle d'un tracé de ligne.
+
+    Returns:
+        Liste croissante des indices des points conservés (extrémités comprises)
+    """
+    count = len(lats)
+    if count <= 2:
+        return list(range(count))
+
+    scale = METERS_PER_DEGREE * cos(radians(sum(lats) / count))
+    if np is not None and count > VECTORIZE_THRESHOLD:
+        xs = np.asarray(lons, dtype=np.float64) * scale
+        ys = np.asarray(lats, dtype=np.float64) * METERS_PER_DEGREE
+    else:
+        xs = [lon * scale for lon in lons]
+        ys = [lat * METERS_PER_DEGREE for lat in lats]
+    tolerance2 = tolerance * tolerance
+
+    keep = bytearray(count)
+    keep[0] = keep[-1] = 1
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = xs[first], ys[first]
+        dx, dy = xs[last] - x1, ys[last] - y1
+        length2 = dx * dx + dy * dy
+
+        farthest, max_distance2 = -1, tolerance2
+        if np is not None and last - first > VECTORIZE_THRESHOLD:
+            farthest = _farthest_point(xs, ys, first, last, tolerance2)
+            if farthest >= 0:
+                keep[farthest] = 1
+                stack.append((first, farthest))
+                stack.append((farthest, last))
+            continue
+        for i in range(first + 1, last):
+            px, py = xs[i] - x1, ys[i] - y1
+            if length2 > 0:
+                # Distance au segment (projection bornée à ses extrémités)
+                t = min(1.0, max(0.0, (px * dx + py * dy) / length2))
+                px, py = px - t * dx, py - t * dy
+            distance2 = px * px + py * py
+            if distance2 > max_distance2:
+                farthest, max_distance2 = i, distance2
+
+        if farthest >= 0:
+            keep[farthest] = 1
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [i for i in range(count) if keep[i]]
+
+
+class ShapeStore:
+    """
+    Tracés de toutes les formes dans deux colonnes float32 (lats, lons)
+
+    Les points de la forme d'identifiant dense s sont
+    lats[offsets[s]:offsets[s + 1]]. Chaque niveau de simplification
+    conserve les indices (globaux) des points retenus, indexés par forme de
+    la même façon par level_offsets.
+    """
+
+    def __init__(self, shapes=None, levels=SIMPLIFICATION_LEVELS):
+        """
+        Args:
+            shapes: dict {shape_id: (lats, lons)} de points triés par séquence
+            levels: niveaux de simplification (zoom maximal, tolérance en mètres)
+        """
+        self.shape_ids = []
+        self.shape_index = {}
+        self.offsets = array('i', [0])
+        self.lats = array('f')
+        self.lons = array('f')
+        self.levels = tuple(levels)
+        self.level_points = [array('i') for _ in self.levels]
+        self.level_offsets = [array('i', [0]) for _ in self.levels]
+
+        for shape_id, (lats, lons) in (shapes or {}).items():
+            self.add(shape_id, lats, lons)
+
+    def __len__(self):
+        return len(self.shape_ids)
+
+    def __contains__(self, shape_id):
+        return shape_id in self.shape_index
+
+    def __getitem__(self, shape_id):
+        """Retourne les coordonnées complètes (lats, lons) d'une forme"""
+        shape = self.shape_number(shape_id)
+        if shape is None:
+            raise KeyError(shape_id)
+        start, end = self.shape_range(shape)
+        return self.lats[start:end], self.lons[start:end]
+
+    def shape_number(self, shape_id):
+        """Identifiant dense d'une forme (None si inconnue)"""
+        return self.shape_index.get(shape_id)
+
+    def add(self, shape_id, lats, lons):
+        """Ajoute une forme et précalcule ses niveaux simplifiés"""
+        shape = len(self.shape_ids)
+        self.shape_index[shape_id] = shape
+        self.shape_ids.append(shape_id)
+        start = len(self.lats)
+        self.lats.extend(lats)
+        self.lons.extend(lons)
+        self.offsets.append(len(self.lats))
+
+        # Chaque niveau est simplifié à partir du niveau plus fin suivant:
+        # les niveaux grossiers ne parcourent qu'une fraction des points
+        kept = list(range(len(lats)))
+        for level in reversed(range(len(self.levels))):
+            tolerance = self.levels[level][1]
+            selected = douglas_peucker([lats[i] for i in kept], [lons[i] for i in kept], tolerance)
+            kept = [kept[i] for i in selected]
+            self.level_points[level].extend(start + i for i in kept)
+            self.level_offsets[level].append(len(self.level_points[level]))
+
+    def shape_range(self, shape):
+        """Bornes [début, fin) des points d'une forme (identifiant dense)"""
+        return self.offsets[shape], self.offsets[shape + 1]
+
+    def point_count(self, zoom=None):
+        """Nombre total de points stockés au niveau de détail d'un zoom"""
+        level = self.level_for_zoom(zoom)
+        return len(self.lats) if level is None else len(self.level_points[level])
+
+    def level_for_zoom(self, zoom):
+        """Niveau de simplification d'un zoom de carte (None: tracé complet)"""
+        if zoom is None:
+            return None
+        for level, (max_zoom, _) in enumerate(self.levels):
+            if zoom <= max_zoom:
+                return level
+        return None
+
+    def polyline(self, shape_id, zoom=None):
+        """Coordonnées [(lat, lon), ...] d'une forme au niveau de détail d'un zoom"""
+        shape = self.shape_number(shape_id)
+        if shape is None:
+            return []
+        start, end = self.shape_range(shape)
+        return self._points(shape, start, end - 1, zoom)
+
+    def slice_between(self, shape_id, lat1, lon1, lat2, lon2, zoom=None):
+        """
+        Portion d'une forme entre deux positions (typiquement deux arrêts)
+
+        Chaque position est rattachée au point du tracé le plus proche; la
+        seconde est cherchée après la première, ce qui respecte le sens de
+        parcours des tracés en boucle.
+
+        Returns:
+            Liste [(lat, lon), ...] au niveau de détail du zoom ([] si forme inconnue)
+        """
+        shape = self.shape_number(shape_id)
+        if shape is None:
+            return []
+        start, end = self.shape_range(shape)
+        if start == end:
+            return []
+        first = self._nearest_point(lat1, lon1, start, end)
+        last = self._nearest_point(lat2, lon2, first, end)
+        return self._points(shape, first, last, zoom)
+
+    def _nearest_point(self, lat, lon, start, end):
+        """Indice global du point de [start, end) le plus proche d'une position"""
+        distances = equirectangular_one_to_many(lat, lon, self.lats[start:end], self.lons[start:end])
+        best = min(range(end - start), key=distances.__getitem__)
+        return start + best
+
+    def _points(self, shape, first, last, zoom):
+        """Points d'indices globaux [first, last] d'une forme, extrémités toujours incluses"""
+        level = self.level_for_zoom(zoom)
+        if level is None:
+            indices = range(first, last + 1)
+        else:
+            points = self.level_points[level]
+            offsets = self.level_offsets[level]
+            low = bisect_right(points, first, offsets[shape], offsets[shape + 1])
+            high = bisect_left(points, last, low, offsets[shape + 1])
+            indices = [first] + list(points[low:high]) + ([last] if last > first else [])
+        return [(float(self.lats[i]), float(self.lons[i])) for i in indices]
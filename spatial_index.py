@@ -0,0 +1,161 @@
+"""
+Index spatial des arrêts - Grille uniforme lat/lon pour les recherches
+de proximité (plus proche voisin, k plus proches, rayon)
+"""
+
+import heapq
+from array import array
+from math import radians, cos
+
+from geo import METERS_PER_DEGREE, haversine_one_to_many
+
+
+class StopSpatialIndex:
+    """
+    Grille uniforme sur les coordonnées des arrêts
+
+    Les coordonnées sont converties en float une seule fois à la construction.
+    Chaque cellule mesure au moins cell_size mètres dans les deux directions,
+    ce qui permet d'élaguer la recherche anneau par anneau autour du point.
+    """
+
+    def __init__(self, stops, cell_size=500):
+        self.cell_size = cell_size
+        self.stop_ids = []
+        self.lats = array('d')
+        self.lons = array('d')
+
+        for stop_id, stop in stops.items():
+            try:
+                lat = float(stop['stop_lat'])
+                lon = float(stop['stop_lon'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.stop_ids.append(stop_id)
+            self.lats.append(lat)
+            self.lons.append(lon)
+
+        # Taille des cellules en degrés: la largeur en longitude est calculée
+        # à la latitude la plus élevée du réseau (où un degré est le plus court)
+        max_abs_lat = max((abs(lat) for lat in self.lats), default=0.0)
+        self.lat_step = cell_size / METERS_PER_DEGREE
+        self.lon_step = cell_size / (METERS_PER_DEGREE * max(cos(radians(max_abs_lat)), 0.01))
+
+        self.cells = {}
+        for i in range(len(self.stop_ids)):
+            self.cells.setdefault(self._cell(self.lats[i], self.lons[i]), []).append(i)
+
+        rows = [cell[0] for cell in self.cells]
+        cols = [cell[1] for cell in self.cells]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols)) if self.cells else None
+
+    def __len__(self):
+        return len(self.stop_ids)
+
+    def _cell(self, lat, lon):
+        """Retourne la cellule (ligne, colonne) contenant un point"""
+        return int(lat // self.lat_step), int(lon // self.lon_step)
+
+    def _ring(self, row, col, k):
+        """Itère sur les cellules occupées à distance de Chebyshev k d'une cellule"""
+        cells = self.cells
+        if k == 0:
+            points = cells.get((row, col))
+            if points:
+                yield points
+            return
+        for c in range(col - k, col + k + 1):
+            for r in (row - k, row + k):
+                points = cells.get((r, c))
+                if points:
+                    yield points
+        for r in range(row - k + 1, row + k):
+            for c in (col - k, col + k):
+                points = cells.get((r, c))
+                if points:
+                    yield points
+
+    def _max_ring(self, row, col):
+        """Nombre d'anneaux au-delà duquel plus aucune cellule n'est occupée"""
+        min_row, max_row, min_col, max_col = self.bounds
+        return max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+    def _ring_min_distance(self, lat, k):
+        """Distance minimale (mètres) entre le point et une cellule de l'anneau k"""
+        lon_meters = self.lon_step * METERS_PER_DEGREE * cos(radians(lat))
+        return (k - 1) * min(self.cell_size, lon_meters) if k > 0 else 0
+
+    def nearest(self, lat, lon, max_distance=float('inf')):
+        """
+        Trouve l'arrêt le plus proche à moins de max_distance mètres
+
+        Returns:
+            Tuple (stop_id, distance) ou (None, inf)
+        """
+        results = self.k_nearest(lat, lon, 1, max_distance)
+        if results:
+            return results[0]
+        return None, float('inf')
+
+    def k_nearest(self, lat, lon, k, max_distance=float('inf')):
+        """
+        Trouve les k arrêts les plus proches à moins de max_distance mètres
+
+        Returns:
+            Liste de tuples (stop_id, distance) triée par distance croissante
+        """
+        if not self.cells or k <= 0:
+            return []
+
+        row, col = self._cell(lat, lon)
+        best = []  # Tas max (distances négatives) des k meilleurs candidats
+
+        for ring in range(self._max_ring(row, col) + 1):
+            bound = max_distance if len(best) < k else min(max_distance, -best[0][0])
+            if self._ring_min_distance(lat, ring) > bound:
+                break
+            # Distances de tous les candidats de l'anneau en un seul appel vectorisé
+            candidates = [i for points in self._ring(row, col, ring) for i in points]
+            if not candidates:
+                continue
+            distances = haversine_one_to_many(lat, lon, self.lats, self.lons, candidates)
+            for i, distance in zip(candidates, distances):
+                distance = float(distance)
+                if distance >= max_distance:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, i))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, i))
+
+        return [(self.stop_ids[i], -negative) for negative, i in sorted(best, reverse=True)]
+
+    def within_radius(self, lat, lon, radius):
+        """
+        Trouve tous les arrêts à moins de radius mètres
+
+        Returns:
+            Liste de tuples (stop_id, distance) triée par distance croissante
+        """
+        if not self.cells:
+            return []
+
+        lon_meters = METERS_PER_DEGREE * max(cos(radians(lat)), 0.01)
+        min_row, min_col = self._cell(lat - radius / METERS_PER_DEGREE, lon - radius / lon_meters)
+        max_row, max_col = self._cell(lat + radius / METERS_PER_DEGREE, lon + radius / lon_meters)
+
+        candidates = []
+        for r in range(max(min_row, self.bounds[0]), min(max_row, self.bounds[1]) + 1):
+            for c in range(max(min_col, self.bounds[2]), min(max_col, self.bounds[3]) + 1):
+                candidates.extend(self.cells.get((r, c), ()))
+        if not candidates:
+            return []
+
+        distances = haversine_one_to_many(lat, lon, self.lats, self.lons, candidates)
+        results = [
+            (self.stop_ids[i], float(distance))
+            for i, distance in zip(candidates, distances) if distance <= radius
+        ]
+
+        results.sort(key=lambda result: result[1])
+        return results
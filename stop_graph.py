@@ -0,0 +1,113 @@
+"""
+Graphe statique des arrêts - Arcs arrêt -> arrêt suivant au format CSR,
+avec coûts entiers précalculés pour la recherche A*
+"""
+
+from array import array
+
+from geo import haversine, haversine_one_to_many, np
+from trip_patterns import fill_missing_times
+
+
+class StopGraph:
+    """
+    Graphe des arrêts indexé par identifiant dense (celui du stockage stop_times)
+
+    Les arcs sortants de l'arrêt s sont targets[offsets[s]:offsets[s + 1]],
+    de coûts costs[...] en secondes (temps de parcours minimal observé entre
+    les deux arrêts, ou durée de la correspondance à pied). lats/lons
+    donnent les coordonnées des arrêts (NaN si inconnues), lues par
+    l'heuristique d'A*.
+    """
+
+    def __init__(self, store, spatial_index, footpaths=None, active_trips=None):
+        """
+        Args:
+            store: StopTimesStore
+            spatial_index: StopSpatialIndex (coordonnées des arrêts)
+            footpaths: Correspondances à pied optionnelles
+            active_trips: Masque optionnel des trajets retenus (trajets
+                          circulant un jour donné); tous si None
+        """
+        self.stop_ids = store.stop_ids
+        self.stop_index = store.stop_index
+        count = len(store.stop_ids)
+
+        edges = {}
+        for trip_index in range(store.trip_count()):
+            if active_trips is not None and not active_trips[trip_index]:
+                continue
+            start, end = store.trip_range(trip_index)
+            arrivals = list(store.arrivals[start:end])
+            departures = list(store.departures[start:end])
+            if end - start < 2 or not fill_missing_times(arrivals, departures):
+                continue
+            for i in range(end - start - 1):
+                cost = arrivals[i + 1] - departures[i]
+                if cost < 0:
+                    cost += 24 * 3600  # Passage minuit
+                edge = (store.stops[start + i], store.stops[start + i + 1])
+                if cost < edges.get(edge, cost + 1):
+                    edges[edge] = cost
+
+        if footpaths is not None:
+            for source in range(count):
+                for target, duration in footpaths.from_stop(source):
+                    if duration < edges.get((source, target), duration + 1):
+                        edges[(source, target)] = duration
+
+        self.offsets = array('i', [0]) * (count + 1)
+        self.targets = array('i')
+        self.costs = array('i')
+        for (source, target), cost in sorted(edges.items()):
+            self.offsets[source + 1] += 1
+            self.targets.append(target)
+            self.costs.append(cost)
+        for i in range(1, count + 1):
+            self.offsets[i] += self.offsets[i - 1]
+
+        self.lats = array('d', [float('nan')]) * count
+        self.lons = array('d', [float('nan')]) * count
+        for stop_id, lat, lon in zip(spatial_index.stop_ids, spatial_index.lats, spatial_index.lons):
+            stop = store.stop_index.get(stop_id)
+            if stop is not None:
+                self.lats[stop] = lat
+                self.lons[stop] = lon
+
+    def __len__(self):
+        return len(self.stop_ids)
+
+    def distance(self, stop1, stop2):
+        """Distance Haversine (mètres) entre deux arrêts denses, 0 si coordonnées inconnues"""
+        lat1, lon1 = self.lats[stop1], self.lons[stop1]
+        lat2, lon2 = self.lats[stop2], self.lons[stop2]
+        if lat1 != lat1 or lat2 != lat2:
+            return 0.0
+        return haversine(lat1, lon1, lat2, lon2)
+
+    def distances_to(self, target):
+        """
+        Distances (mètres) de tous les arrêts vers un arrêt cible, pour l'heuristique A*
+
+        Avec NumPy, toutes les distances sont calculées en un seul appel
+        vectorisé; sinon elles sont calculées à la demande et mémorisées.
+        """
+        lat, lon = self.lats[target], self.lons[target]
+        if lat != lat:
+            return [0.0] * len(self)
+        if np is None:
+            return LazyDistances(self, target)
+        return np.nan_to_num(haversine_one_to_many(lat, lon, self.lats, self.lons), nan=0.0)
+
+
+class LazyDistances(dict):
+    """Distances vers un arrêt cible calculées au premier accès (repli sans NumPy)"""
+
+    def __init__(self, graph, target):
+        super().__init__()
+        self.graph = graph
+        self.target = target
+
+    def __missing__(self, stop):
+        distance = self[stop] = self.graph.distance(stop, self.target)
+        return distance
@@ -0,0 +1,299 @@
+"""
+Stockage colonnaire des stop_times - Représentation compacte des horaires
+d'arrêt sous forme de tableaux typés (module array)
+"""
+
+from array import array
+from bisect import bisect_right
+
+
+def parse_gtfs_time(value):
+    """Convertit un horaire GTFS HH:MM:SS en secondes depuis minuit (-1 si absent)"""
+    if not value:
+        return -1
+    try:
+        hours, minutes, seconds = value.strip().split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+    except ValueError:
+        return -1
+
+
+def format_gtfs_time(seconds):
+    """Convertit des secondes depuis minuit en horaire GTFS HH:MM:SS ('' si absent)"""
+    if seconds < 0:
+        return ''
+    return '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class StopTimesStore:
+    """
+    Horaires d'arrêt stockés par colonnes
+
+    Les identifiants d'arrêts et de trajets sont internés en entiers denses.
+    Les lignes d'un même trajet sont contiguës et triées par stop_sequence:
+    le trajet t occupe les lignes [trip_offsets[t], trip_offsets[t + 1]).
+    """
+
+    def __init__(self):
+        self.stop_ids = []
+        self.stop_index = {}
+        self.trip_ids = []
+        self.trip_index = {}
+        self.trip_offsets = array('i', [0])
+        self.stops = array('i')
+        self.arrivals = array('i')
+        self.departures = array('i')
+        self.sequences = array('i')
+        # Index inverse arrêt -> lignes, construit à la demande
+        self._stop_offsets = None
+        self._stop_rows = None
+
+    def __len__(self):
+        return len(self.stops)
+
+    def intern_stop(self, stop_id):
+        """Retourne l'identifiant dense d'un arrêt (en le créant si besoin)"""
+        index = self.stop_index.get(stop_id)
+        if index is None:
+            index = len(self.stop_ids)
+            self.stop_index[stop_id] = index
+            self.stop_ids.append(stop_id)
+        return index
+
+    def trip_count(self):
+        """Nombre de trajets stockés"""
+        return len(self.trip_ids)
+
+    def trip_range(self, trip_index):
+        """Retourne les bornes (début, fin) des lignes d'un trajet"""
+        return self.trip_offsets[trip_index], self.trip_offsets[trip_index + 1]
+
+    def trip_of_row(self, row):
+        """Retourne l'identifiant dense du trajet contenant une ligne"""
+        return bisect_right(self.trip_offsets, row) - 1
+
+    def row_dict(self, row):
+        """Reconstruit une ligne stop_times au format dictionnaire GTFS"""
+        return {
+            'stop_id': self.stop_ids[self.stops[row]],
+            'arrival_time': format_gtfs_time(self.arrivals[row]),
+            'departure_time': format_gtfs_time(self.departures[row]),
+            'stop_sequence': str(self.sequences[row])
+        }
+
+    def get_trip_rows(self, trip_id):
+        """Retourne les lignes d'un trajet au format dictionnaire"""
+        trip_index = self.trip_index.get(trip_id)
+        if trip_index is None:
+            return []
+        start, end = self.trip_range(trip_index)
+        rows = []
+        for row in range(start, end):
+            stop_time = self.row_dict(row)
+            stop_time['trip_id'] = trip_id
+            rows.append(stop_time)
+        return rows
+
+    def to_dict_of_lists(self):
+        """Construit la vue historique {trip_id: [ligne, ...]}"""
+        return {trip_id: self.get_trip_rows(trip_id) for trip_id in self.trip_ids}
+
+    def build_stop_rows(self):
+        """Construit l'index inverse arrêt -> lignes (format CSR)"""
+        counts = array('i', [0]) * (len(self.stop_ids) + 1)
+        for stop in self.stops:
+            counts[stop + 1] += 1
+        for i in range(1, len(counts)):
+            counts[i] += counts[i - 1]
+
+        cursor = array('i', counts)
+        rows = array('i', [0]) * len(self.stops)
+        for row, stop in enumerate(self.stops):
+            rows[cursor[stop]] = row
+            cursor[stop] += 1
+
+        self._stop_offsets = counts
+        self._stop_rows = rows
+
+    def rows_for_stop(self, stop_id):
+        """Retourne les lignes desservant un arrêt"""
+        stop_index = self.stop_index.get(stop_id)
+        if stop_index is None:
+            return []
+        if self._stop_offsets is None or len(self._stop_offsets) <= stop_index + 1:
+            self.build_stop_rows()
+        start = self._stop_offsets[stop_index]
+        end = self._stop_offsets[stop_index + 1]
+        return self._stop_rows[start:end]
+
+    def trip_rows_equal(self, trip_index, other, other_trip_index):
+        """
+        Compare les lignes d'un trajet avec celles d'un trajet d'un autre
+        stockage (identifiants denses d'arrêts compatibles)
+        """
+        start, end = self.trip_range(trip_index)
+        other_start, other_end = other.trip_range(other_trip_index)
+        if end - start != other_end - other_start:
+            return False
+        return all(
+            getattr(self, name)[start:end] == getattr(other, name)[other_start:other_end]
+            for name in ('stops', 'arrivals', 'departures', 'sequences')
+        )
+
+    def apply_trip_changes(self, fresh, changed, removed):
+        """
+        Construit un nouveau stockage où certains trajets sont remplacés,
+        ajoutés ou retirés
+
+        Les trajets conservés gardent leur ordre relatif, les trajets
+        remplacés leur rang; les nouveaux trajets sont ajoutés à la fin.
+
+        Args:
+            fresh: stockage contenant les nouvelles lignes, dont les
+                   identifiants d'arrêts prolongent ceux de ce stockage
+            changed: trip_id dont les lignes sont reprises de fresh
+            removed: trip_id à retirer
+
+        Returns:
+            Tuple (stockage, kept) où kept[t] donne le nouveau rang de
+            l'ancien trajet t s'il est conservé à l'identique (-1 sinon)
+        """
+        store = StopTimesStore()
+        # Conserver la liste d'arrêts (et son identité) si aucun arrêt n'est apparu
+        source = self if len(fresh.stop_ids) == len(self.stop_ids) else fresh
+        store.stop_ids = source.stop_ids
+        store.stop_index = source.stop_index
+
+        kept = array('i', [-1]) * self.trip_count()
+        order = []
+        for trip_index, trip_id in enumerate(self.trip_ids):
+            if trip_id in removed:
+                continue
+            if trip_id in changed:
+                order.append((fresh, fresh.trip_index[trip_id]))
+            else:
+                kept[trip_index] = len(order)
+                order.append((self, trip_index))
+        for trip_index, trip_id in enumerate(fresh.trip_ids):
+            if trip_id in changed and trip_id not in self.trip_index:
+                order.append((fresh, trip_index))
+
+        offsets = array('i', [0])
+        for origin, trip_index in order:
+            start, end = origin.trip_range(trip_index)
+            store.trip_index[origin.trip_ids[trip_index]] = len(store.trip_ids)
+            store.trip_ids.append(origin.trip_ids[trip_index])
+            for name in ('stops', 'arrivals', 'departures', 'sequences'):
+                getattr(store, name).extend(getattr(origin, name)[start:end])
+            offsets.append(offsets[-1] + end - start)
+        store.trip_offsets = offsets
+        return store, kept
+
+    @classmethod
+    def from_dict_of_lists(cls, stop_times, stop_ids=None):
+        """Construit un stockage depuis la vue {trip_id: [ligne, ...]}"""
+        builder = StopTimesBuilder(stop_ids)
+        for trip_id, rows in stop_times.items():
+            for row in rows:
+                builder.add(
+                    trip_id,
+                    row.get('stop_id'),
+                    parse_gtfs_time(row.get('arrival_time')),
+                    parse_gtfs_time(row.get('departure_time')),
+                    int(row.get('stop_sequence') or 0)
+                )
+        return builder.build()
+
+
+class StopTimesBuilder:
+    """Accumule des lignes stop_times puis produit un StopTimesStore trié"""
+
+    def __init__(self, stop_ids=None):
+        self.store = StopTimesStore()
+        # Pré-interner les arrêts connus pour aligner les identifiants denses
+        # sur l'ordre de stops.txt
+        for stop_id in stop_ids or ():
+            self.store.intern_stop(stop_id)
+        self.trips = array('i')
+
+    def add(self, trip_id, stop_id, arrival, departure, sequence):
+        """Ajoute une ligne (horaires déjà convertis en secondes)"""
+        store = self.store
+        trip_index = store.trip_index.get(trip_id)
+        if trip_index is None:
+            trip_index = len(store.trip_ids)
+            store.trip_index[trip_id] = trip_index
+            store.trip_ids.append(trip_id)
+        self.trips.append(trip_index)
+        store.stops.append(store.intern_stop(stop_id))
+        store.arrivals.append(arrival)
+        store.departures.append(departure)
+        store.sequences.append(sequence)
+
+    def extend(self, trip_ids, stop_ids, arrivals, departures, sequences):
+        """Ajoute un lot de lignes en colonnes (résultat d'une analyse par plage)"""
+        store = self.store
+        trip_index = store.trip_index
+        stop_index = store.stop_index
+        for trip_id in trip_ids:
+            if trip_id not in trip_index:
+                trip_index[trip_id] = len(store.trip_ids)
+                store.trip_ids.append(trip_id)
+        for stop_id in stop_ids:
+            if stop_id not in stop_index:
+                store.intern_stop(stop_id)
+        self.trips.extend(map(trip_index.__getitem__, trip_ids))
+        store.stops.extend(map(stop_index.__getitem__, stop_ids))
+        store.arrivals.extend(arrivals)
+        store.departures.extend(departures)
+        store.sequences.extend(sequences)
+
+    def build(self):
+        """Regroupe les lignes par trajet, les trie par séquence et retourne le stockage"""
+        store = self.store
+        trips = self.trips
+        trip_count = len(store.trip_ids)
+
+        offsets = array('i', [0]) * (trip_count + 1)
+        for trip_index in trips:
+            offsets[trip_index + 1] += 1
+        for i in range(1, len(offsets)):
+            offsets[i] += offsets[i - 1]
+
+        # Les trajets sont internés dans l'ordre d'apparition: si le fichier
+        # est déjà groupé par trajet, la colonne est croissante et rien n'est à déplacer
+        grouped = all(trips[i] <= trips[i + 1] for i in range(len(trips) - 1))
+        if not grouped:
+            cursor = array('i', offsets)
+            order = array('i', [0]) * len(trips)
+            for row, trip_index in enumerate(trips):
+                order[cursor[trip_index]] = row
+                cursor[trip_index] += 1
+            self._permute(order)
+
+        # Trier chaque trajet par stop_sequence si nécessaire
+        sequences = store.sequences
+        for trip_index in range(trip_count):
+            start, end = offsets[trip_index], offsets[trip_index + 1]
+            if any(sequences[i] > sequences[i + 1] for i in range(start, end - 1)):
+                segment = sorted(range(start, end), key=sequences.__getitem__)
+                self._permute_segment(start, segment)
+
+        store.trip_offsets = offsets
+        self.trips = array('i')
+        return store
+
+    def _permute(self, order):
+        """Réordonne toutes les colonnes selon une permutation"""
+        store = self.store
+        for name in ('stops', 'arrivals', 'departures', 'sequences'):
+            column = getattr(store, name)
+            setattr(store, name, array('i', (column[row] for row in order)))
+
+    def _permute_segment(self, start, segment):
+        """Réordonne un segment de lignes selon une permutation"""
+        store = self.store
+        for name in ('stops', 'arrivals', 'departures', 'sequences'):
+            column = getattr(store, name)
+            values = [column[row] for row in segment]
+            column[start:start + len(values)] = array('i', values)
@@ -4,9 +4,23 @@ Gestionnaire de stockage - Gère la persistance des données GTFS et des cartes
 
 import os
 import json
+import pickle
+import hashlib
+import shutil
+import struct
+import zipfile
 from datetime import datetime
 
 
+# En-tête des snapshots binaires: signature + version du format
+SNAPSHOT_MAGIC = b'GTFSPYSNAP'
+SNAPSHOT_HEADER = struct.Struct('<10sI64s')
+
+# Champs des métadonnées d'un import désignant des fichiers ou répertoires
+# propres à l'import, supprimés lorsqu'un nouvel import le remplace
+IMPORT_FILE_FIELDS = ('extract_dir', 'lazy_tables_dir', 'snapshot_path', 'database_path', 'hub_labels_path')
+
+
 class StorageManager:
     """Gère le stockage persistant des données GTFS et des cartes"""
     
@@ -27,6 +41,8 @@ class StorageManager:
         
         self.gtfs_dir = os.path.join(self.base_dir, 'gtfs')
         self.maps_dir = os.path.join(self.base_dir, 'maps')
+        self.snapshots_dir = os.path.join(self.base_dir, 'snapshots')
+        self.databases_dir = os.path.join(self.base_dir, 'databases')
         self.metadata_file = os.path.join(self.base_dir, 'metadata.json')
         
         # Créer les répertoires si nécessaire
@@ -39,6 +55,8 @@ class StorageManager:
         """Crée les répertoires de stockage s'ils n'existent pas"""
         os.makedirs(self.gtfs_dir, exist_ok=True)
         os.makedirs(self.maps_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        os.makedirs(self.databases_dir, exist_ok=True)
     
     def get_gtfs_dir(self):
         """Retourne le répertoire de stockage GTFS"""
@@ -72,22 +90,170 @@ class StorageManager:
             print(f"Erreur lors de la sauvegarde des métadonnées: {e}")
             return False
     
-    def save_gtfs_metadata(self, filename, extract_dir, import_date):
-        """Enregistre les métadonnées d'un import GTFS"""
+    def save_gtfs_metadata(self, filename, extract_dir, import_date, source_path=None, **details):
+        """
+        Enregistre les métadonnées d'un import GTFS
+        
+        extract_dir vaut None lorsque le ZIP a été lu en flux sans extraction;
+        source_path conserve alors le chemin du ZIP d'origine. Les informations
+        complémentaires (empreinte du ZIP, snapshot...) sont passées dans details.
+        
+        Le nouvel import devient le seul import actif: les imports précédents
+        sont retirés des métadonnées, puis leurs fichiers (répertoire extrait,
+        snapshot, base SQLite, étiquettes de hubs) que le nouvel import ne
+        réutilise pas sont supprimés.
+        """
         gtfs_info = {
             'filename': filename,
             'extract_dir': extract_dir,
+            'source_path': source_path,
             'import_date': import_date.isoformat(),
             'status': 'active'
         }
+        gtfs_info.update(details)
         
-        self.metadata['gtfs_imports'].append(gtfs_info)
-        return self.save_metadata()
+        superseded = self.metadata['gtfs_imports']
+        self.metadata['gtfs_imports'] = [gtfs_info]
+        if not self.save_metadata():
+            return False
+        self.remove_import_files(superseded, gtfs_info)
+        return True
+    
+    def remove_import_files(self, imports, current):
+        """Supprime les fichiers d'imports remplacés non référencés par l'import courant"""
+        kept = {current.get(field) for field in IMPORT_FILE_FIELDS}
+        for gtfs_info in imports:
+            for field in IMPORT_FILE_FIELDS:
+                path = gtfs_info.get(field)
+                # Seuls les fichiers créés dans le stockage de l'application sont supprimés
+                if not path or path in kept or \
+                        os.path.commonpath([os.path.abspath(path), os.path.abspath(self.base_dir)]) != \
+                        os.path.abspath(self.base_dir):
+                    continue
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    elif os.path.exists(path):
+                        os.remove(path)
+                except OSError as e:
+                    print(f"Erreur lors de la suppression de {path}: {e}")
     
     def get_gtfs_imports(self):
         """Retourne la liste des imports GTFS"""
         return self.metadata.get('gtfs_imports', [])
     
+    def get_active_gtfs_import(self):
+        """Retourne le dernier import GTFS actif (ou None)"""
+        for gtfs_info in reversed(self.get_gtfs_imports()):
+            if gtfs_info.get('status') == 'active':
+                return gtfs_info
+        return None
+    
+    def compute_file_hash(self, file_path):
+        """Calcule l'empreinte SHA-256 d'un fichier, lu par blocs"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def compute_member_hashes(self, zip_path):
+        """
+        Empreintes des fichiers d'un ZIP GTFS, sans décompression
+        
+        L'empreinte d'un fichier combine le CRC-32 et la taille enregistrés
+        dans le répertoire central du ZIP. Comme au chargement, chaque nom
+        désigne le membre le moins profond de l'archive.
+        
+        Returns:
+            dict {nom de fichier: empreinte}
+        """
+        hashes = {}
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for info in sorted(zip_ref.infolist(), key=lambda i: i.filename.count('/')):
+                if not info.is_dir():
+                    hashes.setdefault(os.path.basename(info.filename), f"{info.CRC:08x}-{info.file_size}")
+        return hashes
+    
+    def get_member_hashes(self):
+        """Retourne les empreintes des fichiers du dernier import actif ({} si inconnues)"""
+        gtfs_info = self.get_active_gtfs_import()
+        return (gtfs_info or {}).get('member_hashes') or {}
+    
+    def get_file_fingerprint(self, file_path):
+        """Retourne (taille, date de modification) d'un fichier, ou None s'il n'existe pas"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+    
+    def get_snapshot_path(self, source_hash):
+        """Retourne le chemin du snapshot associé à l'empreinte d'un ZIP"""
+        return os.path.join(self.snapshots_dir, f"{source_hash}.snap")
+    
+    def get_database_path(self, source_hash):
+        """Retourne le chemin de la base SQLite associée à l'empreinte d'un ZIP"""
+        return os.path.join(self.databases_dir, f"{source_hash}.sqlite")
+    
+    def get_hub_labels_path(self, source_hash):
+        """Retourne le chemin des étiquettes de hubs associées à l'empreinte d'un ZIP"""
+        return os.path.join(self.snapshots_dir, f"{source_hash}.hubs")
+    
+    def save_snapshot(self, source_hash, version, state, path=None):
+        """
+        Écrit un snapshot binaire du réseau chargé
+        
+        Le fichier commence par un en-tête (signature, version du format,
+        empreinte du ZIP source) suivi de l'état sérialisé avec pickle.
+        L'écriture passe par un fichier temporaire pour rester atomique.
+        
+        Args:
+            path: Chemin du fichier (par défaut get_snapshot_path), pour les
+                  prétraitements persistés dans le même format
+        
+        Returns:
+            Chemin du snapshot ou None en cas d'erreur
+        """
+        snapshot_path = path or self.get_snapshot_path(source_hash)
+        tmp_path = snapshot_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, source_hash.encode('ascii')))
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, snapshot_path)
+            return snapshot_path
+        except Exception as e:
+            print(f"Erreur lors de l'écriture du snapshot: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+    
+    def load_snapshot(self, snapshot_path, source_hash, version):
+        """
+        Charge un snapshot binaire en un seul bloc
+        
+        Returns:
+            L'état sérialisé, ou None si le snapshot est absent, corrompu,
+            d'une autre version de format ou d'un autre ZIP source
+        """
+        if not snapshot_path or not os.path.exists(snapshot_path):
+            return None
+        try:
+            with open(snapshot_path, 'rb') as f:
+                header = f.read(SNAPSHOT_HEADER.size)
+                if len(header) != SNAPSHOT_HEADER.size:
+                    return None
+                magic, snapshot_version, snapshot_hash = SNAPSHOT_HEADER.unpack(header)
+                if magic != SNAPSHOT_MAGIC or snapshot_version != version:
+                    return None
+                if snapshot_hash.decode('ascii') != source_hash:
+                    return None
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Erreur lors du chargement du snapshot: {e}")
+            return None
+    
     def download_map_data(self, lat, lon, zoom):
         """
         Télécharge les données de carte pour une zone donnée
@@ -5,6 +5,7 @@ sans dépendances Kivy
 """
 
 import os
+import shutil
 import sys
 import tempfile
 import zipfile
@@ -161,6 +162,1313 @@ def test_storage_manager():
         print("  ✓ Sauvegarde/chargement métadonnées fonctionne")
 
 
+def write_sample_feed(directory):
+    """Écrit un petit réseau GTFS (2 lignes, correspondance à S2) dans un répertoire"""
+    tables = {
+        'stops.txt': [
+            ['stop_id', 'stop_name', 'stop_lat', 'stop_lon'],
+            ['S1', 'Station A', '48.8566', '2.3522'],
+            ['S2', 'Station B', '48.8606', '2.3376'],
+            ['S3', 'Station C', '48.8529', '2.3499'],
+            ['S4', 'Station D', '48.8650', '2.3300']
+        ],
+        'routes.txt': [
+            ['route_id', 'route_short_name', 'route_long_name', 'route_type'],
+            ['R1', '1', 'Ligne 1', '1'],
+            ['R2', '2', 'Ligne 2', '1']
+        ],
+        'trips.txt': [
+            ['trip_id', 'route_id', 'service_id'],
+            ['T1', 'R1', 'WD'],
+            ['T2', 'R2', 'WD']
+        ],
+        # Lignes volontairement désordonnées pour tester le regroupement
+        'stop_times.txt': [
+            ['trip_id', 'stop_id', 'arrival_time', 'departure_time', 'stop_sequence'],
+            ['T1', 'S2', '08:10:00', '08:10:00', '2'],
+            ['T2', 'S2', '08:15:00', '08:15:00', '1'],
+            ['T1', 'S1', '08:00:00', '08:00:00', '1'],
+            ['T2', 'S4', '08:25:00', '08:25:00', '2'],
+            ['T1', 'S3', '08:20:00', '08:20:00', '3']
+        ]
+    }
+    for name, rows in tables.items():
+        with open(os.path.join(directory, name), 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+
+
+def test_stop_times_store():
+    """Test du stockage colonnaire des stop_times"""
+    print("\nTest du StopTimesStore...")
+    
+    from gtfs_manager import GTFSManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_sample_feed(tmpdir)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_data(tmpdir)
+        
+        store = manager.stop_times_store
+        assert len(store) == 5
+        assert store.trip_ids == ['T1', 'T2']
+        start, end = store.trip_range(store.trip_index['T1'])
+        assert [store.stop_ids[s] for s in store.stops[start:end]] == ['S1', 'S2', 'S3']
+        assert store.departures[start] == 8 * 3600
+        print("  ✓ Lignes regroupées par trajet et triées par séquence")
+        
+        # La vue dictionnaire n'est construite qu'à la demande
+        assert manager._stop_times_view is None
+        assert manager.stop_times['T1'][1]['stop_id'] == 'S2'
+        assert manager.stop_times['T1'][1]['arrival_time'] == '08:10:00'
+        print("  ✓ Vue {trip_id: [ligne, ...]} construite à la demande")
+        
+        trips = manager.get_trips_for_stop('S2')
+        assert [t['trip_id'] for t in trips] == ['T1', 'T2']
+        assert manager.stop_to_trips_index['S1'][0]['next_stop_id'] == 'S2'
+        print("  ✓ Index arrêt -> trajets lu depuis le stockage")
+
+
+def test_fast_csv():
+    """Test du lecteur CSV rapide (colonnes résolues par l'en-tête, valeurs typées)"""
+    print("\nTest du lecteur CSV rapide...")
+    
+    import io
+    from fast_csv import STOP_TIMES_COLUMNS, parse_stop_times_rows, read_columns, read_dict, read_shapes
+    
+    trips = read_dict(io.StringIO(
+        'route_id,trip_id,service_id,trip_headsign\r\nR1,T1,WD,Nord\r\n\r\nR2,T2\r\n'
+    ), 'trip_id', ('trip_id', 'route_id', 'service_id'))
+    assert trips == {
+        'T1': {'trip_id': 'T1', 'route_id': 'R1', 'service_id': 'WD'},
+        'T2': {'trip_id': 'T2', 'route_id': 'R2', 'service_id': ''}
+    }
+    print("  ✓ Colonnes filtrées, lignes vides et courtes tolérées")
+    
+    stop_times = io.StringIO(
+        'stop_sequence,trip_id,stop_id,departure_time,arrival_time\n'
+        '1,T1,S1,08:00:30,08:00:00\n2,T1,S2,,25:10:00\n1,T2,S2,08:15:00,08:15:00\n'
+    )
+    batches = list(parse_stop_times_rows(read_columns(stop_times, STOP_TIMES_COLUMNS), batch_size=2))
+    assert [batch[0] for batch in batches] == [['T1', 'T1'], ['T2']]
+    assert list(batches[0][2]) == [8 * 3600, 25 * 3600 + 600]
+    assert list(batches[0][3]) == [8 * 3600 + 30, -1]
+    assert list(batches[0][4]) == [1, 2]
+    print("  ✓ Horaires convertis en secondes, par lots")
+    
+    shapes = read_shapes(io.StringIO(
+        'shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\nA,48.1,2.1,2\nA,48.0,2.0,1\nA,,,3\n'
+    ))
+    lats, lons = shapes['A']
+    assert lats.typecode == 'f' and len(lats) == 2
+    assert abs(lats[0] - 48.0) < 1e-5 and abs(lats[1] - 48.1) < 1e-5 and abs(lons[1] - 2.1) < 1e-5
+    print("  ✓ Formes en tableaux de flottants triés par séquence")
+
+
+def test_shape_store():
+    """Test du stockage compact et de la simplification des tracés"""
+    print("\nTest des tracés...")
+    
+    from gtfs_manager import GTFSManager
+    from shape_store import ShapeStore, douglas_peucker
+    
+    # Zigzag de faible amplitude (~1 m) le long d'un axe est-ouest
+    lats = [48.85 + (0.00001 if i % 2 else 0.0) for i in range(101)]
+    lons = [2.30 + i * 0.0001 for i in range(101)]
+    assert douglas_peucker(lats, lons, 100.0) == [0, 100]
+    assert douglas_peucker(lats, lons, 0.1) == list(range(101))
+    print("  ✓ Douglas-Peucker conserve les extrémités et respecte la tolérance")
+    
+    shapes = ShapeStore({'Z': (lats, lons), 'L': ([48.0, 48.1, 48.2], [2.0, 2.0, 2.1])})
+    assert len(shapes) == 2 and 'Z' in shapes
+    assert len(shapes.polyline('Z')) == 101
+    assert len(shapes.polyline('Z', zoom=10)) == 2 and len(shapes.polyline('Z', zoom=18)) == 101
+    assert shapes.point_count(zoom=10) < shapes.point_count()
+    print("  ✓ Niveaux simplifiés par zoom")
+    
+    segment = shapes.slice_between('Z', 48.85, 2.3010, 48.85, 2.3050)
+    assert len(segment) == 41
+    assert abs(segment[0][1] - 2.3010) < 1e-5 and abs(segment[-1][1] - 2.3050) < 1e-5
+    coarse = shapes.slice_between('Z', 48.85, 2.3010, 48.85, 2.3050, zoom=10)
+    assert coarse == [segment[0], segment[-1]]
+    assert shapes.slice_between('X', 48.85, 2.30, 48.85, 2.31) == []
+    print("  ✓ Portion de tracé entre deux positions")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_sample_feed(tmpdir)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_data(tmpdir)
+        # Sans shapes.txt: polyligne des arrêts desservis
+        assert len(manager.get_trip_shape('T1', 'S1', 'S3')) == 3
+        assert manager.get_trip_shape('T1', 'S3', 'S1') == []
+        
+        manager.shapes = ShapeStore({'SH1': ([48.8566, 48.8590, 48.8606], [2.3522, 2.3450, 2.3376])})
+        manager.trips['T1']['shape_id'] = 'SH1'
+        assert len(manager.get_trip_shape('T1', 'S1', 'S2')) == 3
+    print("  ✓ Tracé d'un trajet entre deux arrêts")
+
+
+def test_lazy_tables():
+    """Test du chargement paresseux des tables et de l'index des positions"""
+    print("\nTest des tables paresseuses...")
+    
+    import pickle
+    from datetime import date
+    from feed_database import FeedDatabase
+    from gtfs_manager import GTFSManager
+    from fast_csv import read_columns
+    from lazy_tables import LazyShapeStore, TableManifest
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_sample_feed(tmpdir)
+        with open(os.path.join(tmpdir, 'calendar.txt'), 'w', newline='') as f:
+            csv.writer(f).writerows([
+                ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                 'saturday', 'sunday', 'start_date', 'end_date'],
+                ['WD', '1', '1', '1', '1', '1', '0', '0', '20240101', '20241231']
+            ])
+        with open(os.path.join(tmpdir, 'shapes.txt'), 'w', newline='') as f:
+            # SH1 non contiguë, champ entre guillemets dans SH2
+            f.write(
+                'shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\r\n'
+                'SH1,48.8566,2.3522,1\r\nSH1,48.8590,2.3450,2\r\nSH2,48.8606,2.3376,1\r\n'
+                'SH1,48.8606,2.3376,3\r\n"SH2","48.8650",2.3300,2\r\n'
+            )
+        
+        # Index des positions: lignes d'une entité relues sans le reste du fichier
+        manifest = TableManifest(os.path.join(tmpdir, 'stop_times.txt'), 'trip_id')
+        assert sorted(manifest.keys()) == ['T1', 'T2'] and len(manifest.ranges['T1']) == 3
+        rows = list(read_columns(manifest.open_entity('T1'), ('trip_id', 'stop_sequence')))
+        assert rows == [('T1', '2'), ('T1', '1'), ('T1', '3')]
+        print("  ✓ Plages d'octets par clé, lignes d'une entité relues")
+        
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_data(tmpdir)
+        assert {'calendar', 'service_calendar'} <= set(manager.lazy_loaders)
+        assert isinstance(manager.shapes, LazyShapeStore) and manager.shapes.manifest.ranges is None
+        print("  ✓ Calendrier et tracés non chargés après l'import")
+        
+        # La version du cache d'itinéraires ne force pas le chargement du calendrier
+        assert RoutingEngine(manager).find_route((0.0, 0.0), (0.0, 0.1), algorithm='raptor') is None
+        assert {'calendar', 'service_calendar'} <= set(manager.lazy_loaders)
+        
+        # Le snapshot conserve les fichiers en attente au lieu de les charger
+        restored = GTFSManager(storage_manager=None)
+        restored.restore_snapshot_state(pickle.loads(pickle.dumps(manager.get_snapshot_state())))
+        assert {'calendar', 'service_calendar'} <= set(manager.lazy_loaders)
+        assert {'calendar', 'service_calendar'} <= set(restored.lazy_loaders)
+        restored.attach_database(FeedDatabase(os.path.join(tmpdir, 'feed.db')))
+        assert restored.shapes.manifest.ranges is None
+        assert restored.get_active_trips(date(2024, 1, 8)) == bytearray([1, 1])
+        print("  ✓ Tables paresseuses restaurées depuis le snapshot sans être lues")
+        
+        manager.trips['T1']['shape_id'] = 'SH1'
+        assert len(manager.get_trip_shape('T1', 'S1', 'S2')) == 3
+        assert manager.shapes.loaded_count() == 1 and len(manager.shapes) == 2
+        lats, _ = manager.shapes['SH2']
+        assert len(lats) == 2 and abs(lats[1] - 48.865) < 1e-5
+        print("  ✓ Formes chargées une à une à la demande")
+        
+        assert manager.get_active_trips(date(2024, 1, 8)) == bytearray([1, 1])
+        assert manager.calendar['WD']['monday'] == '1' and not manager.lazy_loaders
+        print("  ✓ Calendrier chargé au premier accès")
+
+
+def make_storage(directory):
+    """Crée un StorageManager isolé dans un répertoire temporaire"""
+    from storage_manager import StorageManager
+    
+    previous = os.environ.get('ANDROID_STORAGE')
+    os.environ['ANDROID_STORAGE'] = directory
+    try:
+        return StorageManager()
+    finally:
+        if previous is None:
+            del os.environ['ANDROID_STORAGE']
+        else:
+            os.environ['ANDROID_STORAGE'] = previous
+
+
+def write_sample_zip(directory):
+    """Écrit le réseau d'exemple dans un ZIP (sous-répertoire feed/) et retourne son chemin"""
+    feed_dir = os.path.join(directory, 'feed')
+    os.makedirs(feed_dir, exist_ok=True)
+    write_sample_feed(feed_dir)
+    zip_path = os.path.join(directory, 'sample.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(os.listdir(feed_dir)):
+            zf.write(os.path.join(feed_dir, name), 'feed/' + name)
+    return zip_path
+
+
+def test_streaming_import():
+    """Test de l'import GTFS en flux, sans extraction du ZIP"""
+    print("\nTest de l'import en flux...")
+    
+    from gtfs_manager import GTFSManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = write_sample_zip(tmpdir)
+        storage = make_storage(os.path.join(tmpdir, 'storage'))
+        manager = GTFSManager(storage)
+        
+        assert manager.import_gtfs(zip_path, extract=False)
+        assert os.listdir(storage.get_gtfs_dir()) == []
+        assert len(manager.stops) == 4
+        assert manager.stop_times_store.trip_ids == ['T1', 'T2']
+        print("  ✓ Fichiers lus directement dans le ZIP")
+        
+        entry = storage.get_gtfs_imports()[-1]
+        assert entry['extract_dir'] is None
+        assert entry['source_path'] == zip_path
+        print("  ✓ Métadonnées sans répertoire d'extraction")
+
+
+def test_parallel_load():
+    """Test du chargement parallèle (plages de stop_times.txt analysées en processus)"""
+    print("\nTest du chargement parallèle...")
+    
+    from gtfs_manager import GTFSManager
+    from parallel_loader import read_header, split_line_ranges
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_sample_feed(tmpdir)
+        path = os.path.join(tmpdir, 'stop_times.txt')
+        columns, data_start = read_header(path)
+        assert columns[:2] == ['trip_id', 'stop_id']
+        ranges = split_line_ranges(path, data_start, 3)
+        with open(path, 'rb') as f:
+            data = f.read()
+        assert ranges[0][0] == data_start and ranges[-1][1] == len(data)
+        assert all(data[start - 1:start] == b'\n' for start, _ in ranges)
+        assert b''.join(data[start:end] for start, end in ranges) == data[data_start:]
+        print("  ✓ Plages d'octets alignées sur les fins de ligne")
+        
+        sequential = GTFSManager(storage_manager=None)
+        sequential.load_gtfs_data(tmpdir)
+        parallel = GTFSManager(storage_manager=None)
+        parallel.load_gtfs_data(tmpdir, workers=3)
+        assert parallel.stops == sequential.stops and parallel.trips == sequential.trips
+        assert parallel.stop_times == sequential.stop_times
+        assert parallel.stop_times_store.stop_ids == sequential.stop_times_store.stop_ids
+        assert parallel.get_trip_patterns() is not None and parallel.stop_graph is not None
+        print("  ✓ Résultat identique au chargement séquentiel")
+
+
+def test_background_tasks():
+    """Test des tâches en arrière-plan (import avec progression, annulation, regroupement)"""
+    print("\nTest des tâches en arrière-plan...")
+    
+    import threading
+    from background_tasks import BackgroundWorker, TaskCancelled
+    from gtfs_manager import GTFSManager
+    
+    worker = BackgroundWorker()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            zip_path = write_sample_zip(tmpdir)
+            manager = GTFSManager(make_storage(os.path.join(tmpdir, 'storage')))
+            steps, results = [], []
+            task = worker.submit(
+                lambda zip_path, task: manager.import_gtfs(zip_path, extract=False, progress=task.report),
+                zip_path,
+                on_done=results.append,
+                on_progress=lambda fraction, message: steps.append(fraction)
+            )
+            task.future.result()
+            assert results == [True] and len(manager.stops) == 4
+            assert steps == sorted(steps) and steps[-1] == 1.0
+            print("  ✓ Import en arrière-plan avec progression")
+            
+            def cancel_midway(fraction, message):
+                if fraction >= 0.5:
+                    raise TaskCancelled()
+            scratch = GTFSManager(make_storage(os.path.join(tmpdir, 'storage')))
+            try:
+                scratch.import_gtfs(zip_path, extract=False, progress=cancel_midway)
+                assert False, "TaskCancelled doit traverser import_gtfs"
+            except TaskCancelled:
+                pass
+            assert scratch.progress is None
+            print("  ✓ Annulation d'un import via le rappel de progression")
+            
+            # Annulation pendant une extraction ou au dernier point de contrôle:
+            # répertoire extrait supprimé, import actif inchangé
+            storage = scratch.storage_manager
+            active = storage.get_active_gtfs_import()
+            extract_dir = os.path.join(storage.get_gtfs_dir(), 'sample')
+            for threshold in (0.5, 1.0):
+                def cancel_at(fraction, message):
+                    if fraction >= threshold:
+                        raise TaskCancelled()
+                try:
+                    GTFSManager(storage).import_gtfs(zip_path, extract=True, progress=cancel_at)
+                    assert False, "TaskCancelled doit traverser import_gtfs"
+                except TaskCancelled:
+                    pass
+                assert not os.path.exists(extract_dir)
+                assert storage.get_active_gtfs_import() == active
+            print("  ✓ Import annulé: rien d'enregistré, extraction supprimée")
+        
+        # Regroupement: le thread est occupé, deux calculs de même clé sont soumis
+        gate = threading.Event()
+        blocker = worker.submit(lambda task: gate.wait())
+        delivered, calls = [], []
+        first = worker.submit(lambda task: calls.append('A') or 'A', key='route', on_done=delivered.append)
+        second = worker.submit(lambda task: calls.append('B') or 'B', key='route', on_done=delivered.append)
+        assert first.cancelled and worker.is_busy('route')
+        gate.set()
+        blocker.future.result()
+        second.future.result()
+        assert calls == ['B'] and delivered == ['B']
+        assert not worker.is_busy('route')
+        print("  ✓ Requêtes répétées regroupées (seule la dernière est calculée)")
+        
+        errors = []
+        worker.submit(lambda task: 1 / 0, on_error=errors.append).future.result()
+        assert isinstance(errors[0], ZeroDivisionError)
+        print("  ✓ Erreurs renvoyées au rappel on_error")
+    finally:
+        worker.shutdown(wait=True)
+
+
+def test_snapshot_warm_start():
+    """Test du snapshot binaire et de son invalidation"""
+    print("\nTest du snapshot binaire...")
+    
+    from gtfs_manager import GTFSManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = write_sample_zip(tmpdir)
+        storage = make_storage(os.path.join(tmpdir, 'storage'))
+        assert GTFSManager(storage).import_gtfs(zip_path, extract=False)
+        
+        entry = storage.get_active_gtfs_import()
+        assert os.path.exists(entry['snapshot_path'])
+        
+        # Démarrage à chaud: aucune lecture du ZIP
+        manager = GTFSManager(storage)
+        manager.load_gtfs_zip = None
+        assert manager.load_last_import()
+        assert len(manager.stops) == 4
+        assert manager.get_trips_for_stop('S2')[0]['trip_id'] == 'T1'
+        print("  ✓ Réseau restauré depuis le snapshot")
+        
+        # Modifier le ZIP invalide le snapshot
+        with zipfile.ZipFile(zip_path, 'a') as zf:
+            zf.writestr('feed/agency.txt', 'agency_id,agency_name\nA1,Agence')
+        manager = GTFSManager(storage)
+        assert manager.load_last_import()
+        new_entry = storage.get_active_gtfs_import()
+        assert new_entry['source_hash'] != entry['source_hash']
+        assert new_entry['snapshot_path'] != entry['snapshot_path']
+        print("  ✓ Snapshot invalidé quand le ZIP change")
+        
+        assert not os.path.exists(entry['snapshot_path']) and storage.get_gtfs_imports() == [new_entry]
+        
+        # Import extrait puis mise à jour: le répertoire extrait, encore lu par
+        # les tables paresseuses, est conservé jusqu'au prochain import complet
+        flat_dir = os.path.join(tmpdir, 'flat')
+        os.makedirs(flat_dir)
+        write_sample_feed(flat_dir)
+        zip_path = os.path.join(tmpdir, 'flat.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for name in os.listdir(flat_dir):
+                zf.write(os.path.join(flat_dir, name), name)
+        manager = GTFSManager(storage)
+        assert manager.import_gtfs(zip_path, extract=True, database=True)
+        extracted = storage.get_active_gtfs_import()
+        assert not os.path.exists(new_entry['snapshot_path'])
+        assert os.path.exists(extracted['snapshot_path'])
+        updated_zip = os.path.join(tmpdir, 'updated.zip')
+        shutil.copy(zip_path, updated_zip)
+        with zipfile.ZipFile(updated_zip, 'a') as zf:
+            zf.writestr('feed_info.txt', 'feed_publisher_name,feed_lang\nGTFSPy,fr')
+        assert manager.update_gtfs(updated_zip)
+        updated = storage.get_active_gtfs_import()
+        assert updated['lazy_tables_dir'] == extracted['extract_dir'] and os.path.isdir(extracted['extract_dir'])
+        assert not os.path.exists(extracted['snapshot_path']) and not os.path.exists(extracted['database_path'])
+        assert os.path.exists(updated['database_path']) and len(storage.get_gtfs_imports()) == 1
+        
+        assert GTFSManager(storage).import_gtfs(updated_zip, extract=False)
+        assert not os.path.isdir(extracted['extract_dir']) and not os.path.exists(updated['database_path'])
+        assert os.path.exists(zip_path) and os.path.exists(updated_zip)
+        print("  ✓ Fichiers des imports remplacés supprimés")
+
+
+def test_incremental_update():
+    """Test de la mise à jour incrémentale d'un réseau importé"""
+    print("\nTest de la mise à jour incrémentale...")
+    
+    from datetime import datetime
+    from gtfs_manager import GTFSManager
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = write_sample_zip(tmpdir)
+        storage = make_storage(os.path.join(tmpdir, 'storage'))
+        manager = GTFSManager(storage)
+        assert manager.import_gtfs(zip_path, extract=False)
+        assert storage.get_member_hashes()['stop_times.txt']
+        t1_timetable = manager.get_trip_patterns().pattern_arrivals[0]
+        
+        # Nouvelle version: T2 retardé, T3 ajouté, autres fichiers inchangés
+        feed_dir = os.path.join(tmpdir, 'feed')
+        with open(os.path.join(feed_dir, 'trips.txt'), 'a', newline='') as f:
+            csv.writer(f).writerow(['T3', 'R2', 'WD'])
+        with open(os.path.join(feed_dir, 'stop_times.txt'), 'a', newline='') as f:
+            csv.writer(f).writerows([
+                ['T3', 'S2', '08:40:00', '08:40:00', '1'],
+                ['T3', 'S4', '08:50:00', '08:50:00', '2']
+            ])
+        with open(os.path.join(feed_dir, 'stop_times.txt')) as f:
+            content = f.read().replace('08:25:00', '08:28:00')
+        with open(os.path.join(feed_dir, 'stop_times.txt'), 'w') as f:
+            f.write(content)
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name in sorted(os.listdir(feed_dir)):
+                zf.write(os.path.join(feed_dir, name), 'feed/' + name)
+        
+        reloaded = []
+        load_csv_to_dict = manager.load_csv_to_dict
+        manager.load_csv_to_dict = lambda source, key, fields=None: \
+            reloaded.append(key) or load_csv_to_dict(source, key, fields)
+        assert manager.update_gtfs(zip_path)
+        assert reloaded == ['trip_id']
+        print("  ✓ Seuls les fichiers modifiés sont relus")
+        
+        full = GTFSManager(make_storage(os.path.join(tmpdir, 'full')))
+        assert full.import_gtfs(zip_path, extract=False)
+        assert manager.stop_times == full.stop_times
+        assert manager.get_trip_patterns().pattern_arrivals[0] is t1_timetable
+        assert len(manager.get_trip_patterns()) == 2
+        print("  ✓ Trajets inchangés conservés, modifiés et ajoutés remplacés")
+        
+        day = datetime(2024, 1, 8, 8, 20)
+        for engine in (RoutingEngine(manager), RoutingEngine(full)):
+            journey = engine.raptor_search('S2', 'S4', day)
+            assert [leg['trip_id'] for leg in journey['legs']] == ['T3']
+            assert journey['arrival_time'] == 8 * 3600 + 50 * 60
+        assert RoutingEngine(manager).raptor_search('S1', 'S4', datetime(2024, 1, 8, 7, 50))['arrival_time'] == \
+            8 * 3600 + 28 * 60
+        assert storage.get_member_hashes() == storage.compute_member_hashes(zip_path)
+        print("  ✓ Itinéraires identiques à un import complet")
+
+
+def test_feed_database():
+    """Test de la base SQLite du réseau"""
+    print("\nTest de la base SQLite...")
+    
+    import pickle
+    from feed_database import FeedDatabase
+    from gtfs_manager import GTFSManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = write_sample_zip(tmpdir)
+        with zipfile.ZipFile(zip_path, 'a') as zf:
+            zf.writestr('feed/shapes.txt', 'shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n'
+                                           'SH1,48.8590,2.3450,2\nSH1,48.8566,2.3522,1\n')
+        storage = make_storage(os.path.join(tmpdir, 'storage'))
+        assert GTFSManager(storage).import_gtfs(zip_path, extract=False, database=True)
+        
+        database_path = storage.get_active_gtfs_import()['database_path']
+        database = FeedDatabase(database_path)
+        assert database.count('stops') == 4 and database.count('stop_times') == 5
+        assert database.connection() is database.connection()
+        assert pickle.loads(pickle.dumps(database)).get_stop('S1')['stop_name'] == 'Station A'
+        print("  ✓ Tables chargées en une transaction, base partageable")
+        
+        # Processus sans réseau en mémoire: requêtes servies par la base
+        manager = GTFSManager(storage)
+        manager.attach_database(database)
+        assert manager.get_stop('S3')['stop_name'] == 'Station C'
+        assert manager.get_trips_for_stop('S2') == [
+            {'trip_id': 'T1', 'arrival_time': '08:10:00', 'departure_time': '08:10:00'},
+            {'trip_id': 'T2', 'arrival_time': '08:15:00', 'departure_time': '08:15:00'}
+        ]
+        assert len(manager.get_trip_shape('T1', 'S1', 'S3')) == 3
+        lats, _ = manager.shapes['SH1']
+        assert len(lats) == 2 and abs(lats[0] - 48.8566) < 1e-5 and 'SH2' not in manager.shapes
+        print("  ✓ Arrêts, passages et tracés lus dans la base")
+        
+        manager = GTFSManager(storage)
+        assert manager.load_last_import() and manager.database.path == database_path
+        print("  ✓ Base rattachée au démarrage à chaud")
+        
+        # Nouvelle version sans T2, avec T4 (dernier du fichier, premier à passer à S2):
+        # la base est reconstruite avec le réseau
+        feed_dir = os.path.join(tmpdir, 'feed')
+        extra = {'trips.txt': 'T4,R2,WD\n', 'stop_times.txt': 'T4,S2,07:00:00,07:00:00,1\nT4,S4,07:10:00,07:10:00,2\n'}
+        for name in ('trips.txt', 'stop_times.txt'):
+            with open(os.path.join(feed_dir, name)) as f:
+                lines = [line for line in f if not line.startswith('T2,')]
+            with open(os.path.join(feed_dir, name), 'w') as f:
+                f.writelines(lines + [extra[name]])
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for name in sorted(os.listdir(feed_dir)):
+                zf.write(os.path.join(feed_dir, name), 'feed/' + name)
+        assert manager.get_trip('T2') is not None
+        assert manager.update_gtfs(zip_path)
+        assert manager.get_trip('T2') is None and manager.get_trip_stop_ids('T2') == []
+        new_path = storage.get_active_gtfs_import()['database_path']
+        assert new_path != database_path and manager.database.path == new_path
+        assert FeedDatabase(new_path).get_trip('T2') is None
+        print("  ✓ Base reconstruite à la mise à jour du réseau")
+        
+        # Démarrage à chaud sur la seule base: passages dans l'ordre du stockage en mémoire
+        served = GTFSManager(storage)
+        assert served.load_last_import(database_only=True)
+        assert not served.stops and not served.stop_times_store.trip_ids
+        assert [trip['trip_id'] for trip in served.get_trips_for_stop('S2')] == ['T1', 'T4']
+        for stop_id in manager.stops:
+            assert served.get_trips_for_stop(stop_id) == manager.get_trips_for_stop(stop_id)
+        assert served.get_trip_stop_ids('T4') == ['S2', 'S4'] and served.get_stop('S4')['stop_name'] == 'Station D'
+        assert len(served.shapes) == 0 and served.shapes.count == 0
+        for radius in (100, 1500, 3000):
+            expected = manager.find_stops_within(48.8580, 2.3450, radius)
+            found = served.find_stops_within(48.8580, 2.3450, radius)
+            assert [stop['stop_id'] for stop, _ in found] == [stop['stop_id'] for stop, _ in expected]
+            assert all(abs(a[1] - b[1]) < 1e-6 for a, b in zip(found, expected))
+        assert served.find_nearest_stop(48.8651, 2.3301)[0]['stop_id'] == 'S4'
+        assert served.find_nearest_stop(0.0, 0.0) == (None, float('inf'))
+        assert [stop['stop_id'] for stop, _ in served.find_nearest_stops(48.8566, 2.3522, 2, 5000)] == ['S1', 'S3']
+        print("  ✓ Base seule rattachée, sans snapshot; arrêts proches lus dans la base")
+
+
+def test_spatial_index():
+    """Test de l'index spatial des arrêts contre une recherche linéaire"""
+    print("\nTest de l'index spatial...")
+    
+    import random
+    from geo import haversine
+    from spatial_index import StopSpatialIndex
+    
+    rng = random.Random(42)
+    stops = {
+        f'S{i}': {'stop_lat': str(48.8 + rng.random() * 0.2), 'stop_lon': str(2.2 + rng.random() * 0.3)}
+        for i in range(2000)
+    }
+    stops['BAD'] = {'stop_lat': '', 'stop_lon': '2.3'}
+    index = StopSpatialIndex(stops, cell_size=300)
+    assert len(index) == 2000
+    
+    for _ in range(50):
+        lat, lon = 48.79 + rng.random() * 0.22, 2.19 + rng.random() * 0.32
+        expected = sorted(
+            (haversine(lat, lon, float(s['stop_lat']), float(s['stop_lon'])), stop_id)
+            for stop_id, s in stops.items() if stop_id != 'BAD'
+        )
+        assert index.nearest(lat, lon)[0] == expected[0][1]
+        assert [r[0] for r in index.k_nearest(lat, lon, 5)] == [e[1] for e in expected[:5]]
+        within = [e[1] for e in expected if e[0] <= 800]
+        assert [r[0] for r in index.within_radius(lat, lon, 800)] == within
+    print("  ✓ Plus proche, k plus proches et rayon identiques à la recherche linéaire")
+    
+    assert index.nearest(40.0, 2.3, max_distance=1000) == (None, float('inf'))
+    print("  ✓ Élagage par max_distance")
+
+
+def test_geo_kernels():
+    """Test des noyaux de distance par lot contre les formules scalaires"""
+    print("\nTest des noyaux de distance...")
+    
+    import random
+    from array import array
+    from geo import (haversine, equirectangular, haversine_one_to_many,
+                     haversine_many_to_many, equirectangular_one_to_many)
+    
+    rng = random.Random(7)
+    lats = array('d', (45.0 + rng.random() for _ in range(200)))
+    lons = array('d', (4.0 + rng.random() for _ in range(200)))
+    
+    distances = haversine_one_to_many(45.5, 4.5, lats, lons)
+    for i in range(len(lats)):
+        assert abs(distances[i] - haversine(45.5, 4.5, lats[i], lons[i])) < 1e-6
+    subset = haversine_one_to_many(45.5, 4.5, lats, lons, indices=[3, 17])
+    assert abs(subset[1] - distances[17]) < 1e-6
+    print("  ✓ Un-vers-plusieurs identique au calcul scalaire (avec et sans indices)")
+    
+    matrix = haversine_many_to_many(lats[:5], lons[:5], lats, lons)
+    assert abs(matrix[2][40] - haversine(lats[2], lons[2], lats[40], lons[40])) < 1e-6
+    print("  ✓ Matrice plusieurs-vers-plusieurs")
+    
+    approx = equirectangular_one_to_many(45.5, 4.5, lats, lons)
+    for i in range(len(lats)):
+        assert abs(approx[i] - equirectangular(45.5, 4.5, lats[i], lons[i])) < 1e-6
+        assert abs(approx[i] - distances[i]) < distances[i] * 1e-3 + 1e-6
+    print("  ✓ Approximation équirectangulaire proche de Haversine à courte distance")
+
+
+def load_sample_manager(directory):
+    """Charge le réseau d'exemple dans un GTFSManager"""
+    from gtfs_manager import GTFSManager
+    
+    write_sample_feed(directory)
+    manager = GTFSManager(storage_manager=None)
+    manager.load_gtfs_data(directory)
+    return manager
+
+
+def load_direct_line_manager(directory):
+    """
+    Charge le réseau d'exemple complété d'une ligne directe S1 -> S4 plus
+    lente mais sans correspondance (T3) et d'un second passage de la ligne
+    1 sans correspondance à S2 (T4)
+    """
+    from gtfs_manager import GTFSManager
+    
+    write_sample_feed(directory)
+    with open(os.path.join(directory, 'trips.txt'), 'a', newline='') as f:
+        csv.writer(f).writerows([['T3', 'R3', 'WD'], ['T4', 'R1', 'WD']])
+    with open(os.path.join(directory, 'stop_times.txt'), 'a', newline='') as f:
+        csv.writer(f).writerows([
+            ['T3', 'S1', '08:05:00', '08:05:00', '1'],
+            ['T3', 'S4', '08:40:00', '08:40:00', '2'],
+            ['T4', 'S1', '08:30:00', '08:30:00', '1'],
+            ['T4', 'S2', '08:40:00', '08:40:00', '2']
+        ])
+    manager = GTFSManager(storage_manager=None)
+    manager.load_gtfs_data(directory)
+    return manager
+
+
+def test_raptor():
+    """Test du moteur RAPTOR sur le réseau d'exemple"""
+    print("\nTest du moteur RAPTOR...")
+    
+    from datetime import datetime
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = RoutingEngine(load_sample_manager(tmpdir))
+        
+        journey = engine.raptor_search('S1', 'S4', datetime(2024, 1, 8, 7, 50))
+        assert [leg['trip_id'] for leg in journey['legs']] == ['T1', 'T2']
+        assert journey['transfers'] == 1
+        assert journey['departure_time'] == 8 * 3600
+        assert journey['arrival_time'] == 8 * 3600 + 25 * 60
+        print("  ✓ Arrivée au plus tôt avec correspondance")
+        
+        assert engine.raptor_search('S1', 'S4', datetime(2024, 1, 8, 7, 50), max_transfers=0) is None
+        assert engine.raptor_search('S1', 'S4', datetime(2024, 1, 8, 8, 5)) is None
+        print("  ✓ Attente et nombre de correspondances respectés")
+        
+        route = engine.find_route(
+            (48.8566, 2.3522), (48.8650, 2.3300),
+            datetime(2024, 1, 8, 7, 50), algorithm='raptor'
+        )
+        assert [step.get('stop_id') for step in route[1:-1]] == ['S1', 'S2', 'S2', 'S4']
+        assert route[-1]['arrival_time'] == '08:25:00'
+        print("  ✓ find_route(algorithm='raptor') formate l'itinéraire")
+
+
+def test_raptor_profile():
+    """Test des recherches de profil (rRAPTOR) sur une plage de départ"""
+    print("\nTest des recherches de profil...")
+    
+    import random
+    from datetime import datetime
+    from benchmark import generate_feed
+    from gtfs_manager import GTFSManager
+    from raptor import RaptorEngine, pareto_journeys
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = RoutingEngine(load_direct_line_manager(tmpdir))
+        
+        journeys = engine.raptor_profile('S1', 'S4', datetime(2024, 1, 8, 7, 30), datetime(2024, 1, 8, 8, 30))
+        assert [(j['departure_time'], j['arrival_time'], j['transfers']) for j in journeys] == [
+            (8 * 3600, 8 * 3600 + 25 * 60, 1),
+            (8 * 3600 + 5 * 60, 8 * 3600 + 40 * 60, 0)
+        ]
+        assert [leg['trip_id'] for leg in journeys[0]['legs']] == ['T1', 'T2']
+        assert engine.raptor_profile('S1', 'S4', datetime(2024, 1, 8, 8, 1), datetime(2024, 1, 8, 8, 4)) == \
+            journeys[1:]
+        print("  ✓ Ensemble Pareto (départ, arrivée, correspondances)")
+        
+        routes = engine.find_routes_in_window(
+            (48.8566, 2.3522), (48.8650, 2.3300),
+            datetime(2024, 1, 8, 7, 30), datetime(2024, 1, 8, 8, 30)
+        )
+        assert [(r[0]['departure_time'], r[-1]['arrival_time']) for r in routes] == [
+            ('08:00:00', '08:25:00'), ('08:05:00', '08:40:00')
+        ]
+        print("  ✓ find_routes_in_window formate chaque option")
+        
+        # Identique à des recherches séparées à chaque départ de la plage
+        zip_path = os.path.join(tmpdir, 'synthetic.zip')
+        generate_feed(zip_path, stops=50, routes=12, trips_per_hour=4, shape_density=0, seed=7)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_zip(zip_path)
+        store = manager.stop_times_store
+        raptor = RaptorEngine(manager.get_trip_patterns())
+        criteria = lambda js: [(j['departure_time'], j['arrival_time'], j['transfers']) for j in js]
+        rng = random.Random(7)
+        start, end = 7 * 3600, 8 * 3600
+        checked = 0
+        while checked < 5:
+            origin, destination = rng.sample(store.stop_ids, 2)
+            profile = raptor.profile({origin: 0}, {destination: 0}, start, end, 2)
+            if not profile:
+                continue
+            checked += 1
+            departures = {end} | {
+                time for time, _, _ in raptor.patterns.next_departures(store.stop_index[origin], start, 1000)
+                if time <= end
+            }
+            separate = []
+            for departure in departures:
+                for max_transfers in range(3):
+                    journey = raptor.earliest_arrival({origin: departure}, {destination: 0}, max_transfers)
+                    if journey and journey['legs']:
+                        separate.append(journey)
+            assert criteria(profile) == criteria(pareto_journeys(separate))
+        print("  ✓ Identique aux recherches séparées à chaque départ")
+
+
+def test_mcraptor():
+    """Test de la recherche multicritère McRAPTOR et des ensembles d'étiquettes bornés"""
+    print("\nTest de la recherche multicritère...")
+    
+    import random
+    from datetime import datetime
+    from benchmark import generate_feed
+    from gtfs_manager import GTFSManager
+    from mc_raptor import McRaptorEngine, add_label
+    from routing_engine import RoutingEngine
+    
+    bag = []
+    assert add_label(bag, (10, 1, 0, 0)) and add_label(bag, (8, 2, 0, 0))
+    assert not add_label(bag, (10, 2, 5, 0))
+    assert add_label(bag, (7, 1, 0, 0)) and bag == [(7, 1, 0, 0)]
+    assert add_label(bag, (6, 0, 0, 1)) and len(bag) == 2  # Arrivée à pied: ne domine pas
+    assert not add_label(bag, (9, 0, 0, 0), max_labels=2) and len(bag) == 2
+    print("  ✓ Dominance et éviction des ensembles d'étiquettes")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = RoutingEngine(load_direct_line_manager(tmpdir))
+        when = datetime(2024, 1, 8, 7, 50)
+        journeys = engine.mcraptor_search('S1', 'S4', when)
+        assert [(j['arrival_time'], j['transfers'], j['walking_time']) for j in journeys] == [
+            (8 * 3600 + 25 * 60, 1, 0),
+            (8 * 3600 + 40 * 60, 0, 0)
+        ]
+        assert [leg['trip_id'] for leg in journeys[1]['legs']] == ['T3']
+        engine.max_labels = 1
+        assert [j['transfers'] for j in engine.mcraptor_search('S1', 'S4', when)] == [1]
+        engine.max_labels = 8
+        print("  ✓ Compromis arrivée / correspondances, ensembles bornés")
+        
+        routes = engine.find_routes_multicriteria((48.8566, 2.3522), (48.8650, 2.3300), when)
+        assert [route[-1]['arrival_time'] for route in routes] == ['08:25:00', '08:40:00']
+        print("  ✓ find_routes_multicriteria formate chaque compromis")
+        
+        # Meilleure arrivée à k correspondances identique à RAPTOR
+        zip_path = os.path.join(tmpdir, 'synthetic.zip')
+        generate_feed(zip_path, stops=300, routes=20, trips_per_hour=4, shape_density=0, seed=3)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_zip(zip_path)
+        raptor = RoutingEngine(manager).get_raptor()
+        mcraptor = McRaptorEngine(raptor.patterns, raptor.footpaths, max_labels=1000)
+        rng = random.Random(3)
+        checked = 0
+        while checked < 5:
+            origin, destination = rng.sample(manager.stop_times_store.stop_ids, 2)
+            departure = 7 * 3600 + rng.randrange(3600)
+            journeys = mcraptor.search({origin: departure}, {destination: 0}, 2)
+            if not journeys:
+                continue
+            checked += 1
+            for max_transfers in range(3):
+                journey = raptor.earliest_arrival({origin: departure}, {destination: 0}, max_transfers)
+                best = min((j['arrival_time'] for j in journeys if j['transfers'] <= max_transfers), default=None)
+                assert best == (journey['arrival_time'] if journey else None)
+            for journey in journeys:
+                assert journey['walking_time'] == sum(
+                    leg['duration'] for leg in journey['legs'] if leg['type'] == 'walk'
+                )
+        print("  ✓ Meilleures arrivées identiques à RAPTOR, marche cumulée exacte")
+
+
+def test_route_cache():
+    """Test du cache LRU des itinéraires"""
+    print("\nTest du cache d'itinéraires...")
+    
+    from datetime import datetime
+    from gtfs_manager import GTFSManager
+    from route_cache import RouteCache
+    from routing_engine import RoutingEngine
+    
+    now = [0.0]
+    cache = RouteCache(max_size=2, ttl=60, clock=lambda: now[0])
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)  # 'b' est le moins récemment utilisé
+    assert cache.get('b') is None and cache.get('c') == 3
+    now[0] = 61
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations']) == (2, 2, 1, 1)
+    assert cache.make_key('S1', 'S2', datetime(2024, 1, 8, 8, 4)) == \
+        cache.make_key('S1', 'S2', datetime(2024, 1, 8, 8, 0))
+    print("  ✓ Éviction LRU, expiration et compteurs")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manager = load_sample_manager(tmpdir)
+        engine = RoutingEngine(manager, RouteCache(time_bucket=1800))
+        origin, destination = (48.8566, 2.3522), (48.8650, 2.3300)
+        
+        first = engine.find_route(origin, destination, datetime(2024, 1, 8, 7, 31), algorithm='raptor')
+        again = engine.find_route(origin, destination, datetime(2024, 1, 8, 7, 55), algorithm='raptor')
+        assert again == first and engine.route_cache.hits == 1
+        print("  ✓ Même arrêts, même tranche horaire: résultat réutilisé")
+        
+        # Le trajet en cache part à 08:00: plus atteignable à 08:10
+        engine.find_route(origin, destination, datetime(2024, 1, 8, 8, 0), algorithm='raptor')
+        assert engine.find_route(origin, destination, datetime(2024, 1, 8, 8, 10), algorithm='raptor') is None
+        assert engine.route_cache.hits == 1 and engine.route_cache.misses == 3
+        print("  ✓ Itinéraire en cache non atteignable recalculé")
+        
+        # Même arrêt le plus proche (S4) mais sortie à pied plus longue
+        nearby = (48.8660, 2.3310)
+        at_stop = engine.find_route(origin, destination, datetime(2024, 1, 8, 7, 31), algorithm='raptor')
+        near = engine.find_route(origin, nearby, datetime(2024, 1, 8, 7, 31), algorithm='raptor')
+        fresh = RoutingEngine(manager, RouteCache(time_bucket=1800)).find_route(
+            origin, nearby, datetime(2024, 1, 8, 7, 31), algorithm='raptor')
+        assert near == fresh and near[-1]['arrival_time'] != at_stop[-1]['arrival_time']
+        assert engine.route_cache.hits == 2 and engine.route_cache.misses == 4
+        print("  ✓ Points voisins: sortie à pied propre à chaque destination")
+        
+        engine.find_route(origin, destination, datetime(2024, 1, 8, 7, 50), algorithm='astar')
+        assert len(engine.route_cache) == 3
+        manager.build_footpaths()
+        engine.find_route(origin, destination, datetime(2024, 1, 8, 7, 50), algorithm='astar')
+        assert engine.route_cache.invalidations == 1 and engine.route_cache.hits == 2
+        print("  ✓ Cache vidé au rechargement du réseau")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # FAST part avant SLOW et arrive avant: un départ plus tôt dans la
+        # tranche ne doit pas réutiliser SLOW, calculé pour un départ plus tardif
+        tables = {
+            'stops.txt': [['stop_id', 'stop_name', 'stop_lat', 'stop_lon'],
+                          ['A', 'Station A', '48.8000', '2.3000'], ['B', 'Station B', '48.9000', '2.4000']],
+            'routes.txt': [['route_id', 'route_short_name', 'route_long_name', 'route_type'], ['R1', '1', 'Ligne 1', '3']],
+            'trips.txt': [['trip_id', 'route_id', 'service_id'], ['FAST', 'R1', 'WD'], ['SLOW', 'R1', 'WD']],
+            'stop_times.txt': [
+                ['trip_id', 'stop_id', 'arrival_time', 'departure_time', 'stop_sequence'],
+                ['FAST', 'A', '08:01:00', '08:01:00', '1'], ['FAST', 'B', '08:30:00', '08:30:00', '2'],
+                ['SLOW', 'A', '08:03:00', '08:03:00', '1'], ['SLOW', 'B', '09:00:00', '09:00:00', '2']
+            ]
+        }
+        for name, rows in tables.items():
+            with open(os.path.join(tmpdir, name), 'w', newline='') as f:
+                csv.writer(f).writerows(rows)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_data(tmpdir)
+        engine = RoutingEngine(manager, RouteCache())
+        origin, destination = (48.8000, 2.3000), (48.9000, 2.4000)
+        
+        later = engine.find_route(origin, destination, datetime(2024, 1, 8, 8, 2), algorithm='raptor')
+        earlier = engine.find_route(origin, destination, datetime(2024, 1, 8, 8, 0), algorithm='raptor')
+        assert later[-1]['arrival_time'] == '09:00:00' and earlier[-1]['arrival_time'] == '08:30:00'
+        assert earlier == RoutingEngine(manager, RouteCache(max_size=0)).find_route(
+            origin, destination, datetime(2024, 1, 8, 8, 0), algorithm='raptor')
+        assert engine.route_cache.hits == 0
+        # Départ plus tardif que celui de l'entrée: réutilisée
+        assert engine.find_route(origin, destination, datetime(2024, 1, 8, 8, 1), algorithm='raptor') == earlier
+        assert engine.route_cache.hits == 1
+        print("  ✓ Entrée réutilisée seulement pour un départ plus tardif")
+
+
+def write_footpath_feed(directory, transfers):
+    """Complète le réseau d'exemple: S5 à ~80 m de S3, ligne 3 de S5 vers S6, transfers.txt"""
+    write_sample_feed(directory)
+    extra = {
+        'stops.txt': [['S5', 'Station E', '48.8522', '2.3495'], ['S6', 'Station F', '48.8400', '2.3600']],
+        'trips.txt': [['T3', 'R2', 'WD']],
+        'stop_times.txt': [
+            ['T3', 'S5', '08:30:00', '08:30:00', '1'],
+            ['T3', 'S6', '08:40:00', '08:40:00', '2']
+        ]
+    }
+    for name, rows in extra.items():
+        with open(os.path.join(directory, name), 'a', newline='') as f:
+            csv.writer(f).writerows(rows)
+    with open(os.path.join(directory, 'transfers.txt'), 'w', newline='') as f:
+        csv.writer(f).writerows([['from_stop_id', 'to_stop_id', 'transfer_type', 'min_transfer_time']] + transfers)
+
+
+def test_footpaths():
+    """Test des correspondances à pied (rayon de marche et transfers.txt)"""
+    print("\nTest des correspondances à pied...")
+    
+    from datetime import datetime
+    from gtfs_manager import GTFSManager
+    from routing_engine import RoutingEngine
+    
+    when = datetime(2024, 1, 8, 7, 50)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_footpath_feed(tmpdir, [['S2', 'S4', '2', '120']])
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_data(tmpdir)
+        footpaths = manager.get_footpaths()
+        stop_index = manager.stop_times_store.stop_index
+        walks = dict(footpaths.from_stop(stop_index['S3']))
+        assert list(walks) == [stop_index['S5']] and 60 <= walks[stop_index['S5']] <= 80
+        assert dict(footpaths.from_stop(stop_index['S2'])) == {stop_index['S4']: 120}
+        print("  ✓ Graphe CSR: arrêts proches et durée imposée par transfers.txt")
+        
+        engine = RoutingEngine(manager)
+        for journey in (engine.raptor_search('S1', 'S6', when), engine.csa_search('S1', 'S6', when)):
+            assert [leg['type'] for leg in journey['legs']] == ['transit', 'walk', 'transit']
+            assert journey['legs'][1]['stop_ids'] == ['S3', 'S5']
+            assert journey['transfers'] == 1
+            assert journey['arrival_time'] == 8 * 3600 + 40 * 60
+        for journey in (engine.raptor_search('S1', 'S4', when), engine.csa_search('S1', 'S4', when)):
+            assert [leg['type'] for leg in journey['legs']] == ['transit', 'walk']
+            assert journey['arrival_time'] == 8 * 3600 + 12 * 60
+        print("  ✓ RAPTOR et CSA empruntent les correspondances à pied")
+        
+        assert engine.a_star_search('S1', 'S6', when) == ['S1', 'S2', 'S3', 'S5', 'S6']
+        print("  ✓ Graphe A* complété par les correspondances à pied")
+        
+        # Point entre S3 et S5: les deux arrêts servent d'accès
+        assert set(engine.walking_access((48.85255, 2.3497))) == {'S3', 'S5'}
+        route = engine.find_route((48.85255, 2.3497), (48.8400, 2.3600), when, algorithm='raptor')
+        assert [step.get('stop_id') for step in route[1:-1]] == ['S5', 'S6']
+        print("  ✓ Accès et sortie multi-arrêts dans find_route")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_footpath_feed(tmpdir, [['S3', 'S5', '3', '']])
+        engine = RoutingEngine(GTFSManager(storage_manager=None))
+        engine.gtfs_manager.load_gtfs_data(tmpdir)
+        assert engine.raptor_search('S1', 'S6', when) is None
+        assert engine.csa_search('S1', 'S6', when) is None
+        print("  ✓ Correspondance interdite (transfer_type 3)")
+
+
+def test_connection_scan():
+    """Test du Connection Scan Algorithm contre RAPTOR"""
+    print("\nTest du Connection Scan...")
+    
+    from datetime import datetime
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = RoutingEngine(load_sample_manager(tmpdir))
+        csa = engine.get_csa()
+        assert len(csa) == 3
+        assert list(csa.departure_times) == sorted(csa.departure_times)
+        print("  ✓ Connexions triées par heure de départ")
+        
+        for hour, minute in [(7, 50), (8, 0), (8, 5), (8, 12)]:
+            when = datetime(2024, 1, 8, hour, minute)
+            for start, end in [('S1', 'S4'), ('S1', 'S3'), ('S2', 'S4')]:
+                expected = engine.raptor_search(start, end, when)
+                journey = engine.csa_search(start, end, when)
+                if expected is None:
+                    assert journey is None
+                else:
+                    assert journey['arrival_time'] == expected['arrival_time']
+                    assert [l['stop_ids'] for l in journey['legs']] == [l['stop_ids'] for l in expected['legs']]
+        print("  ✓ Mêmes arrivées et étapes que RAPTOR")
+
+
+def test_a_star_graph():
+    """Test de A* sur le graphe précalculé des arrêts"""
+    print("\nTest de A* sur graphe CSR...")
+    
+    from datetime import datetime
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manager = load_sample_manager(tmpdir)
+        graph = manager.stop_graph
+        s1, s2 = graph.stop_index['S1'], graph.stop_index['S2']
+        edges = range(graph.offsets[s1], graph.offsets[s1 + 1])
+        assert [(graph.targets[e], graph.costs[e]) for e in edges] == [(s2, 600)]
+        print("  ✓ Coûts entiers précalculés (secondes)")
+        
+        engine = RoutingEngine(manager)
+        when = datetime(2024, 1, 8, 8, 0)
+        assert engine.a_star_search('S1', 'S4', when) == ['S1', 'S2', 'S4']
+        assert engine.a_star_search('S1', 'S1', when) == ['S1']
+        assert engine.a_star_search('S4', 'S1', when) is None
+        print("  ✓ Chemin reconstruit par prédécesseurs")
+
+
+def test_batch_routing():
+    """Test des calculs par lots et de la matrice origine-destination"""
+    print("\nTest du routage par lots...")
+    
+    from datetime import datetime
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = RoutingEngine(load_sample_manager(tmpdir))
+        when = datetime(2024, 1, 8, 7, 50)
+        s1, s2, s4 = (48.8566, 2.3522), (48.8606, 2.3376), (48.8650, 2.3300)
+        
+        routes = engine.find_routes_batch([(s1, s4), (s2, s4), (s4, s1)], when)
+        assert routes[0][-1]['arrival_time'] == '08:25:00'
+        assert routes[1][-1]['arrival_time'] == '08:25:00'
+        assert routes[2] is None
+        print("  ✓ find_routes_batch: une recherche par origine")
+        
+        matrix = engine.od_matrix([s1, s2], [s2, s4], when)
+        assert matrix == [[20 * 60, 35 * 60], [0, 35 * 60]]
+        assert engine.od_matrix([s1, s2], [s2, s4], when, workers=2) == matrix
+        print("  ✓ od_matrix identique en séquentiel et en parallèle")
+
+
+def test_service_calendar():
+    """Test des bitsets de calendrier et du filtrage des trajets par date"""
+    print("\nTest du calendrier de service...")
+    
+    from datetime import date, datetime
+    from gtfs_manager import GTFSManager
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_sample_feed(tmpdir)
+        with open(os.path.join(tmpdir, 'calendar.txt'), 'w', newline='') as f:
+            csv.writer(f).writerows([
+                ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                 'saturday', 'sunday', 'start_date', 'end_date'],
+                ['WD', '1', '1', '1', '1', '1', '0', '0', '20240101', '20241231']
+            ])
+        with open(os.path.join(tmpdir, 'calendar_dates.txt'), 'w', newline='') as f:
+            csv.writer(f).writerows([
+                ['service_id', 'date', 'exception_type'],
+                ['WD', '20240108', '2'],
+                ['WD', '20240113', '1']
+            ])
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_data(tmpdir)
+        
+        calendar = manager.service_calendar
+        assert calendar.is_active('WD', date(2024, 1, 9))
+        assert not calendar.is_active('WD', date(2024, 1, 8))
+        assert calendar.is_active('WD', date(2024, 1, 13))
+        assert not calendar.is_active('WD', date(2024, 1, 14))
+        assert not calendar.is_active('WD', date(2025, 1, 6))
+        print("  ✓ Bitsets calendar + calendar_dates")
+        
+        engine = RoutingEngine(manager)
+        for day, expected in [(9, True), (8, False), (13, True), (14, False)]:
+            when = datetime(2024, 1, day, 7, 50)
+            assert (engine.raptor_search('S1', 'S4', when) is not None) == expected
+            assert (engine.csa_search('S1', 'S4', when) is not None) == expected
+        assert len(engine.active_trips_cache) == 4
+        print("  ✓ Trajets filtrés par date, masques mis en cache")
+        
+        # A* (recherche par défaut) suit aussi le calendrier
+        assert engine.a_star_search('S1', 'S4', datetime(2024, 1, 8, 7, 50)) is None
+        assert engine.a_star_search('S1', 'S4', datetime(2024, 1, 9, 7, 50)) == ['S1', 'S2', 'S4']
+        assert engine.find_route((48.8566, 2.3522), (48.8650, 2.3300), datetime(2024, 1, 8, 7, 50)) is None
+        assert engine.get_day_stop_graph(date(2024, 1, 9)) is manager.stop_graph
+        assert len(engine.day_graphs) == 1
+        print("  ✓ A* limité aux trajets circulant le jour du départ")
+        
+        # Mise à jour du seul calendrier: le 8 janvier circule de nouveau
+        manager.calendar_dates = [row for row in manager.calendar_dates if row['date'] != '20240108']
+        manager.build_service_calendar()
+        assert engine.raptor_search('S1', 'S4', datetime(2024, 1, 8, 7, 50)) is not None
+        assert list(engine.active_trips_cache) == [date(2024, 1, 8)]
+        
+        engine.ACTIVE_TRIPS_CACHE_SIZE = 2
+        for day in (9, 10, 9, 11):
+            engine.get_active_trips(date(2024, 1, day))
+        assert list(engine.active_trips_cache) == [date(2024, 1, 9), date(2024, 1, 11)]
+        print("  ✓ Cache vidé au changement de calendrier, borné en LRU")
+
+
+def test_trip_patterns_index():
+    """Test de l'index arrêt -> (motif, position) et des prochains départs"""
+    print("\nTest des motifs de trajets...")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manager = load_sample_manager(tmpdir)
+        patterns = manager.trip_patterns
+        assert len(patterns) == 2
+        s2 = manager.stop_times_store.stop_index['S2']
+        assert sorted(patterns.patterns_at(s2)) == [(0, 1), (1, 0)]
+        assert manager._stop_to_trips_view is None
+        print("  ✓ Index CSR arrêt -> (motif, position), vue dictionnaire non construite")
+        
+        departures = manager.next_departures('S2', '08:00:00')
+        assert [(d['trip_id'], d['departure_time']) for d in departures] == [('T1', '08:10:00'), ('T2', '08:15:00')]
+        assert [d['trip_id'] for d in manager.next_departures('S2', 8 * 3600 + 12 * 60)] == ['T2']
+        assert manager.next_departures('S3', '07:00:00') == []
+        print("  ✓ Prochains départs par recherche dichotomique")
+
+
+def test_benchmark():
+    """Test du générateur de réseau synthétique et du banc d'essai"""
+    print("\nTest du banc d'essai...")
+    
+    import json
+    from benchmark import generate_feed, main as benchmark_main, percentiles
+    from gtfs_manager import GTFSManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = os.path.join(tmpdir, 'synthetic.zip')
+        counts = generate_feed(zip_path, stops=50, routes=4, trips_per_hour=2, shape_density=2, seed=3)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_zip(zip_path)
+        assert len(manager.stops) == counts['stops'] == 50
+        assert manager.stop_times_store.trip_count() == counts['trips'] > 0
+        assert len(manager.stop_times_store.stops) == counts['stop_times']
+        assert manager.shapes.point_count() == counts['shape_points']
+        print("  ✓ Réseau synthétique cohérent et chargeable")
+        
+        assert percentiles([0.001, 0.002, 0.003, 0.004])['p50_ms'] == 2.0
+        output = os.path.join(tmpdir, 'bench.json')
+        assert benchmark_main(['--preset', 'tiny', '--queries', '5', '--output', output]) == 0
+        with open(output) as f:
+            report = json.load(f)
+        results = report['results']
+        assert report['feed']['preset'] == 'tiny' and results['route_raptor']['count'] == 5
+        assert {'import_seconds', 'index_build_seconds', 'nearest_stop', 'route_csa'} <= set(results)
+        print("  ✓ Rapport JSON des mesures")
+
+
+def test_instrumentation():
+    """Test des mesures par étape et des compteurs des chemins critiques"""
+    print("\nTest de l'instrumentation...")
+    
+    import json
+    from datetime import datetime
+    from instrumentation import NULL_STAGE, metrics
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in ('off', 'on'):
+            os.makedirs(os.path.join(tmpdir, name))
+        metrics.reset()
+        metrics.disable()
+        assert metrics.stage('noop') is NULL_STAGE
+        load_sample_manager(os.path.join(tmpdir, 'off'))
+        assert metrics.snapshot() == {'stages': {}, 'counters': {}}
+        print("  ✓ Désactivée par défaut: aucune mesure")
+        
+        log_path = os.path.join(tmpdir, 'metrics.jsonl')
+        metrics.enable(log_path=log_path)
+        try:
+            engine = RoutingEngine(load_sample_manager(os.path.join(tmpdir, 'on')))
+            when = datetime(2024, 1, 8, 7, 50)
+            assert engine.raptor_search('S1', 'S4', when) is not None
+            assert engine.csa_search('S1', 'S4', when) is not None
+            assert engine.a_star_search('S1', 'S4', when) is not None
+            
+            data = metrics.snapshot()
+            assert {'load_gtfs_data', 'load_stop_times', 'build_trip_patterns', 'build_stop_graph',
+                    'raptor_search', 'csa_search', 'a_star_search'} <= set(data['stages'])
+            assert data['stages']['raptor_search']['calls'] == 1
+            counters = data['counters']
+            assert counters['stop_times_rows_parsed'] == 5
+            assert counters['raptor_rounds'] >= 1 and counters['raptor_patterns_scanned'] >= 1
+            assert counters['csa_connections_scanned'] >= 1
+            assert counters['astar_nodes_expanded'] >= 2 and counters['astar_edges_relaxed'] >= 1
+            print("  ✓ Durées par étape et compteurs RAPTOR/CSA/A*")
+            
+            text = metrics.to_prometheus()
+            assert 'gtfspy_stage_seconds_total{stage="raptor_search"}' in text
+            assert 'gtfspy_astar_nodes_expanded_total ' in text
+            with open(log_path) as f:
+                events = [json.loads(line) for line in f]
+            assert len(events) == sum(stage['calls'] for stage in data['stages'].values())
+            assert {'stage', 'seconds', 'memory_bytes'} <= set(events[0])
+            print("  ✓ Export Prometheus et journal JSON")
+        finally:
+            metrics.disable()
+            metrics.log_path = None
+            metrics.reset()
+
+
+def test_hub_labels():
+    """Test des étiquettes de hubs et de leur persistance"""
+    print("\nTest des étiquettes de hubs...")
+    
+    import heapq
+    import random
+    from datetime import datetime
+    from benchmark import generate_feed
+    from gtfs_manager import GTFSManager
+    from hub_labels import HubLabels
+    from routing_engine import RoutingEngine
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = os.path.join(tmpdir, 'synthetic.zip')
+        generate_feed(zip_path, stops=200, routes=15, trips_per_hour=2, shape_density=0, seed=5)
+        manager = GTFSManager(storage_manager=None)
+        manager.load_gtfs_zip(zip_path)
+        graph = manager.get_stop_graph()
+        labels = HubLabels(graph)
+        assert labels.matches(graph) and labels.label_count() > 0
+        
+        edge_costs = {}
+        for source in range(len(graph)):
+            for edge in range(graph.offsets[source], graph.offsets[source + 1]):
+                key = (source, graph.targets[edge])
+                edge_costs[key] = min(edge_costs.get(key, graph.costs[edge]), graph.costs[edge])
+        rng = random.Random(5)
+        for source in rng.sample(range(len(graph)), 10):
+            # Dijkstra de référence
+            best = {source: 0}
+            heap = [(0, source)]
+            while heap:
+                cost, stop = heapq.heappop(heap)
+                if cost > best[stop]:
+                    continue
+                for edge in range(graph.offsets[stop], graph.offsets[stop + 1]):
+                    target = graph.targets[edge]
+                    if cost + graph.costs[edge] < best.get(target, float('inf')):
+                        best[target] = cost + graph.costs[edge]
+                        heapq.heappush(heap, (best[target], target))
+            for target in rng.sample(range(len(graph)), 20):
+                path = labels.shortest_path(source, target)
+                if target not in best:
+                    assert path is None
+                    continue
+                assert path[0] == source and path[-1] == target
+                assert sum(edge_costs[edge] for edge in zip(path, path[1:])) == best[target]
+        print("  ✓ Chemins de coût minimal identiques à Dijkstra")
+        
+        sample_zip = write_sample_zip(tmpdir)
+        storage = make_storage(os.path.join(tmpdir, 'storage'))
+        assert GTFSManager(storage).import_gtfs(sample_zip, extract=False, hub_labels=True)
+        entry = storage.get_active_gtfs_import()
+        assert os.path.exists(entry['hub_labels_path'])
+        
+        restored = GTFSManager(storage)
+        assert restored.load_last_import()
+        assert restored.get_hub_labels() is not None
+        assert not restored.hub_labels.matches(graph)
+        engine = RoutingEngine(restored)
+        when = datetime(2024, 1, 8, 7, 50)
+        path = engine.a_star_search('S1', 'S3', when)
+        restored.hub_labels = None
+        assert engine.a_star_search('S1', 'S3', when) == path == ['S1', 'S2', 'S3']
+        print("  ✓ Étiquettes persistées, rechargées et utilisées par A*")
+        
+        # Mise à jour: étiquettes recalculées pour le nouveau graphe
+        with open(os.path.join(tmpdir, 'feed', 'stop_times.txt')) as f:
+            content = f.read().replace('08:25:00', '08:28:00')
+        with open(os.path.join(tmpdir, 'feed', 'stop_times.txt'), 'w') as f:
+            f.write(content)
+        os.remove(sample_zip)
+        with zipfile.ZipFile(sample_zip, 'w') as zf:
+            for name in sorted(os.listdir(os.path.join(tmpdir, 'feed'))):
+                zf.write(os.path.join(tmpdir, 'feed', name), 'feed/' + name)
+        assert restored.update_gtfs(sample_zip)
+        updated = storage.get_active_gtfs_import()
+        assert updated['hub_labels_path'] != entry['hub_labels_path']
+        assert restored.get_hub_labels() is not None and restored.hub_labels.matches(restored.stop_graph)
+        print("  ✓ Étiquettes recalculées à la mise à jour du réseau")
+
+
 def main():
     """Execute tous les tests"""
     print("=" * 60)
@@ -171,6 +1479,31 @@ def main():
         test_gtfs_manager()
         test_routing_engine()
         test_storage_manager()
+        test_stop_times_store()
+        test_fast_csv()
+        test_shape_store()
+        test_lazy_tables()
+        test_streaming_import()
+        test_parallel_load()
+        test_background_tasks()
+        test_snapshot_warm_start()
+        test_incremental_update()
+        test_feed_database()
+        test_spatial_index()
+        test_geo_kernels()
+        test_raptor()
+        test_raptor_profile()
+        test_mcraptor()
+        test_route_cache()
+        test_connection_scan()
+        test_footpaths()
+        test_a_star_graph()
+        test_hub_labels()
+        test_batch_routing()
+        test_service_calendar()
+        test_trip_patterns_index()
+        test_benchmark()
+        test_instrumentation()
         
         print("\n" + "=" * 60)
         print("✓ Tous les tests sont passés!")
@@ -0,0 +1,277 @@
+"""
+Motifs de trajets (trip patterns) - Regroupe les trajets d'une même ligne
+qui desservent la même séquence d'arrêts, avec leurs horaires en tableaux
+"""
+
+from array import array
+from bisect import bisect_right
+
+
+def fill_missing_times(arrivals, departures):
+    """
+    Complète les horaires absents (-1) d'un trajet
+
+    Un horaire d'arrivée absent reprend le départ (et inversement); les
+    arrêts sans aucun horaire sont interpolés linéairement entre les arrêts
+    horodatés qui les encadrent.
+    """
+    count = len(arrivals)
+    for i in range(count):
+        if arrivals[i] < 0:
+            arrivals[i] = departures[i]
+        if departures[i] < 0:
+            departures[i] = arrivals[i]
+
+    known = [i for i in range(count) if arrivals[i] >= 0]
+    if not known:
+        return False
+    for i in range(known[0]):
+        arrivals[i] = departures[i] = arrivals[known[0]]
+    for i in range(known[-1] + 1, count):
+        arrivals[i] = departures[i] = departures[known[-1]]
+    for previous, following in zip(known, known[1:]):
+        gap = following - previous
+        for i in range(previous + 1, following):
+            time = departures[previous] + (arrivals[following] - departures[previous]) * (i - previous) // gap
+            arrivals[i] = departures[i] = time
+    return True
+
+
+def precedes(arrivals1, departures1, arrivals2, departures2):
+    """Indique si un trajet ne dépasse jamais un autre (horaires du premier toujours antérieurs)"""
+    return all(a <= b for a, b in zip(arrivals1, arrivals2)) and \
+        all(a <= b for a, b in zip(departures1, departures2))
+
+
+class TripPatterns:
+    """
+    Motifs de trajets construits depuis le stockage colonnaire des stop_times
+
+    Pour le motif p:
+    - pattern_stops[p]: arrêts (identifiants denses) dans l'ordre de passage
+    - pattern_trips[p]: trajets (identifiants denses) triés par heure de départ
+    - pattern_arrivals[p] / pattern_departures[p]: horaires en secondes, tableau
+      trajets × arrêts aplati ligne par ligne (trajet i, position j -> i * n + j)
+
+    Les trajets d'un motif ne se dépassent jamais: chaque colonne d'horaires
+    est triée, ce qui permet une recherche dichotomique du prochain départ.
+
+    L'index arrêt -> (motif, position) est au format CSR: les passages à
+    l'arrêt s sont stop_pattern_ids[i] / stop_pattern_positions[i] pour i
+    dans [stop_pattern_offsets[s], stop_pattern_offsets[s + 1]).
+    """
+
+    def __init__(self, store, trips):
+        self.store = store
+        self.pattern_stops = []
+        self.pattern_route = []
+        self.pattern_trips = []
+        self.pattern_arrivals = []
+        self.pattern_departures = []
+
+        groups = {}
+        for trip_index in range(store.trip_count()):
+            timetable = self.trip_timetable(store, trips, trip_index)
+            if timetable is not None:
+                key, arrivals, departures = timetable
+                groups.setdefault(key, []).append((departures[0], trip_index, arrivals, departures))
+
+        for (route_id, stops), group in groups.items():
+            group.sort(key=lambda item: (item[0], item[1]))
+            # Répartir les trajets en sous-motifs sans dépassement
+            sub_patterns = []
+            for item in group:
+                for sub_pattern in sub_patterns:
+                    last = sub_pattern[-1]
+                    if precedes(last[2], last[3], item[2], item[3]):
+                        sub_pattern.append(item)
+                        break
+                else:
+                    sub_patterns.append([item])
+            for sub_pattern in sub_patterns:
+                self._add_pattern(route_id, stops, sub_pattern)
+
+        self.build_stop_index()
+
+    @staticmethod
+    def trip_timetable(store, trips, trip_index):
+        """
+        Clé de motif (ligne, séquence d'arrêts) et horaires complétés d'un trajet
+
+        Returns:
+            Tuple (clé, arrivées, départs) ou None si le trajet n'est pas exploitable
+        """
+        start, end = store.trip_range(trip_index)
+        if end - start < 2:
+            return None
+        arrivals = list(store.arrivals[start:end])
+        departures = list(store.departures[start:end])
+        if not fill_missing_times(arrivals, departures):
+            return None
+        route_id = trips.get(store.trip_ids[trip_index], {}).get('route_id')
+        return (route_id, tuple(store.stops[start:end])), arrivals, departures
+
+    def apply_trip_changes(self, store, trips, kept, inserted):
+        """
+        Met à jour les motifs après StopTimesStore.apply_trip_changes
+
+        Les motifs des trajets conservés sont gardés (rangs de trajets
+        renumérotés); les trajets retirés ou remplacés en sont ôtés, puis les
+        trajets de inserted sont insérés dans un motif compatible (même ligne,
+        mêmes arrêts, sans dépassement) ou dans un nouveau motif.
+
+        Args:
+            store: nouveau stockage stop_times
+            kept: ancien rang de trajet -> nouveau rang (-1 si retiré ou remplacé)
+            inserted: nouveaux rangs des trajets à insérer
+        """
+        previous = list(zip(self.pattern_stops, self.pattern_route, self.pattern_trips,
+                            self.pattern_arrivals, self.pattern_departures))
+        self.store = store
+        self.pattern_stops = []
+        self.pattern_route = []
+        self.pattern_trips = []
+        self.pattern_arrivals = []
+        self.pattern_departures = []
+
+        patterns_by_key = {}
+        for stops, route_id, pattern_trips, arrivals, departures in previous:
+            width = len(stops)
+            ranks = [rank for rank, trip in enumerate(pattern_trips) if kept[trip] >= 0]
+            if not ranks:
+                continue
+            if len(ranks) < len(pattern_trips):
+                arrivals = array('i', (arrivals[rank * width + j] for rank in ranks for j in range(width)))
+                departures = array('i', (departures[rank * width + j] for rank in ranks for j in range(width)))
+            patterns_by_key.setdefault((route_id, tuple(stops)), []).append(len(self.pattern_stops))
+            self.pattern_stops.append(stops)
+            self.pattern_route.append(route_id)
+            self.pattern_trips.append(array('i', (kept[pattern_trips[rank]] for rank in ranks)))
+            self.pattern_arrivals.append(arrivals)
+            self.pattern_departures.append(departures)
+
+        for trip_index in inserted:
+            timetable = self.trip_timetable(store, trips, trip_index)
+            if timetable is None:
+                continue
+            key, arrivals, departures = timetable
+            for pattern in patterns_by_key.get(key, ()):
+                if self._insert_trip(pattern, trip_index, arrivals, departures):
+                    break
+            else:
+                patterns_by_key.setdefault(key, []).append(len(self.pattern_stops))
+                self._add_pattern(key[0], key[1], [(departures[0], trip_index, arrivals, departures)])
+
+        self.build_stop_index()
+
+    def _insert_trip(self, pattern, trip_index, arrivals, departures):
+        """Insère un trajet à son rang dans un motif s'il n'y crée aucun dépassement"""
+        width = len(self.pattern_stops[pattern])
+        pattern_arrivals = self.pattern_arrivals[pattern]
+        pattern_departures = self.pattern_departures[pattern]
+        count = len(self.pattern_trips[pattern])
+        first_departures = [pattern_departures[rank * width] for rank in range(count)]
+        rank = bisect_right(first_departures, departures[0])
+
+        if rank > 0:
+            start = (rank - 1) * width
+            if not precedes(pattern_arrivals[start:start + width], pattern_departures[start:start + width],
+                            arrivals, departures):
+                return False
+        if rank < count:
+            start = rank * width
+            if not precedes(arrivals, departures,
+                            pattern_arrivals[start:start + width], pattern_departures[start:start + width]):
+                return False
+
+        pattern_arrivals[rank * width:rank * width] = array('i', arrivals)
+        pattern_departures[rank * width:rank * width] = array('i', departures)
+        self.pattern_trips[pattern].insert(rank, trip_index)
+        return True
+
+    def build_stop_index(self):
+        """Construit l'index CSR arrêt -> (motif, position)"""
+        count = len(self.store.stop_ids)
+        offsets = array('i', [0]) * (count + 1)
+        for stops in self.pattern_stops:
+            for stop in stops:
+                offsets[stop + 1] += 1
+        for i in range(1, count + 1):
+            offsets[i] += offsets[i - 1]
+
+        cursor = array('i', offsets)
+        self.stop_pattern_ids = array('i', [0]) * offsets[count]
+        self.stop_pattern_positions = array('i', [0]) * offsets[count]
+        for pattern, stops in enumerate(self.pattern_stops):
+            for position, stop in enumerate(stops):
+                self.stop_pattern_ids[cursor[stop]] = pattern
+                self.stop_pattern_positions[cursor[stop]] = position
+                cursor[stop] += 1
+        self.stop_pattern_offsets = offsets
+
+    def patterns_at(self, stop):
+        """Itère sur les couples (motif, position) desservant un arrêt dense"""
+        start, end = self.stop_pattern_offsets[stop], self.stop_pattern_offsets[stop + 1]
+        return zip(self.stop_pattern_ids[start:end], self.stop_pattern_positions[start:end])
+
+    def _add_pattern(self, route_id, stops, items):
+        """Ajoute un motif et sa table d'horaires aplatie"""
+        arrivals = array('i')
+        departures = array('i')
+        for _, _, trip_arrivals, trip_departures in items:
+            arrivals.extend(trip_arrivals)
+            departures.extend(trip_departures)
+        self.pattern_stops.append(array('i', stops))
+        self.pattern_route.append(route_id)
+        self.pattern_trips.append(array('i', (item[1] for item in items)))
+        self.pattern_arrivals.append(arrivals)
+        self.pattern_departures.append(departures)
+
+    def __len__(self):
+        return len(self.pattern_stops)
+
+    def earliest_trip(self, pattern, position, time, active_trips=None):
+        """
+        Retourne le rang du premier trajet du motif partant de la position
+        donnée à partir de time (ou None)
+
+        active_trips: masque optionnel (indexé par trajet dense) des trajets
+        circulant le jour de la requête
+        """
+        width = len(self.pattern_stops[pattern])
+        departures = self.pattern_departures[pattern]
+        trips = self.pattern_trips[pattern]
+        low, high = 0, len(trips)
+        while low < high:
+            middle = (low + high) // 2
+            if departures[middle * width + position] < time:
+                low = middle + 1
+            else:
+                high = middle
+        if active_trips is not None:
+            while low < len(trips) and not active_trips[trips[low]]:
+                low += 1
+        return low if low < len(trips) else None
+
+    def next_departures(self, stop, time, count=5, active_trips=None):
+        """
+        Prochains départs depuis un arrêt dense à partir de time
+
+        Returns:
+            Liste triée de tuples (départ en secondes, motif, rang du trajet)
+        """
+        departures = []
+        for pattern, position in self.patterns_at(stop):
+            width = len(self.pattern_stops[pattern])
+            if position == width - 1:
+                continue  # Terminus: aucun départ
+            trips = self.pattern_trips[pattern]
+            trip = self.earliest_trip(pattern, position, time)
+            found = 0
+            while trip is not None and trip < len(trips) and found < count:
+                if active_trips is None or active_trips[trips[trip]]:
+                    departures.append((self.pattern_departures[pattern][trip * width + position], pattern, trip))
+                    found += 1
+                trip += 1
+        departures.sort()
+        return departures[:count]